@@ -0,0 +1,79 @@
+"""
+Benchmark of concurrent classifications on one event loop.
+
+Runs the async classifier against FakeLLM, whose calls sleep like a network
+round trip, and compares it with the blocking classifier on a thread pool.
+
+    python benchmarks/async_llm.py --requests 500 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from backend.classifier import DocumentClassifier  # noqa: E402
+from backend.commons import FakeLLM  # noqa: E402
+from backend.prompts import ClassifierPrompt  # noqa: E402
+
+
+async def classify_async(classifier: DocumentClassifier, requests: int) -> int:
+    peak_threads = threading.active_count()
+    results = await asyncio.gather(
+        *(
+            classifier.aclassify_document(f"document-{index}")
+            for index in range(requests)
+        )
+    )
+    assert len(results) == requests
+    return max(peak_threads, threading.active_count())
+
+
+def classify_threads(
+    classifier: DocumentClassifier, requests: int, workers: int
+) -> int:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                lambda index: classifier.classify_document(f"document-{index}"),
+                range(requests),
+            )
+        )
+        peak_threads = threading.active_count()
+    assert len(results) == requests
+    return peak_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    classifier = DocumentClassifier(
+        llm_client=FakeLLM(latency_seconds=args.latency_ms / 1000),
+        prompt=ClassifierPrompt(),
+    )
+    # Warm up the prompt and the lazy imports so they are not timed.
+    classifier.classify_document("warm-up")
+
+    print(f"{'mode':>16} {'seconds':>8} {'threads':>8}")
+    start = time.perf_counter()
+    threads = asyncio.run(classify_async(classifier, args.requests))
+    print(f"{'async':>16} {time.perf_counter() - start:>8.2f} {threads:>8}")
+
+    start = time.perf_counter()
+    threads = classify_threads(classifier, args.requests, args.workers)
+    mode = f"{args.workers} threads"
+    print(f"{mode:>16} {time.perf_counter() - start:>8.2f} {threads:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of the compact extraction response format per document type.
+
+Builds a full extraction for each registered document type, serialises it
+in the object format and in the compact positional format, checks that
+both decode to the same fields, and reports the estimated output tokens,
+generation time and output cost saved, and the decoding time.
+
+Output tokens are estimated by splitting words, punctuation and groups of
+up to three digits, which tracks the relative size of JSON responses.
+
+    python benchmarks/compact_responses.py --ms-per-token 5
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+from typing import Any
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from backend.commons import DEFAULT_MODEL  # noqa: E402
+from backend.commons import get_model_pricing  # noqa: E402
+from backend.extraction import DOCUMENT_FIELDS  # noqa: E402
+from backend.extraction import get_document_schema  # noqa: E402
+
+SAMPLE_VALUES = {
+    "account_holder_name": "Jordan A. Rivera",
+    "account_number_masked": "****1234",
+    "statement_start_date": "2025-01-01",
+    "statement_end_date": "2025-01-31",
+    "starting_balance": "12450.75",
+    "ending_balance": "9870.10",
+    "full_name": "Jordan Alex Rivera",
+    "date_of_birth": "1988-04-12",
+    "id_number": "D1234-5678-9012",
+    "address": "742 Evergreen Terrace, Springfield, IL 62704",
+    "expiration_date": "2029-04-12",
+    "legal_name": "Rivera Holdings LLC",
+    "ein_or_ssn": "123456789",
+    "business_address": "1200 Market Street, Suite 400, Philadelphia, PA 19107",
+    "tax_classification": "LLC",
+    "signature_present": "true",
+    "insured_name": "Rivera Holdings LLC",
+    "policy_number": "GL-2025-448812",
+    "policy_effective_date": "2025-02-01",
+    "policy_expiration_date": "2026-02-01",
+    "coverage_types": "Commercial General Liability, Automobile Liability",
+}
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def responses(document_type: str) -> tuple[str, str]:
+    rows: list[list[Any]] = [
+        [
+            index,
+            SAMPLE_VALUES[name],
+            0.95,
+            1,
+            120 + 40 * index,
+            80,
+            150 + 40 * index,
+            620,
+        ]
+        for index, name in enumerate(DOCUMENT_FIELDS[document_type])
+    ]
+    names = list(DOCUMENT_FIELDS[document_type])
+    verbose = {
+        "extracted_fields": [
+            {
+                "name": names[index],
+                "value": value,
+                "confidence": confidence,
+                "page": page,
+                "coordinates": coordinates,
+            }
+            for index, value, confidence, page, *coordinates in rows
+        ]
+    }
+    return json.dumps(verbose), json.dumps({"fields": rows})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--ms-per-token",
+        type=float,
+        default=5.0,
+        help="Generation time per output token, about 200 tokens/s by default.",
+    )
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    output_price = get_model_pricing(DEFAULT_MODEL)["output"] / 1_000_000
+
+    print(
+        f"{'document type':<26} {'tokens':>6} {'compact':>7} {'saved':>6} "
+        f"{'ms saved':>8} {'$ saved/1k docs':>15} {'decode us':>9} {'compact us':>10}"
+    )
+    for document_type in DOCUMENT_FIELDS:
+        schema = get_document_schema(document_type)
+        verbose, compact = responses(document_type)
+
+        expected = schema.validate_json(verbose).model_dump()
+        assert schema.decode_compact(compact).model_dump() == expected
+
+        verbose_tokens = estimate_tokens(verbose)
+        compact_tokens = estimate_tokens(compact)
+        saved_tokens = verbose_tokens - compact_tokens
+
+        decode_us, compact_decode_us = (
+            min(timeit.repeat(call, number=args.repeat, repeat=5))
+            / args.repeat
+            * 1_000_000
+            for call in (
+                lambda: schema.validate_json(verbose),
+                lambda: schema.decode_compact(compact),
+            )
+        )
+        print(
+            f"{document_type:<26} {verbose_tokens:>6} {compact_tokens:>7} "
+            f"{saved_tokens / verbose_tokens:>6.0%} "
+            f"{saved_tokens * args.ms_per_token:>8.0f} "
+            f"{saved_tokens * output_price * 1000:>15.4f} "
+            f"{decode_us:>9.1f} {compact_decode_us:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
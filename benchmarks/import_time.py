@@ -0,0 +1,104 @@
+"""
+Import-time benchmark for the backend, based on `python -X importtime`.
+
+Imports the backend the way the Streamlit pages do in a fresh interpreter,
+reports the slowest modules and fails when the median cumulative import
+time exceeds the budget or when a heavy dependency is loaded eagerly.
+
+    python benchmarks/import_time.py --runs 5 --budget-ms 600
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+IMPORT_STATEMENT = "from backend import FacadeLoan"
+
+# Dependencies that must only be loaded on first use.
+LAZY_MODULES = (
+    "google.genai",
+    "google.cloud.firestore",
+    "google.cloud.storage",
+    "fitz",
+    "pymupdf",
+    "pandas",
+    "sklearn",
+    "httpx",
+)
+
+
+def measure(statement: str) -> tuple[int, dict[str, tuple[int, int]]]:
+    """
+    Runs one statement in a fresh interpreter.
+
+    Returns:
+        The total import time in microseconds (top-level imports only) and
+        the self and cumulative time in microseconds per module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total = 0
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        # Nested imports are indented under the module that triggered them.
+        if not module[1:].startswith(" "):
+            total += int(cumulative_us)
+        timings[module.strip()] = (int(self_us), int(cumulative_us))
+    return total, timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=600.0)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--statement", default=IMPORT_STATEMENT)
+    args = parser.parse_args()
+
+    # Interpreter start-up imports (site, encodings) are measured separately
+    # and subtracted.
+    baseline_us = statistics.median(measure("pass")[0] for _ in range(args.runs))
+    runs = [measure(args.statement) for _ in range(args.runs)]
+    median_ms = (statistics.median(total for total, _ in runs) - baseline_us) / 1000
+    timings = runs[-1][1]
+
+    slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)
+    print(f"{args.statement!r}: median {median_ms:.1f} ms over {args.runs} runs")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for module, (self_us, cumulative_us) in slowest[: args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {module}")
+
+    eager = sorted(
+        {
+            lazy_module
+            for lazy_module in LAZY_MODULES
+            for module in timings
+            if module == lazy_module or module.startswith(f"{lazy_module}.")
+        }
+    )
+
+    failed = False
+    if eager:
+        print(f"FAIL: loaded eagerly: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: {median_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Load test of the pipeline on a recording of production LLM calls.
+
+Classifies and extracts the given documents through the replay facade,
+which serves the recorded Gemini responses with scaled latency and keeps
+storage and Firestore local, and reports the throughput and the mean time
+per stage. Run it from the directory whose resources/documents holds the
+recorded documents; recordings are made by setting LLM_RECORDING_PATH.
+
+With --pipeline the documents go through the staged pipeline instead of a
+pool of workers each running the whole document, and the utilisation and
+backpressure of every stage are reported as well.
+
+    python benchmarks/replay_load.py resources/recording.jsonl \\
+        w9.pdf bank_statement.pdf --latency-scale 0.1 --repeat 10 --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from backend.facade import FacadeLoan  # noqa: E402
+
+
+def process(facade: FacadeLoan, document_name: str) -> dict[str, float]:
+    with facade.trace_document(document_name) as span:
+        classification, document_id, _ = facade.classify_document(document_name)
+        facade.document_extraction(
+            document_name, document_id, classification.document_type
+        )
+    return FacadeLoan.get_stage_latencies(span.trace_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("recording")
+    parser.add_argument("documents", nargs="+")
+    parser.add_argument("--latency-scale", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pipeline", action="store_true")
+    args = parser.parse_args()
+
+    facade = FacadeLoan.get_replay_facade(
+        args.recording, latency_scale=args.latency_scale
+    )
+
+    jobs = [name for _ in range(args.repeat) for name in args.documents]
+    start = time.perf_counter()
+    if args.pipeline:
+        documents = facade.process_documents(jobs)
+        results = [document.stage_latencies for document in documents]
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(lambda name: process(facade, name), jobs))
+    seconds = time.perf_counter() - start
+
+    print(f"{len(jobs)} documents in {seconds:.2f}s, {len(jobs) / seconds:.1f}/s")
+    print(f"{'stage':<32} {'mean ms':>8}")
+    stages = sorted({stage for result in results for stage in result})
+    for stage in stages:
+        mean = sum(result.get(stage, 0.0) for result in results) / len(results)
+        print(f"{stage:<32} {mean * 1000:>8.1f}")
+
+    if args.pipeline:
+        print()
+        print(
+            f"{'stage':<10} {'kind':<8} {'workers':>7} {'util':>6} "
+            f"{'busy s':>8} {'blocked s':>9}"
+        )
+        for stage in facade.get_pipeline_stats():
+            print(
+                f"{stage.name:<10} {stage.kind:<8} {stage.workers:>7} "
+                f"{stage.utilisation:>6.0%} {stage.busy_seconds:>8.2f} "
+                f"{stage.blocked_seconds:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
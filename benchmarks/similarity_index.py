@@ -0,0 +1,88 @@
+"""
+Benchmark of near-duplicate lookups in a large similarity index.
+
+Fills an index with synthetic documents, each a set of random word
+shingles, then looks up edited copies of indexed documents (a share of
+their shingles replaced) and unrelated documents, and reports the insert
+rate (signatures included), the lookup latency and how many edited copies were matched.
+
+    python benchmarks/similarity_index.py --documents 20000 --edit 0.2
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from backend.documents import DocumentFingerprint  # noqa: E402
+from backend.documents import SimilarityIndex  # noqa: E402
+
+
+def fingerprint(index: SimilarityIndex, words: list[str]) -> DocumentFingerprint:
+    return DocumentFingerprint(
+        page_hashes=np.zeros(1, dtype=np.uint64),
+        page_text_hashes=np.zeros(1, dtype=np.uint64),
+        signature=index.minhash(words),
+        has_text=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=20_000)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--edit", type=float, default=0.2)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [f"w{index}" for index in range(50_000)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SimilarityIndex(os.path.join(directory, "index.sqlite"))
+
+        documents = {}
+        start = time.perf_counter()
+        for number in range(args.documents):
+            words = rng.choices(vocabulary, k=args.words)
+            if number < args.lookups:
+                documents[f"document-{number}"] = words
+            index.add(f"document-{number}", fingerprint(index, words))
+        insert_seconds = time.perf_counter() - start
+
+        edited = []
+        for words in documents.values():
+            words = list(words)
+            start_word = rng.randrange(len(words))
+            for offset in range(int(len(words) * args.edit)):
+                words[(start_word + offset) % len(words)] = rng.choice(vocabulary)
+            edited.append(fingerprint(index, words))
+        unrelated = [
+            fingerprint(index, rng.choices(vocabulary, k=args.words))
+            for _ in range(args.lookups)
+        ]
+
+        print(
+            f"{'documents':>10} {'indexed/s':>10} {'lookup':>8} {'ms':>7} "
+            f"{'matched':>8}"
+        )
+        print(f"{len(index):>10} {args.documents / insert_seconds:>10.0f}")
+        for label, fingerprints in (("edited", edited), ("unrelated", unrelated)):
+            start = time.perf_counter()
+            matched = sum(index.find(item) is not None for item in fingerprints)
+            milliseconds = (time.perf_counter() - start) / len(fingerprints) * 1000
+            print(
+                f"{'':>10} {'':>10} {label:>8} {milliseconds:>7.2f} "
+                f"{matched / len(fingerprints):>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
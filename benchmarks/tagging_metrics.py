@@ -0,0 +1,99 @@
+"""
+Benchmark of the NumPy tagging metrics against the previous pandas +
+scikit-learn implementation.
+
+Checks that both produce the same accuracy, weighted precision/recall and
+confusion matrix, then times them on synthetic review sets.
+
+    python benchmarks/tagging_metrics.py --sizes 100 1000 10000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from backend.dashboard import calculate_tagging_metrics  # noqa: E402
+
+LABELS = [
+    "bank_statement",
+    "government_id",
+    "w9_form",
+    "certificate_of_insurance",
+    "unknown",
+]
+
+
+def sklearn_tagging_metrics(docs_data: list) -> dict:
+    import pandas as pd
+    from sklearn.metrics import accuracy_score
+    from sklearn.metrics import confusion_matrix
+    from sklearn.metrics import precision_recall_fscore_support
+
+    df = pd.DataFrame(docs_data)
+    y_pred = df["predicted_type"]
+    y_true = df["actual_type"]
+
+    labels = sorted(list(set(y_true.unique()) | set(y_pred.unique())))
+    precision, recall, _, _ = precision_recall_fscore_support(
+        y_true, y_pred, average="weighted", zero_division=0
+    )
+    return {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "precision": precision,
+        "recall": recall,
+        "confusion_matrix": confusion_matrix(y_true, y_pred, labels=labels),
+        "labels": labels,
+    }
+
+
+def review_set(size: int, seed: int = 0) -> list[dict[str, str]]:
+    rng = np.random.default_rng(seed)
+    actual = rng.choice(LABELS, size)
+    predicted = np.where(
+        rng.uniform(size=size) < 0.85, actual, rng.choice(LABELS, size)
+    )
+    return [
+        {"predicted_type": str(p), "actual_type": str(a)}
+        for p, a in zip(predicted, actual)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # Warm up the lazy imports so they are not timed.
+    sklearn_tagging_metrics(review_set(10))
+
+    print(f"{'docs':>7} {'sklearn ms':>11} {'numpy ms':>9} {'+bootstrap ms':>14}")
+    for size in args.sizes:
+        docs = review_set(size)
+
+        expected = sklearn_tagging_metrics(docs)
+        actual = calculate_tagging_metrics(docs, bootstrap_samples=0)
+        for metric in ("accuracy", "precision", "recall"):
+            assert np.isclose(expected[metric], actual[metric]), metric
+        assert expected["labels"] == actual["labels"]
+        assert (expected["confusion_matrix"] == actual["confusion_matrix"]).all()
+
+        timings = [
+            min(timeit.repeat(call, number=1, repeat=args.repeat)) * 1000
+            for call in (
+                lambda: sklearn_tagging_metrics(docs),
+                lambda: calculate_tagging_metrics(docs, bootstrap_samples=0),
+                lambda: calculate_tagging_metrics(docs),
+            )
+        ]
+        print(f"{size:>7} {timings[0]:>11.2f} {timings[1]:>9.2f} {timings[2]:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,30 @@
-from .classifier import DocumentClassificationOutput
-from .commons import get_llm_factory
-from .commons import GoogleCloudStorage
-from .extraction import DocumentFieldExtractionOutput
-from .extraction import DocumentListExtractionOutput
-from .facade import FacadeLoan
+"""
+Public entry points of the backend, resolved on first access so importing
+the package does not load the LLM, cloud and PDF clients.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "DOCUMENT_TYPE_FIELD": ".calibration",
+    "DocumentClassificationOutput": ".classifier",
+    "Deadline": ".commons",
+    "get_llm_factory": ".commons",
+    "GoogleCloudStorage": ".commons",
+    "DOCUMENT_SORT_KEYS": ".documents",
+    "DocumentIndex": ".documents",
+    "DocumentFieldExtractionOutput": ".extraction",
+    "DocumentListExtractionOutput": ".extraction",
+    "FacadeLoan": ".facade",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
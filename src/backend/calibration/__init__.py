@@ -0,0 +1,2 @@
+from .confidence_calibrator import ConfidenceCalibrator
+from .confidence_calibrator import DOCUMENT_TYPE_FIELD
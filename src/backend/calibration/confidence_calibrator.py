@@ -0,0 +1,162 @@
+import threading
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+import numpy as np
+
+# Field name used for the document type confidence of the classifier.
+DOCUMENT_TYPE_FIELD = "__document_type__"
+
+ISOTONIC = "isotonic"
+PLATT = "platt"
+
+
+@dataclass
+class _CalibrationState:
+    confidences: list[float] = field(default_factory=list)
+    outcomes: list[float] = field(default_factory=list)
+    pending: int = 0
+    model: Any = None
+
+
+class ConfidenceCalibrator:
+    """
+    Maps the self-reported confidence of the model to the observed
+    probability of being correct, per (doc_type, field), from review
+    outcomes.
+
+    Outcomes accumulate incrementally and a key is refitted once
+    `refit_every` new outcomes have arrived. Keys with fewer than
+    `min_samples` outcomes, or with a single outcome class, keep the raw
+    confidence.
+    """
+
+    def __init__(
+        self,
+        method: str = ISOTONIC,
+        min_samples: int = 30,
+        refit_every: int = 20,
+        max_samples: int = 5000,
+    ):
+        if method not in (ISOTONIC, PLATT):
+            raise ValueError(f"Unknown calibration method: {method}")
+
+        self._method = method
+        self._min_samples = min_samples
+        self._refit_every = refit_every
+        self._max_samples = max_samples
+        self._states: dict[tuple[str, str], _CalibrationState] = {}
+        self._lock = threading.Lock()
+
+    def add_outcomes(
+        self,
+        doc_type: str,
+        field_name: str,
+        confidences: list[float] | np.ndarray,
+        correct: list[float] | np.ndarray,
+    ):
+        """
+        Adds reviewed predictions: their raw confidence and whether the
+        reviewer kept them (1.0) or corrected them (0.0).
+        """
+        with self._lock:
+            state = self._states.setdefault((doc_type, field_name), _CalibrationState())
+            state.confidences.extend(float(value) for value in confidences)
+            state.outcomes.extend(float(value) for value in correct)
+            state.pending += len(confidences)
+
+            if len(state.confidences) > self._max_samples:
+                del state.confidences[: -self._max_samples]
+                del state.outcomes[: -self._max_samples]
+
+            if state.pending >= self._refit_every or state.model is None:
+                self._fit(state)
+
+    def _fit(self, state: _CalibrationState):
+        outcomes = np.asarray(state.outcomes)
+        if outcomes.size < self._min_samples or np.unique(outcomes).size < 2:
+            return
+
+        confidences = np.asarray(state.confidences)
+        if self._method == ISOTONIC:
+            from sklearn.isotonic import IsotonicRegression  # type: ignore[import-untyped]
+
+            model = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip")
+            model.fit(confidences, outcomes)
+        else:
+            from sklearn.linear_model import LogisticRegression  # type: ignore[import-untyped]
+
+            model = LogisticRegression()
+            model.fit(confidences.reshape(-1, 1), outcomes.astype(int))
+
+        state.model = model
+        state.pending = 0
+
+    def _predict(self, model, confidences: np.ndarray) -> np.ndarray:
+        if self._method == ISOTONIC:
+            return model.predict(confidences)
+        return model.predict_proba(confidences.reshape(-1, 1))[:, 1]
+
+    def is_fitted(self, doc_type: str, field_name: str) -> bool:
+        state = self._states.get((doc_type, field_name))
+        return state is not None and state.model is not None
+
+    def calibrate(self, doc_type: str, field_name: str, confidence: float) -> float:
+        """
+        Returns the calibrated confidence, or the raw one when the key has
+        no fitted model yet.
+        """
+        state = self._states.get((doc_type, field_name))
+        if state is None or state.model is None:
+            return confidence
+        return float(self._predict(state.model, np.asarray([float(confidence)]))[0])
+
+    def auto_approve_rate(
+        self, doc_type: str, field_name: str, target_error_rate: float = 0.02
+    ) -> dict[str, float] | None:
+        """
+        Finds the lowest calibrated threshold whose approved predictions stay
+        within the target error rate on the reviewed outcomes.
+
+        Returns:
+            The threshold, the share of predictions it would auto-approve,
+            the observed error rate among them and the number of samples,
+            or None without reviewed outcomes.
+        """
+        with self._lock:
+            state = self._states.get((doc_type, field_name))
+            if state is None or not state.outcomes:
+                return None
+            confidences = np.asarray(state.confidences)
+            outcomes = np.asarray(state.outcomes)
+            model = state.model
+
+        scores = self._predict(model, confidences) if model is not None else confidences
+        order = np.argsort(-scores, kind="stable")
+        sorted_scores = scores[order]
+        errors = np.cumsum(1.0 - outcomes[order])
+        error_rates = errors / np.arange(1, order.size + 1)
+
+        # A threshold approves every tied score, so only cut between ties.
+        cuts = np.append(sorted_scores[1:] != sorted_scores[:-1], True)
+        within_target = np.flatnonzero((error_rates <= target_error_rate) & cuts)
+        if within_target.size == 0:
+            return {
+                "threshold": 1.0,
+                "auto_approve_rate": 0.0,
+                "error_rate": 0.0,
+                "samples": int(order.size),
+            }
+
+        approved = within_target[-1] + 1
+        return {
+            "threshold": float(sorted_scores[approved - 1]),
+            "auto_approve_rate": float(approved / order.size),
+            "error_rate": float(error_rates[approved - 1]),
+            "samples": int(order.size),
+        }
+
+    def keys(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return list(self._states)
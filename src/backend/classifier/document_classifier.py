@@ -1,9 +1,10 @@
 from typing import Any
 
-from google.genai import types
 from pydantic import BaseModel
 from pydantic import Field
 
+from ..commons import call_timeout_config
+from ..commons import get_usage_ledger
 from ..commons import LLM
 from ..prompts import Prompt
 
@@ -30,27 +31,80 @@ class DocumentClassifier:
         self._prompt = prompt
 
     def classify_document(
-        self, document_content_id: str
+        self,
+        document_content_id: str,
+        document_name: str = "",
+        model: str | None = None,
+        config_overrides: dict[str, Any] | None = None,
     ) -> tuple[DocumentClassificationOutput, dict[str, Any]]:
+        """
+        Classifies a loaded document.
+
+        Args:
+            document_content_id: The document as loaded by the LLM client.
+            document_name: The name the usage is recorded under.
+            model: Overrides the model of the prompt.
+            config_overrides: Overrides of the generation config.
+        """
+        request = self._build_request(document_content_id, model, config_overrides)
+        response, usage = self._llm_client.generate(**request)
+        return self._parse_response(response, usage, request["model"], document_name)
+
+    async def aclassify_document(
+        self,
+        document_content_id: str,
+        document_name: str = "",
+        model: str | None = None,
+        config_overrides: dict[str, Any] | None = None,
+    ) -> tuple[DocumentClassificationOutput, dict[str, Any]]:
+        """
+        Async variant of classify_document, awaiting the LLM instead of
+        blocking a thread.
+        """
+        request = self._build_request(document_content_id, model, config_overrides)
+        response, usage = await self._llm_client.agenerate(**request)
+        return self._parse_response(response, usage, request["model"], document_name)
+
+    def _build_request(
+        self,
+        document_content_id: str,
+        model: str | None,
+        config_overrides: dict[str, Any] | None,
+    ) -> dict[str, Any]:
         if not self._prompt:
             raise ValueError("Unknown Clasifier Prompt")
 
-        prompt = self._prompt.create()
+        from google.genai import types
 
-        response, usage = self._llm_client.generate(
-            prompt=prompt["instruction"],
-            model=prompt["model"],
-            document_cache_id=document_content_id,
-            config={
+        prompt = self._prompt.create()
+        return {
+            "prompt": prompt["instruction"],
+            "model": model or prompt["model"],
+            "document_cache_id": document_content_id,
+            "config": {
                 "response_mime_type": "application/json",
                 "response_json_schema": DocumentClassificationOutput.model_json_schema(),
                 "temperature": 0.1,
                 "thinking_config": types.ThinkingConfig(thinking_level="minimal"),
                 "media_resolution": types.MediaResolution.MEDIA_RESOLUTION_HIGH,
+                **call_timeout_config(),
+                **(config_overrides or {}),
             },
-        )
+        }
 
+    @staticmethod
+    def _parse_response(
+        response: str, usage, model: str, document_name: str
+    ) -> tuple[DocumentClassificationOutput, dict[str, Any]]:
         document_classification = DocumentClassificationOutput.model_validate_json(
             response
         )
+
+        get_usage_ledger().record(
+            stage="classification",
+            model=model,
+            usage_metadata=usage,
+            document_type=document_classification.document_type,
+            document_name=document_name,
+        )
         return document_classification, usage
@@ -1,4 +1,47 @@
+from .deadline import call_timeout_config
+from .deadline import current_deadline
+from .deadline import Deadline
+from .deadline import deadline_scope
+from .deadline import DEFAULT_DEADLINE_SECONDS
+from .deadline import DEGRADATION_THRESHOLDS
+from .in_memory_firestore import InMemoryFirestore
+from .llm_factory import FakeLLM
 from .llm_factory import get_llm_factory
 from .llm_factory import LLM
 from .llm_factory import LLMFactory
+from .llm_replay import RecordingLLM
+from .llm_replay import RecordingLLMFactory
+from .llm_replay import ReplayLLM
+from .llm_router import DEFAULT_ROUTES
+from .llm_router import DEFAULT_ROUTING_RULES
+from .llm_router import LLMRouter
+from .llm_router import Route
+from .llm_router import RouteDecision
+from .llm_router import RoutingRule
+from .profiler import current_profiled_request
+from .profiler import DEFAULT_SAMPLE_INTERVAL_SECONDS
+from .profiler import get_profiler
+from .profiler import profile_scope
+from .profiler import ProfiledRequest
+from .profiler import SamplingProfiler
+from .profiler import set_profiled_document_type
+from .staged_pipeline import PipelineStage
+from .staged_pipeline import STAGE_KINDS
+from .staged_pipeline import StagedPipeline
+from .staged_pipeline import StageStats
 from .storage import GoogleCloudStorage
+from .storage import LocalStorage
+from .tracing import get_tracer
+from .tracing import InMemorySpanExporter
+from .tracing import JsonlSpanExporter
+from .tracing import OpenTelemetrySpanExporter
+from .tracing import Span
+from .tracing import SpanExporter
+from .tracing import Tracer
+from .usage import calculate_usage_cost
+from .usage import DEFAULT_MODEL
+from .usage import get_model_pricing
+from .usage import get_usage_ledger
+from .usage import MODEL_PRICING
+from .usage import UsageLedger
+from .usage import UsageRecord
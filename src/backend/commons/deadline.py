@@ -0,0 +1,121 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Iterator
+
+from .tracing import get_tracer
+
+DEFAULT_DEADLINE_SECONDS = 30.0
+
+# A stage degrades when fewer seconds than this are left as it starts.
+DEGRADATION_THRESHOLDS: dict[str, float] = {
+    "skip_escalation": 20.0,
+    "low_media_resolution": 15.0,
+    "skip_learning_context": 10.0,
+    "defer_annotation": 5.0,
+}
+
+# Per-call timeouts never drop below this, so a late call still has a chance
+# to answer instead of failing outright.
+MIN_CALL_TIMEOUT_SECONDS = 5.0
+
+
+@dataclass
+class Deadline:
+    """
+    The time budget of one document, from upload to annotation. Stages read
+    what is left, bound their calls with it and record the degradations they
+    apply when time is short.
+    """
+
+    budget_seconds: float = DEFAULT_DEADLINE_SECONDS
+    started_at: float = field(default_factory=time.time)
+    degradations: list[str] = field(default_factory=list)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.time() - self.started_at
+
+    def remaining(self) -> float:
+        return self.budget_seconds - self.elapsed_seconds
+
+    @property
+    def missed(self) -> bool:
+        return self.remaining() <= 0
+
+    def call_timeout(self) -> float:
+        """
+        Seconds a single call may take.
+        """
+        return max(self.remaining(), MIN_CALL_TIMEOUT_SECONDS)
+
+    def should_degrade(self, degradation: str) -> bool:
+        """
+        Whether a stage should take its degraded path, which is then
+        recorded on the deadline and the current span.
+        """
+        remaining = self.remaining()
+        if remaining >= DEGRADATION_THRESHOLDS[degradation]:
+            return False
+
+        with self._lock:
+            if degradation not in self.degradations:
+                self.degradations.append(degradation)
+        span = get_tracer().current_span()
+        if span is not None:
+            span.set_attribute(f"degraded.{degradation}", True)
+        print(f"Deadline: {degradation} with {remaining:.1f}s left")
+        return True
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Sent to the process stages of a pipeline without its lock.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+_current_deadline: contextvars.ContextVar[Deadline | None] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+def current_deadline() -> Deadline | None:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    """
+    Makes a deadline visible to the stages run inside the block; without
+    one, the enclosing deadline, if any, stays in effect.
+    """
+    if deadline is None:
+        yield current_deadline()
+        return
+
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def call_timeout_config() -> dict[str, Any]:
+    """
+    Generation config bounding a call by the current deadline, if any.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return {}
+    return {"http_options": {"timeout": int(deadline.call_timeout() * 1000)}}
@@ -0,0 +1,260 @@
+import copy
+import datetime
+import operator
+import threading
+import uuid
+from typing import Any
+from typing import Iterator
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "not-in": lambda value, options: value not in options,
+    "array_contains": lambda values, value: value in (values or []),
+}
+
+
+def _resolve(data: dict[str, Any], previous: dict[str, Any]) -> dict[str, Any]:
+    """
+    Applies the Firestore write transforms the app uses: server timestamps
+    and increments.
+    """
+    from google.cloud.firestore_v1 import transforms
+
+    resolved = {}
+    for key, value in data.items():
+        if value is transforms.SERVER_TIMESTAMP:
+            value = datetime.datetime.now(datetime.timezone.utc)
+        elif isinstance(value, transforms.Increment):
+            value = (previous.get(key) or 0) + value.value
+        resolved[key] = copy.deepcopy(value)
+    return resolved
+
+
+class InMemoryDocumentSnapshot:
+    def __init__(self, reference: "InMemoryDocumentReference", data: dict | None):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict[str, Any] | None:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class InMemoryDocumentReference:
+    def __init__(self, client: "InMemoryFirestore", collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+
+    def get(self, transaction=None) -> InMemoryDocumentSnapshot:
+        with self._client._lock:
+            data = self._client._collections.get(self._collection, {}).get(self.id)
+        return InMemoryDocumentSnapshot(self, data)
+
+    def set(self, data: dict[str, Any], merge: bool = False):
+        with self._client._lock:
+            documents = self._client._collections.setdefault(self._collection, {})
+            previous = documents.get(self.id) or {}
+            resolved = _resolve(data, previous)
+            documents[self.id] = {**previous, **resolved} if merge else resolved
+
+    def update(self, data: dict[str, Any]):
+        with self._client._lock:
+            documents = self._client._collections.get(self._collection, {})
+            if self.id not in documents:
+                raise ValueError(f"No document to update: {self._collection}/{self.id}")
+            documents[self.id].update(_resolve(data, documents[self.id]))
+
+    def delete(self):
+        with self._client._lock:
+            self._client._collections.get(self._collection, {}).pop(self.id, None)
+
+
+class InMemoryQuery:
+    def __init__(
+        self,
+        client: "InMemoryFirestore",
+        collection: str,
+        filters: tuple = (),
+        orders: tuple = (),
+        limit: int | None = None,
+    ):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+
+    def where(self, field: str, op: str, value: Any) -> "InMemoryQuery":
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        return InMemoryQuery(
+            self._client,
+            self._collection,
+            self._filters + ((field, _OPERATORS[op], value),),
+            self._orders,
+            self._limit,
+        )
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "InMemoryQuery":
+        return InMemoryQuery(
+            self._client,
+            self._collection,
+            self._filters,
+            self._orders + ((field, direction == "DESCENDING"),),
+            self._limit,
+        )
+
+    def limit(self, count: int) -> "InMemoryQuery":
+        return InMemoryQuery(
+            self._client, self._collection, self._filters, self._orders, count
+        )
+
+    def stream(self) -> Iterator[InMemoryDocumentSnapshot]:
+        with self._client._lock:
+            documents = list(
+                self._client._collections.get(self._collection, {}).items()
+            )
+
+        matches = [
+            (document_id, data)
+            for document_id, data in documents
+            if all(
+                field in data and compare(data[field], value)
+                for field, compare, value in self._filters
+            )
+        ]
+        # Like Firestore, ordering on a field leaves out documents without it.
+        for field, descending in reversed(self._orders):
+            matches = [match for match in matches if field in match[1]]
+            matches.sort(key=lambda match: match[1][field], reverse=descending)
+
+        for document_id, data in matches[: self._limit]:
+            yield InMemoryDocumentSnapshot(
+                InMemoryDocumentReference(self._client, self._collection, document_id),
+                copy.deepcopy(data),
+            )
+
+    def get(self) -> list[InMemoryDocumentSnapshot]:
+        return list(self.stream())
+
+
+class InMemoryCollectionReference(InMemoryQuery):
+    def __init__(self, client: "InMemoryFirestore", collection: str):
+        super().__init__(client, collection)
+
+    @property
+    def id(self) -> str:
+        return self._collection
+
+    def document(self, document_id: str | None = None) -> InMemoryDocumentReference:
+        return InMemoryDocumentReference(
+            self._client, self._collection, document_id or uuid.uuid4().hex
+        )
+
+    def add(self, data: dict[str, Any]) -> tuple[datetime.datetime, Any]:
+        reference = self.document()
+        reference.set(data)
+        return datetime.datetime.now(datetime.timezone.utc), reference
+
+
+class InMemoryWriteBatch:
+    def __init__(self):
+        self._writes: list[tuple] = []
+
+    def set(self, reference: InMemoryDocumentReference, data, merge: bool = False):
+        self._writes.append((reference.set, (data, merge)))
+
+    def update(self, reference: InMemoryDocumentReference, data):
+        self._writes.append((reference.update, (data,)))
+
+    def delete(self, reference: InMemoryDocumentReference):
+        self._writes.append((reference.delete, ()))
+
+    def commit(self):
+        for write, args in self._writes:
+            write(*args)
+        self._writes = []
+
+
+class InMemoryTransaction:
+    """
+    Runs a function decorated with firestore.transactional while holding
+    the client lock, so its reads and writes apply as one step.
+    """
+
+    _max_attempts = 1
+    _read_only = False
+
+    def __init__(self, client: "InMemoryFirestore"):
+        self._client = client
+        self._id: bytes | None = None
+        self._writes = InMemoryWriteBatch()
+
+    def set(self, reference: InMemoryDocumentReference, data, merge: bool = False):
+        self._writes.set(reference, data, merge)
+
+    def update(self, reference: InMemoryDocumentReference, data):
+        self._writes.update(reference, data)
+
+    def delete(self, reference: InMemoryDocumentReference):
+        self._writes.delete(reference)
+
+    def _clean_up(self):
+        self._writes = InMemoryWriteBatch()
+
+    def _begin(self, retry_id: bytes | None = None):
+        self._client._lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self):
+        try:
+            self._writes.commit()
+        finally:
+            self._end()
+
+    def _rollback(self):
+        self._writes = InMemoryWriteBatch()
+        self._end()
+
+    def _end(self):
+        if self._id is not None:
+            self._id = None
+            self._client._lock.release()
+
+
+class InMemoryFirestore:
+    """
+    Stand-in for the Firestore client with the subset of its API the app
+    uses: collections, documents, simple queries, batches, transactions,
+    server timestamps and increments. Data lives in the process only.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections: dict[str, dict[str, dict[str, Any]]] = {}
+
+    def collection(self, name: str) -> InMemoryCollectionReference:
+        return InMemoryCollectionReference(self, name)
+
+    def batch(self) -> InMemoryWriteBatch:
+        return InMemoryWriteBatch()
+
+    def transaction(self) -> InMemoryTransaction:
+        return InMemoryTransaction(self)
@@ -1,12 +1,15 @@
+import asyncio
 import io
+import json
+import time
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import Iterator
 from typing import Any
 from typing import Dict
 from typing import Type
 
-import httpx
-from google import genai
+from .tracing import get_tracer
 
 
 class LLM(ABC):
@@ -33,6 +36,40 @@ class LLM(ABC):
         """
         pass
 
+    def generate_stream(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> Iterator[tuple[str, Any]]:
+        """
+        Generates content based on a prompt, yielding it as it is produced.
+
+        Args:
+            prompt: The input prompt for the LLM.
+
+        Returns:
+            An iterator of (text chunk, usage metadata or None) tuples. By
+            default the whole response is yielded as a single chunk.
+        """
+        yield self.generate(prompt, model, document_cache_id, config)
+
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        """
+        Async variant of generate. By default the blocking call runs in a
+        worker thread; clients with a native async API override it.
+        """
+        return await asyncio.to_thread(
+            self.generate, prompt, model, document_cache_id, config
+        )
+
     @abstractmethod
     def load_document(self, document_path: str):
         """
@@ -43,6 +80,12 @@ class LLM(ABC):
         """
         pass
 
+    async def aload_document(self, document_path: str):
+        """
+        Async variant of load_document, in a worker thread by default.
+        """
+        return await asyncio.to_thread(self.load_document, document_path)
+
 
 class GeminiLLM(LLM):
     """
@@ -56,6 +99,8 @@ class GeminiLLM(LLM):
         Args:
             api_key: The API key for the Gemini API.
         """
+        from google import genai
+
         self.client = genai.Client(api_key=api_key.strip())
 
     def generate(
@@ -69,16 +114,78 @@ class GeminiLLM(LLM):
         Generates content using the Gemini model.
         """
         try:
-            response = self.client.models.generate_content(
-                model=model,
-                contents=[document_cache_id, prompt],
-                config=config,
-            )
+            with get_tracer().span("llm.generate", model=model):
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=[document_cache_id, prompt],
+                    config=config,
+                )
             return response.text, response.usage_metadata
         except Exception as e:
             print(f"An error occurred while generating content with Gemini: {e}")
             raise
 
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Any]:
+        """
+        Generates content through the async Gemini client, without holding
+        a thread while the request is in flight.
+        """
+        from google.genai import types
+
+        try:
+            with get_tracer().span("llm.generate", model=model):
+                response = await self.client.aio.models.generate_content(
+                    model=model,
+                    contents=[document_cache_id, prompt],
+                    config=types.GenerateContentConfig.model_validate(config),
+                )
+            return response.text or "", response.usage_metadata
+        except Exception as e:
+            print(f"An error occurred while generating content with Gemini: {e}")
+            raise
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> Iterator[tuple[str, Any]]:
+        """
+        Generates content using the Gemini streaming API.
+        """
+        try:
+            yield from get_tracer().stream(
+                "llm.generate_stream",
+                self._stream_chunks(prompt, model, document_cache_id, config),
+                model=model,
+            )
+        except Exception as e:
+            print(f"An error occurred while streaming content with Gemini: {e}")
+            raise
+
+    def _stream_chunks(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any],
+    ) -> Iterator[tuple[str, Any]]:
+        from google.genai import types
+
+        for chunk in self.client.models.generate_content_stream(
+            model=model,
+            contents=[document_cache_id, prompt],
+            config=types.GenerateContentConfig.model_validate(config),
+        ):
+            yield chunk.text or "", chunk.usage_metadata
+
     def load_document(self, document_path: str):
         """
         Loads a document into the LLM's cache or context.
@@ -86,18 +193,114 @@ class GeminiLLM(LLM):
         Args:
             document_path: The path to the document to load.
         """
+        import httpx
+
         try:
-            doc_io = io.BytesIO(httpx.get(document_path).content)
+            with get_tracer().span("llm.download_document"):
+                doc_io = io.BytesIO(httpx.get(document_path).content)
 
-            doc_id = self.client.files.upload(
-                file=doc_io, config=dict(mime_type="application/pdf")
-            )
+            with get_tracer().span("llm.upload_document"):
+                doc_id = self.client.files.upload(
+                    file=doc_io, config=dict(mime_type="application/pdf")
+                )
+            return doc_id
+        except Exception as e:
+            print(f"An error occurred while loading document with Gemini: {e}")
+            raise
+
+    async def aload_document(self, document_path: str):
+        """
+        Async variant of load_document, on the async HTTP and Gemini clients.
+        """
+        import httpx
+
+        try:
+            with get_tracer().span("llm.download_document"):
+                async with httpx.AsyncClient() as http_client:
+                    response = await http_client.get(document_path)
+                doc_io = io.BytesIO(response.content)
+
+            with get_tracer().span("llm.upload_document"):
+                doc_id = await self.client.aio.files.upload(
+                    file=doc_io, config=dict(mime_type="application/pdf")
+                )
             return doc_id
         except Exception as e:
             print(f"An error occurred while loading document with Gemini: {e}")
             raise
 
 
+class FakeLLM(LLM):
+    """
+    Local LLM returning canned responses, for tests and offline runs.
+    """
+
+    def __init__(
+        self,
+        responses: Dict[str, str] | None = None,
+        default_response: str | None = None,
+        latency_seconds: float = 0.0,
+    ):
+        """
+        Initializes the fake LLM.
+
+        Args:
+            responses: The response text per model name.
+            default_response: The response of the other models, by default
+                an unknown document with low confidence.
+            latency_seconds: Time each call sleeps, to simulate the network.
+        """
+        self.responses = dict(responses or {})
+        self.default_response = default_response or json.dumps(
+            {
+                "document_type": "unknown",
+                "confidence": 0.0,
+                "reasoning": "Fake response.",
+                "extracted_fields": [],
+            }
+        )
+        self.latency_seconds = latency_seconds
+        self.calls: list[tuple[str, str]] = []
+
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        with get_tracer().span("llm.generate", model=model, fake=True):
+            time.sleep(self.latency_seconds)
+            return self._respond(prompt, model, document_cache_id)
+
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        with get_tracer().span("llm.generate", model=model, fake=True):
+            await asyncio.sleep(self.latency_seconds)
+            return self._respond(prompt, model, document_cache_id)
+
+    def _respond(
+        self, prompt: str, model: str, document_cache_id: str
+    ) -> tuple[str, Dict[str, Any]]:
+        self.calls.append((model, document_cache_id))
+        response = self.responses.get(model, self.default_response)
+        return response, {
+            "prompt_token_count": len(prompt) // 4,
+            "candidates_token_count": len(response) // 4,
+        }
+
+    def load_document(self, document_path: str):
+        return document_path
+
+    async def aload_document(self, document_path: str):
+        return document_path
+
+
 class LLMFactory:
     """
     Factory for creating LLM clients.
@@ -134,8 +337,13 @@ class LLMFactory:
 
 def get_llm_factory() -> LLMFactory:
     """
-    Returns an instance of the LLMFactory with Gemini pre-registered.
+    Returns an instance of the LLMFactory with Gemini, the local fake and
+    the replay of recorded calls pre-registered.
     """
+    from .llm_replay import ReplayLLM
+
     factory = LLMFactory()
     factory.register_llm("gemini", GeminiLLM)
+    factory.register_llm("fake", FakeLLM)
+    factory.register_llm("replay", ReplayLLM)
     return factory
@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+
+from .llm_factory import LLM
+from .llm_factory import LLMFactory
+from .tracing import get_tracer
+
+_RECORDING_LOCK = threading.Lock()
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def _schema_hash(config: Dict[str, Any]) -> str:
+    """
+    Identifies the kind of call, e.g. the extraction of one document type,
+    by its response schema.
+    """
+    schema = json.dumps(config.get("response_json_schema"), sort_keys=True, default=str)
+    return hashlib.sha1(schema.encode("utf-8")).hexdigest()
+
+
+def _document_key(document_path: str) -> str:
+    """
+    The file name of a loaded document, the same for its bucket URL when
+    recording and its local copy when replaying.
+    """
+    return os.path.basename(str(document_path).split("?")[0])
+
+
+def _usage_to_dict(usage) -> dict[str, Any] | None:
+    if usage is None or isinstance(usage, dict):
+        return usage
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(mode="json", exclude_none=True)
+    return {
+        attribute: getattr(usage, attribute)
+        for attribute in (
+            "prompt_token_count",
+            "cached_content_token_count",
+            "candidates_token_count",
+            "thoughts_token_count",
+        )
+        if getattr(usage, attribute, None) is not None
+    }
+
+
+class RecordingLLM(LLM):
+    """
+    Wraps an LLM and appends each document load and generation, with its
+    response, usage and timing, to a JSONL recording for ReplayLLM.
+    """
+
+    def __init__(self, llm: LLM, recording_path: str):
+        self._llm = llm
+        self._recording_path = recording_path
+        self._document_keys: dict[int, tuple[Any, str]] = {}
+        os.makedirs(os.path.dirname(recording_path) or ".", exist_ok=True)
+
+    def _write(self, record: dict[str, Any]):
+        line = json.dumps({**record, "timestamp": time.time()})
+        with _RECORDING_LOCK, open(self._recording_path, "a") as file:
+            file.write(line + "\n")
+
+    def _key_for(self, document_cache_id) -> str:
+        entry = self._document_keys.get(id(document_cache_id))
+        if entry is not None and entry[0] is document_cache_id:
+            return entry[1]
+        return _document_key(getattr(document_cache_id, "name", document_cache_id))
+
+    def _loaded(self, document_path: str, document_id, latency_seconds: float):
+        key = _document_key(document_path)
+        # The id object is kept so its id() is not reused while mapped.
+        self._document_keys[id(document_id)] = (document_id, key)
+        self._write(
+            {
+                "kind": "load_document",
+                "document": key,
+                "latency_seconds": latency_seconds,
+            }
+        )
+        return document_id
+
+    def _generated(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id,
+        config: Dict[str, Any],
+        chunks: list[tuple[str, float]],
+        usage,
+    ):
+        self._write(
+            {
+                "kind": "generate",
+                "model": model,
+                "document": self._key_for(document_cache_id),
+                "prompt_hash": _prompt_hash(prompt),
+                "schema_hash": _schema_hash(config),
+                "chunks": chunks,
+                "latency_seconds": chunks[-1][1] if chunks else 0.0,
+                "usage": _usage_to_dict(usage),
+            }
+        )
+
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        start = time.perf_counter()
+        response, usage = self._llm.generate(prompt, model, document_cache_id, config)
+        self._generated(
+            prompt,
+            model,
+            document_cache_id,
+            config,
+            [(response, time.perf_counter() - start)],
+            usage,
+        )
+        return response, usage
+
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        start = time.perf_counter()
+        response, usage = await self._llm.agenerate(
+            prompt, model, document_cache_id, config
+        )
+        self._generated(
+            prompt,
+            model,
+            document_cache_id,
+            config,
+            [(response, time.perf_counter() - start)],
+            usage,
+        )
+        return response, usage
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> Iterator[tuple[str, Any]]:
+        start = time.perf_counter()
+        chunks = []
+        usage = None
+        for chunk, chunk_usage in self._llm.generate_stream(
+            prompt, model, document_cache_id, config
+        ):
+            chunks.append((chunk, time.perf_counter() - start))
+            usage = chunk_usage or usage
+            yield chunk, chunk_usage
+        self._generated(prompt, model, document_cache_id, config, chunks, usage)
+
+    def load_document(self, document_path: str):
+        start = time.perf_counter()
+        document_id = self._llm.load_document(document_path)
+        return self._loaded(document_path, document_id, time.perf_counter() - start)
+
+    async def aload_document(self, document_path: str):
+        start = time.perf_counter()
+        document_id = await self._llm.aload_document(document_path)
+        return self._loaded(document_path, document_id, time.perf_counter() - start)
+
+
+class RecordingLLMFactory(LLMFactory):
+    """
+    Creates the clients of another factory wrapped in RecordingLLM, all
+    appending to the same recording.
+    """
+
+    def __init__(self, llm_factory: LLMFactory, recording_path: str):
+        super().__init__()
+        self._llm_factory = llm_factory
+        self._recording_path = recording_path
+
+    def register_llm(self, llm_type, llm_class):
+        self._llm_factory.register_llm(llm_type, llm_class)
+
+    def create_llm(self, llm_type: str, config: Dict[str, Any]) -> LLM:
+        return RecordingLLM(
+            self._llm_factory.create_llm(llm_type, config), self._recording_path
+        )
+
+
+class ReplayLLM(LLM):
+    """
+    Serves the responses of a recording made with RecordingLLM, sleeping
+    the recorded latency times latency_scale (0.1 replays ten times
+    faster, 0 without waiting).
+
+    Generations are matched on model, document and prompt, then on model,
+    document and response schema alone, since prompts embed learning notes
+    that differ between environments. Repeated calls step through the
+    matching records and start over once they are exhausted.
+    """
+
+    def __init__(self, recording_path: str, latency_scale: float = 1.0):
+        if latency_scale < 0:
+            raise ValueError("latency_scale must not be negative")
+
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._generations: dict[tuple, list[dict[str, Any]]] = {}
+        self._load_latencies: dict[str, float] = {}
+        self._cursors: dict[tuple, int] = {}
+
+        with open(recording_path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["kind"] == "load_document":
+                    self._load_latencies[record["document"]] = record["latency_seconds"]
+                    continue
+                for key in (
+                    (record["model"], record["document"], record["prompt_hash"]),
+                    (record["model"], record["document"], record["schema_hash"]),
+                ):
+                    self._generations.setdefault(key, []).append(record)
+
+    def _next_record(
+        self, prompt: str, model: str, document_cache_id, config: Dict[str, Any]
+    ) -> dict[str, Any]:
+        document = _document_key(document_cache_id)
+        for key in (
+            (model, document, _prompt_hash(prompt)),
+            (model, document, _schema_hash(config)),
+        ):
+            records = self._generations.get(key)
+            if records:
+                with self._lock:
+                    cursor = self._cursors.get(key, 0)
+                    self._cursors[key] = cursor + 1
+                return records[cursor % len(records)]
+        raise ValueError(f"No recorded response for {model} on {document}")
+
+    @staticmethod
+    def _response(record: dict[str, Any]) -> str:
+        return "".join(chunk for chunk, _ in record["chunks"])
+
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        with get_tracer().span("llm.generate", model=model, replay=True):
+            record = self._next_record(prompt, model, document_cache_id, config)
+            time.sleep(record["latency_seconds"] * self.latency_scale)
+            return self._response(record), record["usage"]
+
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> tuple[str, Dict[str, Any]]:
+        with get_tracer().span("llm.generate", model=model, replay=True):
+            record = self._next_record(prompt, model, document_cache_id, config)
+            await asyncio.sleep(record["latency_seconds"] * self.latency_scale)
+            return self._response(record), record["usage"]
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any] = {},
+    ) -> Iterator[tuple[str, Any]]:
+        yield from get_tracer().stream(
+            "llm.generate_stream",
+            self._replay_chunks(prompt, model, document_cache_id, config),
+            model=model,
+            replay=True,
+        )
+
+    def _replay_chunks(
+        self,
+        prompt: str,
+        model: str,
+        document_cache_id: str,
+        config: Dict[str, Any],
+    ) -> Iterator[tuple[str, Any]]:
+        record = self._next_record(prompt, model, document_cache_id, config)
+        chunks = record["chunks"]
+        previous_offset = 0.0
+        for index, (chunk, offset) in enumerate(chunks):
+            time.sleep((offset - previous_offset) * self.latency_scale)
+            previous_offset = offset
+            yield chunk, record["usage"] if index == len(chunks) - 1 else None
+
+    def load_document(self, document_path: str):
+        document = _document_key(document_path)
+        time.sleep(self._load_latencies.get(document, 0.0) * self.latency_scale)
+        return document
+
+    async def aload_document(self, document_path: str):
+        document = _document_key(document_path)
+        await asyncio.sleep(
+            self._load_latencies.get(document, 0.0) * self.latency_scale
+        )
+        return document
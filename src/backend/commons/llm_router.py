@@ -0,0 +1,316 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+from .llm_factory import LLM
+from .llm_factory import LLMFactory
+from .tracing import get_tracer
+from .usage import DEFAULT_MODEL
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    A provider and model an LLM call can be sent to, with overrides of the
+    generation config the stage would otherwise use.
+    """
+
+    name: str
+    llm_type: str
+    model: str
+    generation_config: dict[str, Any] = field(default_factory=dict, hash=False)
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """
+    Sends the calls of a stage to a route. Empty criteria match anything.
+    """
+
+    route: str
+    stage: str | None = None
+    document_types: tuple[str, ...] = ()
+    max_pages: int | None = None
+
+    def matches(self, stage: str, document_type: str, page_count: int) -> bool:
+        return (
+            (self.stage is None or self.stage == stage)
+            and (not self.document_types or document_type in self.document_types)
+            and (self.max_pages is None or 0 < page_count <= self.max_pages)
+        )
+
+
+@dataclass
+class RouteDecision:
+    """
+    The route picked for one call, and why.
+    """
+
+    stage: str
+    document_type: str
+    page_count: int
+    route: str
+    model: str
+    reason: str
+    escalated_from: str = ""
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class RouteStats:
+    """
+    Observed outcomes of a route for one stage and document type.
+    """
+
+    calls: int = 0
+    latency_seconds: float = 0.0
+    reviews: int = 0
+    correct: float = 0.0
+
+    @property
+    def mean_latency_seconds(self) -> float | None:
+        return self.latency_seconds / self.calls if self.calls else None
+
+    @property
+    def accuracy(self) -> float | None:
+        return self.correct / self.reviews if self.reviews else None
+
+
+# Ordered from the cheapest and fastest to the strongest tier.
+DEFAULT_ROUTES = (
+    Route(
+        "lite",
+        "gemini",
+        "gemini-2.5-flash-lite",
+        {
+            "thinking_config": {"thinking_budget": 0},
+            "media_resolution": "MEDIA_RESOLUTION_MEDIUM",
+        },
+    ),
+    Route("flash", "gemini", DEFAULT_MODEL),
+    Route(
+        "pro",
+        "gemini",
+        "gemini-3-pro-preview",
+        {"thinking_config": {"thinking_level": "low"}},
+    ),
+)
+
+DEFAULT_ROUTING_RULES = (
+    RoutingRule(
+        route="lite",
+        stage="extraction",
+        document_types=("government_id",),
+        max_pages=2,
+    ),
+    RoutingRule(route="flash"),
+)
+
+
+class LLMRouter:
+    """
+    Picks the route of each LLM call from the stage, document type and page
+    count, then adjusts it with the accuracy and latency observed per route.
+
+    Routes are tiers ordered from the cheapest to the strongest. The first
+    matching rule gives the starting tier; a tier whose reviewed accuracy
+    is below `min_accuracy` (after `min_samples` reviews) hands over to the
+    next one, unless that one is slower than `max_latency_seconds`. A call
+    whose confidence is below `escalation_threshold` can be retried on the
+    next tier with `escalate`.
+    """
+
+    def __init__(
+        self,
+        llm_factory: LLMFactory,
+        routes: tuple[Route, ...] = DEFAULT_ROUTES,
+        rules: tuple[RoutingRule, ...] = DEFAULT_ROUTING_RULES,
+        provider_configs: dict[str, dict[str, Any]] | None = None,
+        min_accuracy: float = 0.9,
+        min_samples: int = 20,
+        max_latency_seconds: float | None = None,
+        escalation_threshold: float = 0.6,
+        max_decisions: int = 1000,
+    ):
+        if not routes:
+            raise ValueError("At least one route is required")
+        names = [route.name for route in routes]
+        if len(set(names)) != len(names):
+            raise ValueError("Route names must be unique")
+        for rule in rules:
+            if rule.route not in names:
+                raise ValueError(f"Unknown route in rule: {rule.route}")
+
+        self._llm_factory = llm_factory
+        self._routes = routes
+        self._tiers = {name: tier for tier, name in enumerate(names)}
+        self._rules = rules
+        self._provider_configs = provider_configs or {}
+        self._min_accuracy = min_accuracy
+        self._min_samples = min_samples
+        self._max_latency_seconds = max_latency_seconds
+        self._escalation_threshold = escalation_threshold
+        self._llms: dict[str, LLM] = {}
+        self._stats: dict[tuple[str, str, str], RouteStats] = {}
+        self._decisions: deque[RouteDecision] = deque(maxlen=max_decisions)
+        self._lock = threading.Lock()
+
+    @property
+    def routes(self) -> tuple[Route, ...]:
+        return self._routes
+
+    def get_route(self, name: str) -> Route:
+        if name not in self._tiers:
+            raise ValueError(f"Unknown route: {name}")
+        return self._routes[self._tiers[name]]
+
+    def get_llm(self, route: Route) -> LLM:
+        """
+        The client of the route's provider, created once per provider.
+        """
+        with self._lock:
+            llm = self._llms.get(route.llm_type)
+            if llm is None:
+                llm = self._llm_factory.create_llm(
+                    route.llm_type, self._provider_configs.get(route.llm_type, {})
+                )
+                self._llms[route.llm_type] = llm
+            return llm
+
+    def select(
+        self, stage: str, document_type: str = "", page_count: int = 0
+    ) -> RouteDecision:
+        """
+        Picks the route of a call and records the decision.
+        """
+        tier, reason = 0, "cheapest tier"
+        for rule in self._rules:
+            if rule.matches(stage, document_type, page_count):
+                tier, reason = self._tiers[rule.route], "rule"
+                break
+
+        with self._lock:
+            while tier + 1 < len(self._routes):
+                stats = self._stats.get((self._routes[tier].name, stage, document_type))
+                if (
+                    stats is None
+                    or stats.reviews < self._min_samples
+                    or stats.accuracy is None
+                    or stats.accuracy >= self._min_accuracy
+                ):
+                    break
+
+                next_stats = self._stats.get(
+                    (self._routes[tier + 1].name, stage, document_type)
+                )
+                if (
+                    self._max_latency_seconds is not None
+                    and next_stats is not None
+                    and next_stats.mean_latency_seconds is not None
+                    and next_stats.mean_latency_seconds > self._max_latency_seconds
+                ):
+                    reason += ", next tier over latency budget"
+                    break
+
+                tier += 1
+                reason = f"accuracy {stats.accuracy:.2f} below {self._min_accuracy:.2f}"
+
+        return self._decide(stage, document_type, page_count, tier, reason)
+
+    def escalate(
+        self, decision: RouteDecision, confidence: float
+    ) -> RouteDecision | None:
+        """
+        The next tier for a call whose confidence is below the escalation
+        threshold, or None when it is confident enough or already on the
+        strongest tier.
+        """
+        tier = self._tiers[decision.route]
+        if confidence >= self._escalation_threshold or tier + 1 >= len(self._routes):
+            return None
+
+        return self._decide(
+            decision.stage,
+            decision.document_type,
+            decision.page_count,
+            tier + 1,
+            f"confidence {confidence:.2f} below {self._escalation_threshold:.2f}",
+            escalated_from=decision.route,
+        )
+
+    def _decide(
+        self,
+        stage: str,
+        document_type: str,
+        page_count: int,
+        tier: int,
+        reason: str,
+        escalated_from: str = "",
+    ) -> RouteDecision:
+        route = self._routes[tier]
+        decision = RouteDecision(
+            stage=stage,
+            document_type=document_type,
+            page_count=page_count,
+            route=route.name,
+            model=route.model,
+            reason=reason,
+            escalated_from=escalated_from,
+        )
+        with self._lock:
+            self._decisions.append(decision)
+
+        span = get_tracer().current_span()
+        if span is not None:
+            span.set_attribute(f"route.{stage}", route.name)
+        return decision
+
+    def record_outcome(
+        self,
+        route: str,
+        stage: str,
+        document_type: str = "",
+        latency_seconds: float | None = None,
+        correct: float | None = None,
+    ):
+        """
+        Adds the latency of a call, or the review result (1.0 correct, 0.0
+        wrong, or the share of correct fields) of its output.
+        """
+        with self._lock:
+            stats = self._stats.setdefault((route, stage, document_type), RouteStats())
+            if latency_seconds is not None:
+                stats.calls += 1
+                stats.latency_seconds += latency_seconds
+            if correct is not None:
+                stats.reviews += 1
+                stats.correct += correct
+
+    def get_decisions(self) -> list[RouteDecision]:
+        with self._lock:
+            return list(self._decisions)
+
+    def get_stats(self) -> list[dict[str, Any]]:
+        """
+        One row per route, stage and document type, in tier order.
+        """
+        with self._lock:
+            items = sorted(
+                self._stats.items(),
+                key=lambda item: (self._tiers.get(item[0][0], -1), item[0][1:]),
+            )
+            return [
+                {
+                    "route": route,
+                    "stage": stage,
+                    "doc_type": document_type,
+                    "calls": stats.calls,
+                    "mean_latency_seconds": stats.mean_latency_seconds,
+                    "reviews": stats.reviews,
+                    "accuracy": stats.accuracy,
+                }
+                for (route, stage, document_type), stats in items
+            ]
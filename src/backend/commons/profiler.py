@@ -0,0 +1,328 @@
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterator
+
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.005
+
+# Stage of the samples taken outside any span of a profiled request.
+REQUEST_STAGE = "request"
+
+
+@dataclass
+class ProfiledRequest:
+    """
+    The stack samples of one profiled request, counted per stage (the
+    innermost span) and collapsed stack.
+    """
+
+    name: str
+    document_type: str = ""
+    started_at: float = field(default_factory=time.time)
+    samples: Counter = field(default_factory=Counter)
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def collapsed_lines(self) -> list[str]:
+        """
+        The samples in the collapsed-stack format of flamegraph tools, with
+        the document type and the stage as the two root frames.
+        """
+        document_type = self.document_type or "unknown"
+        return [
+            f"{document_type};{stage};{stack} {count}"
+            for (stage, stack), count in sorted(self.samples.items())
+        ]
+
+
+_current_request: contextvars.ContextVar[ProfiledRequest | None] = (
+    contextvars.ContextVar("profiled_request", default=None)
+)
+
+
+def current_profiled_request() -> ProfiledRequest | None:
+    return _current_request.get()
+
+
+def set_profiled_document_type(document_type: str):
+    """
+    Tags the current profiled request, if any, once its type is known.
+    """
+    request = _current_request.get()
+    if request is not None:
+        request.document_type = document_type
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of the threads working on profiled requests.
+
+    A request is profiled when its name is forced, for a set number of
+    requests, or with probability sample_rate. Its stages are the spans opened while it is
+    current, in any thread its context is copied to. A single sampler
+    thread reads every such thread's stack with sys._current_frames each
+    interval and stops once no request is profiled, so requests that are
+    not profiled only pay for a context variable lookup per span.
+
+    Samples are wall-clock: a thread waiting on the network shows in the
+    frames it waits in. Work sent to other processes is not sampled.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+        output_dir: str | None = "resources/profiles",
+        max_depth: int = 128,
+    ):
+        """
+        Args:
+            sample_rate: Share of the requests profiled, in [0, 1].
+            interval_seconds: Time between two samples of a thread.
+            output_dir: Where the collapsed stacks of each profiled request
+                are written; kept in memory only when None.
+            max_depth: Frames kept of the deepest stacks, from the root.
+        """
+        self.configure(sample_rate=sample_rate, interval_seconds=interval_seconds)
+        self.output_dir = output_dir
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._forced: dict[str, int] = {}
+        self._threads: dict[int, tuple[ProfiledRequest, str]] = {}
+        self._active_requests = 0
+        self._sampler: threading.Thread | None = None
+        self._samples: Counter = Counter()
+        self._frame_labels: dict = {}
+
+    def configure(
+        self,
+        sample_rate: float | None = None,
+        interval_seconds: float | None = None,
+    ):
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("sample_rate must be within [0, 1]")
+            self.sample_rate = sample_rate
+        if interval_seconds is not None:
+            if interval_seconds <= 0:
+                raise ValueError("interval_seconds must be positive")
+            self.interval_seconds = interval_seconds
+
+    def force(self, name: str, requests: int = 1):
+        """
+        Profiles the next requests with this name, e.g. the next stage of
+        one document, whatever the sample rate. The name is released once
+        they have started, or by release.
+        """
+        if requests < 1:
+            raise ValueError("requests must be at least 1")
+        with self._lock:
+            self._forced[name] = requests
+
+    def release(self, name: str):
+        with self._lock:
+            self._forced.pop(name, None)
+
+    def is_forced(self, name: str) -> bool:
+        with self._lock:
+            return name in self._forced
+
+    def _take_forced(self, name: str) -> bool:
+        with self._lock:
+            remaining = self._forced.get(name)
+            if remaining is None:
+                return False
+            if remaining > 1:
+                self._forced[name] = remaining - 1
+            else:
+                del self._forced[name]
+            return True
+
+    def begin(self, name: str, document_type: str = "") -> ProfiledRequest | None:
+        """
+        Starts profiling a request if it is forced or sampled; see
+        profile_scope to make it current and end to finish it.
+        """
+        if not self._take_forced(name) and (
+            not self.sample_rate or random.random() >= self.sample_rate
+        ):
+            return None
+
+        request = ProfiledRequest(name=name, document_type=document_type)
+        with self._lock:
+            self._active_requests += 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample, name="profiler-sampler", daemon=True
+                )
+                self._sampler.start()
+        return request
+
+    def end(self, request: ProfiledRequest) -> str | None:
+        """
+        Finishes a profiled request and writes its collapsed stacks.
+
+        Returns:
+            The path written, if any.
+        """
+        with self._lock:
+            self._active_requests -= 1
+            for (stage, stack), count in request.samples.items():
+                self._samples[(request.document_type or "unknown", stage, stack)] += (
+                    count
+                )
+            lines = request.collapsed_lines()
+            sample_count = request.sample_count
+
+        if self.output_dir is None or not lines:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_name = f"{int(request.started_at * 1000)}-{os.path.basename(request.name)}"
+        path = os.path.join(self.output_dir, f"{file_name}.collapsed")
+        with open(path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        print(f"Profile: {sample_count} samples of {request.name} in {path}")
+        return path
+
+    @contextmanager
+    def request(
+        self, name: str, document_type: str = ""
+    ) -> Iterator[ProfiledRequest | None]:
+        """
+        Profiles the enclosed block as one request if it is sampled; inside
+        a profiled request, the block stays part of it.
+        """
+        current = _current_request.get()
+        if current is not None:
+            yield current
+            return
+
+        request = self.begin(name, document_type)
+        if request is None:
+            yield None
+            return
+        try:
+            with profile_scope(request):
+                yield request
+        finally:
+            self.end(request)
+
+    def collapsed(self, document_type: str | None = None) -> list[str]:
+        """
+        The collapsed stacks of every finished request, optionally of one
+        document type.
+        """
+        with self._lock:
+            samples = dict(self._samples)
+        return [
+            f"{sample_type};{stage};{stack} {count}"
+            for (sample_type, stage, stack), count in sorted(samples.items())
+            if document_type is None or sample_type == document_type
+        ]
+
+    def enter_stage(self, request: ProfiledRequest, stage: str) -> tuple:
+        thread_id = threading.get_ident()
+        with self._lock:
+            previous = self._threads.get(thread_id)
+            self._threads[thread_id] = (request, stage)
+        return thread_id, previous
+
+    def exit_stage(self, token: tuple):
+        thread_id, previous = token
+        with self._lock:
+            if previous is None:
+                self._threads.pop(thread_id, None)
+            else:
+                self._threads[thread_id] = previous
+
+    def _frame_label(self, code) -> str:
+        label = self._frame_labels.get(code)
+        if label is None:
+            label = (
+                f"{getattr(code, 'co_qualname', code.co_name)} "
+                f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            self._frame_labels[code] = label
+        return label
+
+    def _collapse(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(self._frame_label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels[-self.max_depth :]))
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._active_requests:
+                    self._sampler = None
+                    return
+                threads = list(self._threads.items())
+
+            frames = sys._current_frames()
+            stacks = [
+                (request, stage, self._collapse(frames[thread_id]))
+                for thread_id, (request, stage) in threads
+                if thread_id in frames
+            ]
+            del frames
+            with self._lock:
+                for request, stage, stack in stacks:
+                    request.samples[(stage, stack)] += 1
+            time.sleep(self.interval_seconds)
+
+
+_profiler = SamplingProfiler()
+
+
+def get_profiler() -> SamplingProfiler:
+    """
+    Returns the process-wide profiler, off until a sample rate is set or a
+    request is forced.
+    """
+    return _profiler
+
+
+@contextmanager
+def profile_scope(request: ProfiledRequest | None) -> Iterator[None]:
+    """
+    Makes a profiled request current, so the block and the contexts copied
+    from it are sampled as part of it.
+    """
+    if request is None:
+        yield
+        return
+
+    token = _current_request.set(request)
+    stage_token = _profiler.enter_stage(request, REQUEST_STAGE)
+    try:
+        yield
+    finally:
+        _profiler.exit_stage(stage_token)
+        _current_request.reset(token)
+
+
+def enter_profiled_stage(stage: str) -> tuple | None:
+    """
+    Called by the tracer as a span opens: while a profiled request is
+    current, the samples of this thread go to the stage.
+    """
+    request = _current_request.get()
+    if request is None:
+        return None
+    return _profiler.enter_stage(request, stage)
+
+
+def exit_profiled_stage(token: tuple | None):
+    if token is not None:
+        _profiler.exit_stage(token)
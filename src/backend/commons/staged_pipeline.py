@@ -0,0 +1,259 @@
+import contextvars
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+from .tracing import get_tracer
+
+STAGE_KINDS = ("thread", "process")
+
+# Sentinel telling a stage worker to stop.
+_STOP = object()
+
+
+@dataclass
+class PipelineStage:
+    """
+    One step of a StagedPipeline. Thread stages suit I/O-bound work such as
+    uploads and model calls; process stages run CPU-bound work outside the
+    GIL, so their function and items must be picklable.
+
+    Attributes:
+        function: Takes an item and returns the item for the next stage.
+        workers: Items the stage works on at the same time.
+        queue_size: Items that may wait for the stage before upstream
+            stages block; twice the workers unless given.
+    """
+
+    name: str
+    function: Callable[[Any], Any]
+    workers: int = 1
+    kind: str = "thread"
+    queue_size: int | None = None
+
+
+@dataclass
+class StageStats:
+    """
+    Counters of one pipeline stage since the pipeline started.
+
+    Attributes:
+        busy_seconds: Time the workers spent on items.
+        blocked_seconds: Time upstream spent waiting for room in the queue
+            of the stage, the backpressure it applied.
+        utilisation: Share of the worker time spent busy.
+    """
+
+    name: str
+    kind: str
+    workers: int
+    processed: int
+    failed: int
+    busy_seconds: float
+    blocked_seconds: float
+    queue_depth: int
+    queue_size: int
+    utilisation: float
+
+
+class _StageCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+
+class StagedPipeline:
+    """
+    Runs items through a sequence of stages, each with its own pool of
+    workers and a bounded queue in front of it, so every stage works on a
+    different item at once: one document is annotated while the next is
+    extracted and a third is uploaded. A full queue blocks the stage
+    feeding it, and submit itself, until the slower stage catches up.
+
+    Items keep the context they were submitted in, so spans and deadlines
+    follow them across stages. An item whose stage raises skips the
+    remaining stages and its future holds the error.
+    """
+
+    def __init__(self, stages: list[PipelineStage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Stage names must be unique: {names}")
+        for stage in stages:
+            if stage.kind not in STAGE_KINDS:
+                raise ValueError(f"Unknown stage kind: {stage.kind}")
+            if stage.workers < 1:
+                raise ValueError(f"Stage {stage.name} needs at least one worker")
+
+        self._stages = stages
+        self._queues: list[queue.Queue] = [
+            queue.Queue(
+                maxsize=(
+                    stage.queue_size
+                    if stage.queue_size is not None
+                    else 2 * stage.workers
+                )
+            )
+            for stage in stages
+        ]
+        self._counters = [_StageCounters() for _ in stages]
+        self._process_pools: dict[str, ProcessPoolExecutor] = {}
+        for stage in stages:
+            if stage.kind == "process":
+                # Forking a process that already runs threads can copy held
+                # locks into the child; the fork server starts from a clean
+                # process instead.
+                pool = ProcessPoolExecutor(
+                    max_workers=stage.workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                # Starts the processes before the worker threads exist.
+                pool.submit(int).result()
+                self._process_pools[stage.name] = pool
+
+        self._started_at = time.perf_counter()
+        self._closed = False
+        self._threads: list[list[threading.Thread]] = [
+            [
+                threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{number}",
+                    daemon=True,
+                )
+                for number in range(stage.workers)
+            ]
+            for index, stage in enumerate(stages)
+        ]
+        for threads in self._threads:
+            for thread in threads:
+                thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queues an item for the first stage, blocking while its queue is
+        full. The future resolves to the item returned by the last stage.
+        """
+        if self._closed:
+            raise ValueError("The pipeline is closed")
+        future: Future = Future()
+        self._put(0, (item, future, contextvars.copy_context()))
+        return future
+
+    def map(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Runs the items through the pipeline and yields their results in
+        order.
+        """
+        futures = [self.submit(item) for item in items]
+        for future in futures:
+            yield future.result()
+
+    def stats(self) -> list[StageStats]:
+        elapsed = time.perf_counter() - self._started_at
+        stats = []
+        for stage, stage_queue, counters in zip(
+            self._stages, self._queues, self._counters
+        ):
+            with counters.lock:
+                stats.append(
+                    StageStats(
+                        name=stage.name,
+                        kind=stage.kind,
+                        workers=stage.workers,
+                        processed=counters.processed,
+                        failed=counters.failed,
+                        busy_seconds=counters.busy_seconds,
+                        blocked_seconds=counters.blocked_seconds,
+                        queue_depth=stage_queue.qsize(),
+                        queue_size=stage_queue.maxsize,
+                        utilisation=(
+                            counters.busy_seconds / (stage.workers * elapsed)
+                            if elapsed > 0
+                            else 0.0
+                        ),
+                    )
+                )
+        return stats
+
+    def close(self):
+        """
+        Lets the queued items finish, then stops the workers and processes.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for index, threads in enumerate(self._threads):
+            for _ in threads:
+                self._queues[index].put(_STOP)
+            for thread in threads:
+                thread.join()
+        for pool in self._process_pools.values():
+            pool.shutdown()
+
+    def __enter__(self) -> "StagedPipeline":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, index: int, entry: tuple):
+        start = time.perf_counter()
+        self._queues[index].put(entry)
+        blocked_seconds = time.perf_counter() - start
+        counters = self._counters[index]
+        with counters.lock:
+            counters.blocked_seconds += blocked_seconds
+
+    def _run(self, stage: PipelineStage, item: Any) -> Any:
+        with get_tracer().span(f"pipeline.{stage.name}", kind=stage.kind):
+            if stage.kind == "process":
+                return (
+                    self._process_pools[stage.name]
+                    .submit(stage.function, item)
+                    .result()
+                )
+            return stage.function(item)
+
+    def _work(self, index: int):
+        stage = self._stages[index]
+        stage_queue = self._queues[index]
+        counters = self._counters[index]
+        is_last = index == len(self._stages) - 1
+
+        while True:
+            entry = stage_queue.get()
+            if entry is _STOP:
+                return
+
+            item, future, context = entry
+            start = time.perf_counter()
+            try:
+                result = context.run(self._run, stage, item)
+            except BaseException as error:
+                with counters.lock:
+                    counters.failed += 1
+                    counters.busy_seconds += time.perf_counter() - start
+                future.set_exception(error)
+                continue
+
+            with counters.lock:
+                counters.processed += 1
+                counters.busy_seconds += time.perf_counter() - start
+            if is_last:
+                future.set_result(result)
+            else:
+                self._put(index + 1, (result, future, context))
@@ -1,4 +1,7 @@
-from google.cloud import storage
+import os
+import shutil
+
+from .tracing import get_tracer
 
 
 class GoogleCloudStorage:
@@ -7,16 +10,42 @@ class GoogleCloudStorage:
     """
 
     def __init__(self, project_id: str):
-        self.client = storage.Client(project=project_id)
+        self._project_id = project_id
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The storage client, created on first use.
+        """
+        if self._client is None:
+            from google.cloud import storage
+
+            self._client = storage.Client(project=self._project_id)
+        return self._client
 
     def upload_file(
-        self, bucket_name: str, source_file_name: str, destination_blob_name: str
+        self,
+        bucket_name: str,
+        source_file_name: str,
+        destination_blob_name: str,
+        timeout: float | None = None,
     ):
+        """
+        Uploads a file and returns its public URL.
+
+        Args:
+            timeout: Seconds the upload may take, the client default if None.
+        """
         try:
-            bucket = self.client.bucket(bucket_name)
-            blob = bucket.blob(destination_blob_name)
+            with get_tracer().span("storage.upload_file", bucket=bucket_name):
+                bucket = self.client.bucket(bucket_name)
+                blob = bucket.blob(destination_blob_name)
 
-            blob.upload_from_filename(source_file_name)
+                if timeout is None:
+                    blob.upload_from_filename(source_file_name)
+                else:
+                    blob.upload_from_filename(source_file_name, timeout=timeout)
 
             print(
                 f"File {source_file_name} uploaded to {destination_blob_name} in bucket {bucket_name}."
@@ -26,3 +55,28 @@ class GoogleCloudStorage:
         except Exception as e:
             print(f"An error occurred: {e}")
             raise
+
+
+class LocalStorage:
+    """
+    Stand-in for GoogleCloudStorage that copies uploads under a local
+    directory and returns their path instead of a public URL.
+    """
+
+    def __init__(self, root_dir: str = "resources/storage"):
+        self._root_dir = root_dir
+
+    def upload_file(
+        self,
+        bucket_name: str,
+        source_file_name: str,
+        destination_blob_name: str,
+        timeout: float | None = None,
+    ):
+        with get_tracer().span("storage.upload_file", bucket=bucket_name, local=True):
+            destination = os.path.join(
+                self._root_dir, bucket_name, destination_blob_name
+            )
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(source_file_name, destination)
+        return destination
@@ -0,0 +1,276 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from abc import ABC
+from abc import abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import TypeVar
+
+from .profiler import enter_profiled_stage
+from .profiler import exit_profiled_stage
+
+T = TypeVar("T")
+E = TypeVar("E", bound="SpanExporter")
+
+
+@dataclass
+class Span:
+    """
+    A timed unit of work inside the document pipeline.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_time: float
+    end_time: float = 0.0
+    duration_seconds: float = 0.0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: str | None = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class SpanExporter(ABC):
+    """
+    Abstract base class for span exporters.
+    """
+
+    @abstractmethod
+    def export(self, span: Span):
+        """
+        Receives a finished span.
+
+        Args:
+            span: The span that just ended.
+        """
+        pass
+
+    def shutdown(self):
+        """
+        Releases any resource held by the exporter.
+        """
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """
+    Keeps the most recent finished spans in memory.
+    """
+
+    def __init__(self, max_spans: int = 10_000):
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self, trace_id: str | None = None) -> list[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is None:
+            return spans
+        return [span for span in spans if span.trace_id == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonlSpanExporter(SpanExporter):
+    """
+    Appends every finished span as one JSON line to a file.
+    """
+
+    def __init__(self, file_path: str):
+        self._file_path = file_path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self._file_path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+    """
+    Re-emits finished spans through an OpenTelemetry tracer, so they reach
+    whatever OTel SDK exporter (OTLP, Cloud Trace, ...) is configured.
+    """
+
+    def __init__(self, otel_tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "opentelemetry-api is required for OpenTelemetrySpanExporter"
+            ) from e
+
+        self._trace = trace
+        self._otel_tracer = otel_tracer or trace.get_tracer("loansystem")
+
+    def export(self, span: Span):
+        attributes = {
+            key: value
+            for key, value in span.attributes.items()
+            if isinstance(value, (str, bool, int, float))
+        }
+        attributes["loansystem.trace_id"] = span.trace_id
+        attributes["loansystem.span_id"] = span.span_id
+        if span.parent_id:
+            attributes["loansystem.parent_id"] = span.parent_id
+
+        otel_span = self._otel_tracer.start_span(
+            span.name,
+            start_time=int(span.start_time * 1_000_000_000),
+            attributes=attributes,
+        )
+        if span.status == "error":
+            otel_span.set_status(
+                self._trace.Status(self._trace.StatusCode.ERROR, span.error)
+            )
+        otel_span.end(end_time=int(span.end_time * 1_000_000_000))
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "loansystem_current_span", default=None
+)
+
+
+class Tracer:
+    """
+    Creates nested spans and hands them to the registered exporters.
+    """
+
+    def __init__(self, exporters: list[SpanExporter] | None = None):
+        self._exporters: list[SpanExporter] = list(exporters or [])
+
+    def add_exporter(self, exporter: SpanExporter):
+        self._exporters.append(exporter)
+
+    def get_exporter(self, exporter_class: type[E]) -> E | None:
+        for exporter in self._exporters:
+            if isinstance(exporter, exporter_class):
+                return exporter
+        return None
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Times the enclosed block as a child of the current span.
+
+        Args:
+            name: The stage name, e.g. "storage.upload_file".
+            attributes: Extra key/values recorded on the span.
+        """
+        span = self._start(name, attributes)
+        token = _current_span.set(span)
+        stage_token = enter_profiled_stage(name)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            self._fail(span, e)
+            raise
+        finally:
+            span.duration_seconds = time.perf_counter() - start
+            exit_profiled_stage(stage_token)
+            _current_span.reset(token)
+            self._finish(span)
+
+    def stream(
+        self, name: str, chunks: Iterable[T], **attributes: Any
+    ) -> Generator[T, None, Any]:
+        """
+        Yields the chunks of a stream inside one span that is current, and
+        timed, only while a chunk is produced, not while the caller handles
+        it. Returns what the chunks generator returns.
+
+        Args:
+            name: The stage name, e.g. "llm.generate_stream".
+            attributes: Extra key/values recorded on the span.
+        """
+        span = self._start(name, attributes)
+        iterator = iter(chunks)
+        try:
+            while True:
+                token = _current_span.set(span)
+                stage_token = enter_profiled_stage(name)
+                start = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    span.duration_seconds += time.perf_counter() - start
+                    exit_profiled_stage(stage_token)
+                    _current_span.reset(token)
+                yield chunk
+        except GeneratorExit:
+            # The caller stopped reading; the producer is closed below.
+            raise
+        except BaseException as e:
+            self._fail(span, e)
+            raise
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._finish(span)
+
+    @staticmethod
+    def _start(name: str, attributes: dict[str, Any]) -> Span:
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start_time=time.time(),
+            attributes=dict(attributes),
+        )
+
+    @staticmethod
+    def _fail(span: Span, error: BaseException):
+        span.status = "error"
+        span.error = f"{type(error).__name__}: {error}"
+
+    def _finish(self, span: Span):
+        span.end_time = span.start_time + span.duration_seconds
+        for exporter in self._exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"An error occurred while exporting span {span.name}: {e}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the process-wide tracer used by the backend modules.
+    """
+    return _tracer
@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+from collections import OrderedDict
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_MODEL = "gemini-3-flash-preview"
+
+# Prices per 1 million tokens (USD).
+# https://ai.google.dev/gemini-api/docs/pricing
+MODEL_PRICING: dict[str, dict[str, float]] = {
+    "gemini-3-pro-preview": {"input": 2.00, "cached_input": 0.20, "output": 12.00},
+    "gemini-3-flash-preview": {"input": 0.50, "cached_input": 0.05, "output": 3.00},
+    "gemini-2.5-pro": {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "gemini-2.5-flash": {"input": 0.30, "cached_input": 0.03, "output": 2.50},
+    "gemini-2.5-flash-lite": {"input": 0.10, "cached_input": 0.01, "output": 0.40},
+}
+
+
+def get_model_pricing(model: str) -> dict[str, float]:
+    """
+    Returns the price table of a model, matching versioned names such as
+    "gemini-2.5-flash-001" by their longest known prefix.
+    """
+    if model in MODEL_PRICING:
+        return MODEL_PRICING[model]
+
+    for known_model in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(known_model):
+            return MODEL_PRICING[known_model]
+
+    print(f"No pricing found for model {model}, using {DEFAULT_MODEL} pricing.")
+    return MODEL_PRICING[DEFAULT_MODEL]
+
+
+@dataclass
+class UsageRecord:
+    """
+    Token usage of a single LLM call.
+    """
+
+    document_name: str
+    stage: str
+    model: str
+    document_type: str
+    prompt_tokens: int
+    cached_tokens: int
+    output_tokens: int
+    thinking_tokens: int
+    cost_usd: float
+    timestamp: float
+
+
+def _token_count(usage_metadata, attribute: str) -> int:
+    if isinstance(usage_metadata, dict):
+        return int(usage_metadata.get(attribute) or 0)
+    return int(getattr(usage_metadata, attribute, None) or 0)
+
+
+def calculate_usage_cost(
+    prompt_tokens: int,
+    cached_tokens: int,
+    output_tokens: int,
+    thinking_tokens: int,
+    model: str = DEFAULT_MODEL,
+) -> float:
+    """
+    Prices token counts with the model's rates. Cached prompt tokens are
+    billed at the cached-input rate, thinking tokens as output.
+    """
+    pricing = get_model_pricing(model)
+    uncached_tokens = max(prompt_tokens - cached_tokens, 0)
+
+    input_cost = (uncached_tokens / 1_000_000) * pricing["input"]
+    cached_cost = (cached_tokens / 1_000_000) * pricing["cached_input"]
+    output_cost = ((output_tokens + thinking_tokens) / 1_000_000) * pricing["output"]
+
+    return input_cost + cached_cost + output_cost
+
+
+class UsageLedger:
+    """
+    Records token usage per stage, model and document type.
+
+    The ledger lives as long as the process, so it keeps the latest
+    max_records calls for rollups and a running cost per document for the
+    latest max_documents documents.
+    """
+
+    def __init__(self, max_records: int = 10_000, max_documents: int = 10_000):
+        self._records: deque[UsageRecord] = deque(maxlen=max_records)
+        self._document_costs: OrderedDict[str, float] = OrderedDict()
+        self._max_documents = max_documents
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        usage_metadata,
+        document_type: str = "unknown",
+        document_name: str = "",
+    ) -> UsageRecord | None:
+        if not usage_metadata:
+            return None
+
+        prompt_tokens = _token_count(usage_metadata, "prompt_token_count")
+        cached_tokens = _token_count(usage_metadata, "cached_content_token_count")
+        output_tokens = _token_count(usage_metadata, "candidates_token_count")
+        thinking_tokens = _token_count(usage_metadata, "thoughts_token_count")
+
+        usage_record = UsageRecord(
+            document_name=document_name,
+            stage=stage,
+            model=model,
+            document_type=document_type,
+            prompt_tokens=prompt_tokens,
+            cached_tokens=cached_tokens,
+            output_tokens=output_tokens,
+            thinking_tokens=thinking_tokens,
+            cost_usd=calculate_usage_cost(
+                prompt_tokens, cached_tokens, output_tokens, thinking_tokens, model
+            ),
+            timestamp=time.time(),
+        )
+        with self._lock:
+            self._records.append(usage_record)
+            self._document_costs[document_name] = (
+                self._document_costs.get(document_name, 0.0) + usage_record.cost_usd
+            )
+            self._document_costs.move_to_end(document_name)
+            if len(self._document_costs) > self._max_documents:
+                self._document_costs.popitem(last=False)
+        return usage_record
+
+    def get_records(self, document_name: str | None = None) -> list[UsageRecord]:
+        with self._lock:
+            records = list(self._records)
+        if document_name is None:
+            return records
+        return [record for record in records if record.document_name == document_name]
+
+    def document_cost(self, document_name: str) -> float:
+        with self._lock:
+            return self._document_costs.get(document_name, 0.0)
+
+    def rollup(self, group_by: tuple[str, ...] = ("stage",)) -> list[dict[str, Any]]:
+        """
+        Aggregates tokens and cost of the kept records by the given record
+        attributes, e.g. ("stage",), ("document_type",) or ("stage", "model").
+
+        Returns one row per group, with the share of prompt tokens served
+        from cache as "cache_hit_rate".
+        """
+        groups: dict[tuple, dict[str, Any]] = {}
+        for record in self.get_records():
+            record_dict = asdict(record)
+            key = tuple(record_dict[attribute] for attribute in group_by)
+            if key not in groups:
+                groups[key] = {
+                    **dict(zip(group_by, key)),
+                    "calls": 0,
+                    "prompt_tokens": 0,
+                    "cached_tokens": 0,
+                    "output_tokens": 0,
+                    "thinking_tokens": 0,
+                    "cost_usd": 0.0,
+                }
+            group = groups[key]
+            group["calls"] += 1
+            group["prompt_tokens"] += record.prompt_tokens
+            group["cached_tokens"] += record.cached_tokens
+            group["output_tokens"] += record.output_tokens
+            group["thinking_tokens"] += record.thinking_tokens
+            group["cost_usd"] += record.cost_usd
+
+        results = []
+        for group in groups.values():
+            group["cache_hit_rate"] = (
+                group["cached_tokens"] / group["prompt_tokens"]
+                if group["prompt_tokens"]
+                else 0.0
+            )
+            results.append(group)
+
+        return sorted(results, key=lambda group: group["cost_usd"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._document_costs.clear()
+
+
+_usage_ledger = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """
+    Returns the process-wide usage ledger used by the backend modules.
+    """
+    return _usage_ledger
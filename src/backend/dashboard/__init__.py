@@ -1,4 +1,12 @@
+from .dashboard import bootstrap_tagging_intervals
+from .dashboard import calculate_confidence_histogram
 from .dashboard import calculate_cost
-from .dashboard import calculate_extraction_metrics
-from .dashboard import calculate_ops_metrics
+from .dashboard import calculate_deadline_metrics
+from .dashboard import calculate_extraction_metrics_from_rollup
+from .dashboard import calculate_ops_metrics_from_rollup
+from .dashboard import calculate_stage_metrics_from_rollup
 from .dashboard import calculate_tagging_metrics
+from .dashboard import calculate_tagging_metrics_from_confusion
+from .dashboard import confidence_histogram_table
+from .dashboard import confusion_matrix_cells
+from .event_store import EventStore
@@ -1,41 +1,202 @@
 import collections
+import warnings
 
 import numpy as np
-import pandas as pd
-from sklearn.metrics import accuracy_score
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import precision_recall_fscore_support
 
+from ..commons import calculate_usage_cost
+from ..commons import DEFAULT_MODEL
+from ..commons import DEGRADATION_THRESHOLDS
 
-def calculate_tagging_metrics(docs_data: list) -> dict | None:
+
+LATENCY_BIN_WIDTH = 0.05
+CONFIDENCE_BIN_STEP = 0.05
+
+# Absorbs the float error of values on a bin edge, e.g. 0.15 / 0.05 is
+# 2.9999999999999996 and belongs to bin 3.
+_BIN_EDGE_TOLERANCE = 1e-9
+
+
+def _bin_indexes(values: np.ndarray, width: float) -> np.ndarray:
+    """
+    Index of the bin of each value, bins being [index * width, (index + 1)
+    * width).
+    """
+    return np.floor(values / width + _BIN_EDGE_TOLERANCE).astype(np.int64)
+
+
+def latency_histogram(latencies: np.ndarray) -> dict[str, int]:
+    if latencies.size == 0:
+        return {}
+    bins = _bin_indexes(np.clip(latencies, 0, None), LATENCY_BIN_WIDTH)
+    indexes, counts = np.unique(bins, return_counts=True)
+    return {str(index): int(count) for index, count in zip(indexes, counts)}
+
+
+def histogram_percentile(histogram: dict[str, int], percentile: float) -> float:
+    """
+    Approximates a percentile from a sparse latency histogram, interpolating
+    linearly inside the bin that holds it.
+    """
+    if not histogram:
+        return 0.0
+
+    indexes = np.array(sorted(int(index) for index in histogram), dtype=np.int64)
+    counts = np.array([histogram[str(index)] for index in indexes], dtype=np.float64)
+    cumulative = np.cumsum(counts)
+    target = (percentile / 100) * cumulative[-1]
+
+    position = int(np.searchsorted(cumulative, target, side="left"))
+    position = min(position, len(indexes) - 1)
+    below = cumulative[position - 1] if position > 0 else 0.0
+    fraction = (target - below) / counts[position] if counts[position] else 0.0
+    return float((indexes[position] + fraction) * LATENCY_BIN_WIDTH)
+
+
+TAGGING_BOOTSTRAP_SAMPLES = 2000
+
+
+def calculate_tagging_metrics(
+    docs_data: list, bootstrap_samples: int = TAGGING_BOOTSTRAP_SAMPLES
+) -> dict | None:
     """
     docs_data: dictionary [{'predicted_type': 'w9', 'actual_type': 'w9'}, ...]
     """
     if not docs_data:
         return None
 
-    df = pd.DataFrame(docs_data)
-    y_pred = df["predicted_type"]
-    y_true = df["actual_type"]
-
-    labels = sorted(list(set(y_true.unique()) | set(y_pred.unique())))
-    accuracy = accuracy_score(y_true, y_pred)
-    precision, recall, _, _ = precision_recall_fscore_support(
-        y_true,
-        y_pred,
-        average="weighted",
-        zero_division=0,
-    )
+    predicted = [doc["predicted_type"] for doc in docs_data]
+    actual = [doc["actual_type"] for doc in docs_data]
+
+    # Encode both columns against one sorted label set in a single pass.
+    labels, codes = np.unique(np.asarray(predicted + actual), return_inverse=True)
+    predicted_codes, actual_codes = codes[: len(predicted)], codes[len(predicted) :]
+
+    size = labels.size
+    cm = np.bincount(
+        actual_codes * size + predicted_codes, minlength=size * size
+    ).reshape(size, size)
+
+    return _tagging_metrics_from_matrix(cm, labels.tolist(), bootstrap_samples)
 
-    cm = confusion_matrix(y_true, y_pred, labels=labels)
 
+def calculate_tagging_metrics_from_confusion(
+    confusion: dict, bootstrap_samples: int = TAGGING_BOOTSTRAP_SAMPLES
+) -> dict | None:
+    """
+    confusion: pre-aggregated counts {'<predicted>\t<actual>': count, ...}
+    """
+    if not confusion:
+        return None
+
+    pairs = [key.split("\t") for key in confusion]
+    labels = sorted({label for pair in pairs for label in pair})
+    label_index = {label: index for index, label in enumerate(labels)}
+
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for (predicted, actual), count in zip(pairs, confusion.values()):
+        cm[label_index[actual], label_index[predicted]] += count
+
+    return _tagging_metrics_from_matrix(cm, labels, bootstrap_samples)
+
+
+def _tagging_scores(cm: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Accuracy and weighted / per-label precision and recall of one or many
+    confusion matrices (rows are actual labels, columns predicted), with
+    the matrices on the leading axes.
+    """
+    true_positives = np.diagonal(cm, axis1=-2, axis2=-1)
+    support = cm.sum(axis=-1)
+    predicted_counts = cm.sum(axis=-2)
+    total = support.sum(axis=-1)
+
+    precision_per_label = np.divide(
+        true_positives,
+        predicted_counts,
+        out=np.full(true_positives.shape, np.nan),
+        where=predicted_counts > 0,
+    )
+    recall_per_label = np.divide(
+        true_positives,
+        support,
+        out=np.full(true_positives.shape, np.nan),
+        where=support > 0,
+    )
+
+    # Weighted by support, with undefined labels counting as 0 (sklearn's
+    # zero_division=0).
     return {
-        "accuracy": accuracy,
-        "precision": precision,
-        "recall": recall,
+        "accuracy": true_positives.sum(axis=-1) / total,
+        "precision": (np.nan_to_num(precision_per_label) * support).sum(axis=-1)
+        / total,
+        "recall": (np.nan_to_num(recall_per_label) * support).sum(axis=-1) / total,
+        "precision_per_label": precision_per_label,
+        "recall_per_label": recall_per_label,
+    }
+
+
+def bootstrap_tagging_intervals(
+    cm: np.ndarray,
+    samples: int = TAGGING_BOOTSTRAP_SAMPLES,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> dict[str, np.ndarray]:
+    """
+    Percentile bootstrap intervals for accuracy and per-label precision and
+    recall.
+
+    Resampling the reviewed documents with replacement is equivalent to
+    drawing the confusion matrix cells from a multinomial with the observed
+    cell frequencies, so every resample is drawn at once as a
+    (samples, labels, labels) array instead of re-indexing the documents.
+
+    Returns:
+        {metric: [low, high]} for accuracy, and {metric: [[low, high], ...]}
+        per label for precision and recall; NaN where a label was never
+        predicted (precision) or never present (recall).
+    """
+    total = int(cm.sum())
+    size = cm.shape[0]
+    rng = np.random.default_rng(seed)
+    resampled = rng.multinomial(total, cm.ravel() / total, size=samples).reshape(
+        samples, size, size
+    )
+    scores = _tagging_scores(resampled)
+
+    tail = (1 - confidence) / 2 * 100
+    bounds = [tail, 100 - tail]
+    with warnings.catch_warnings():
+        # Labels absent from every resample have all-NaN columns.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return {
+            "accuracy": np.percentile(scores["accuracy"], bounds),
+            "precision_per_label": np.nanpercentile(
+                scores["precision_per_label"], bounds, axis=0
+            ).T,
+            "recall_per_label": np.nanpercentile(
+                scores["recall_per_label"], bounds, axis=0
+            ).T,
+        }
+
+
+def _tagging_metrics_from_matrix(
+    cm: np.ndarray, labels: list[str], bootstrap_samples: int
+) -> dict:
+    scores = _tagging_scores(cm)
+    metrics = {
+        "accuracy": float(scores["accuracy"]),
+        "precision": float(scores["precision"]),
+        "recall": float(scores["recall"]),
+        "precision_per_label": np.nan_to_num(scores["precision_per_label"]),
+        "recall_per_label": np.nan_to_num(scores["recall_per_label"]),
         "confusion_matrix": cm,
         "labels": labels,
     }
+    if bootstrap_samples:
+        metrics["confidence_intervals"] = bootstrap_tagging_intervals(
+            cm, samples=bootstrap_samples
+        )
+    return metrics
 
 
 def _normalize_text(text):
@@ -75,105 +236,176 @@ def _calculate_f1_token(pred, truth):
     return f1
 
 
-def calculate_extraction_metrics(reviewed_docs):
+def calculate_extraction_metrics_from_rollup(rollup: dict) -> list:
     """
-    reviewed_docs:
-    [
-      {
-        "doc_type": "w9_form",
-        "predicted_data": {"legal_name": "Acme Corp", "ein": "12-345"},
-        "corrected_data": {"legal_name": "Acme Corporation", "ein": "12-345"}
-      },
-      ...
-    ]
+    rollup: {'fields': {'ein': {'exact': 3.0, 'f1': 3.5, 'samples': 4}, ...}}
     """
+    return [
+        {
+            "field_name": field,
+            "exact_match_rate": scores["exact"] / scores["samples"],
+            "token_f1_score": scores["f1"] / scores["samples"],
+            "samples": scores["samples"],
+        }
+        for field, scores in rollup.get("fields", {}).items()
+        if scores["samples"]
+    ]
 
-    field_metrics = {}
-
-    for doc in reviewed_docs:
-        truth_json = doc["corrected_data"]
-        pred_json = doc["predicted_data"]
 
-        for field, true_val in truth_json.items():
-            pred_val = pred_json.get(field, None)
+def calculate_cost(usage_metadata, model: str = DEFAULT_MODEL):
+    """
+    Calculate the cost of a single call with the model's pricing table.
+    Cached prompt tokens are billed at the cached-input rate.
+    https://ai.google.dev/gemini-api/docs/pricing
+    """
+    if not usage_metadata:
+        return 0.0
 
-            if field not in field_metrics:
-                field_metrics[field] = {"exact": [], "f1": []}
+    return calculate_usage_cost(
+        prompt_tokens=usage_metadata.prompt_token_count or 0,
+        cached_tokens=usage_metadata.cached_content_token_count or 0,
+        output_tokens=usage_metadata.candidates_token_count or 0,
+        thinking_tokens=usage_metadata.thoughts_token_count or 0,
+        model=model,
+    )
 
-            field_metrics[field]["exact"].append(
-                _calculate_exact_match(pred_val, true_val)
-            )
-            field_metrics[field]["f1"].append(_calculate_f1_token(pred_val, true_val))
 
-    # Macro-Average per field
-    results = []
-    for field, scores in field_metrics.items():
-        results.append(
-            {
-                "field_name": field,
-                "exact_match_rate": sum(scores["exact"]) / len(scores["exact"]),
-                "token_f1_score": sum(scores["f1"]) / len(scores["f1"]),
-                "samples": len(scores["exact"]),
-            }
-        )
+def calculate_deadline_metrics(deadline_data: list) -> dict | None:
+    """
+    deadline_data:
+    Ej: [{'elapsed_seconds': 12.3, 'missed': 0.0, 'degradations': ['defer_annotation']}, ...]
+    """
+    if not deadline_data:
+        return None
 
-    return results
+    elapsed = np.array([row["elapsed_seconds"] for row in deadline_data])
+    return {
+        "documents": len(deadline_data),
+        "miss_rate": float(np.mean([row["missed"] for row in deadline_data])),
+        "p95_elapsed": float(np.percentile(elapsed, 95)),
+        "degradation_rates": {
+            degradation: sum(
+                degradation in row["degradations"] for row in deadline_data
+            )
+            / len(deadline_data)
+            for degradation in DEGRADATION_THRESHOLDS
+        },
+    }
 
 
-def calculate_cost(usage_metadata):
+def calculate_ops_metrics_from_rollup(
+    rollup: dict, reviewed_statuses: dict[str, str]
+) -> dict | None:
     """
-    Calculate the cost based on Gemini 2.5 Flash Pricing.
-    Prices per 1 million tokens: entry $0.30, exit $2.50.
-    https://ai.google.dev/gemini-api/docs/pricing#gemini-2.5-flash
+    rollup: pre-aggregated 'document_processed' counters.
+    reviewed_statuses: latest review status per document name.
     """
-    PRICE_PER_1M_INPUT = 0.30
-    PRICE_PER_1M_OUTPUT = 2.50
+    total_docs = rollup.get("documents", 0)
+    if not total_docs:
+        return None
 
-    if not usage_metadata:
-        return 0.0
+    auto_approved_count = sum(
+        1 for status in reviewed_statuses.values() if status == "auto_approved"
+    )
+    auto_approve_rate = min(auto_approved_count / total_docs, 1.0)
 
-    prompt_tokens = usage_metadata.prompt_token_count
-    candidate_tokens = usage_metadata.candidates_token_count
-    thinking_tokens = usage_metadata.thoughts_token_count or 0
-    total_output_tokens = candidate_tokens + thinking_tokens
+    return {
+        "p50_latency": histogram_percentile(rollup["latency_hist"], 50),
+        "p95_latency": histogram_percentile(rollup["latency_hist"], 95),
+        "p50_time_to_first_field": histogram_percentile(
+            rollup.get("ttff_hist", {}), 50
+        ),
+        "p95_time_to_first_field": histogram_percentile(
+            rollup.get("ttff_hist", {}), 95
+        ),
+        "cost_per_doc": rollup["cost_usd"] / total_docs,
+        "auto_approve_rate": auto_approve_rate,
+        "human_review_rate": 1.0 - auto_approve_rate,
+        "total_cost": rollup["cost_usd"],
+        "total_docs": total_docs,
+    }
 
-    input_cost = (prompt_tokens / 1_000_000) * PRICE_PER_1M_INPUT
-    output_cost = (total_output_tokens / 1_000_000) * PRICE_PER_1M_OUTPUT
 
-    total_cost = input_cost + output_cost
+def calculate_stage_metrics_from_rollup(rollup: dict) -> list[dict]:
+    """
+    rollup: pre-aggregated 'document_processed' counters.
+    """
+    results = []
+    for stage, histogram in rollup.get("stage_hist", {}).items():
+        samples = sum(histogram.values())
+        mean_bin = (
+            sum((int(index) + 0.5) * count for index, count in histogram.items())
+            / samples
+        )
+        results.append(
+            {
+                "stage": stage,
+                "p50_latency": histogram_percentile(histogram, 50),
+                "p95_latency": histogram_percentile(histogram, 95),
+                "mean_latency": mean_bin * LATENCY_BIN_WIDTH,
+                "samples": samples,
+            }
+        )
 
-    return total_cost
+    return sorted(results, key=lambda result: result["p95_latency"], reverse=True)
 
 
-def calculate_ops_metrics(ops_data: list):
+def calculate_confidence_histogram(
+    doc_types: np.ndarray, confidences: np.ndarray, step: float = CONFIDENCE_BIN_STEP
+) -> dict[str, dict[str, int]]:
     """
-    ops_data:
-    Ej: [{'latency_seconds': 2.1, 'cost_usd': 0.0002, 'status': 'auto_approved'}, ...]
+    Bins confidences per document type with a single bincount.
+    Returns sparse counts {'w9_form': {'18': 3, '19': 7}, ...}.
     """
-    if not ops_data:
-        return None
-
-    df = pd.DataFrame(ops_data)
+    if len(confidences) == 0:
+        return {}
+
+    n_bins = int(round(1 / step))
+    labels, type_index = np.unique(np.asarray(doc_types), return_inverse=True)
+    bins = np.minimum(
+        _bin_indexes(np.clip(np.asarray(confidences, dtype=np.float64), 0, 1), step),
+        n_bins - 1,
+    )
+    counts = np.bincount(
+        type_index * n_bins + bins, minlength=len(labels) * n_bins
+    ).reshape(len(labels), n_bins)
 
-    latencies = df["latency_seconds"].values
-    p50_latency = np.percentile(latencies, 50)
-    p95_latency = np.percentile(latencies, 95)
+    return {
+        str(label): {str(index): int(count) for index, count in enumerate(row) if count}
+        for label, row in zip(labels, counts)
+    }
 
-    avg_cost = df["cost_usd"].mean()
-    total_cost = df["cost_usd"].sum()
 
-    total_docs = len(df)
-    auto_approved_count = len(df[df["status"] == "auto_approved"])
+def confidence_histogram_table(
+    histograms: dict[str, dict[str, int]], step: float = CONFIDENCE_BIN_STEP
+) -> dict[str, np.ndarray]:
+    """
+    Expands sparse histograms into a fixed-size chart table with one row per
+    (doc_type, bin), whatever the number of documents.
+    """
+    n_bins = int(round(1 / step))
+    labels = sorted(histograms)
+    counts = np.zeros((len(labels), n_bins), dtype=np.int64)
+    for row, label in enumerate(labels):
+        for index, count in histograms[label].items():
+            counts[row, int(index)] = count
+
+    bin_starts = np.round(np.arange(n_bins) * step, 4)
+    return {
+        "doc_type": np.repeat(np.asarray(labels, dtype=np.str_), n_bins),
+        "bin_start": np.tile(bin_starts, len(labels)),
+        "bin_end": np.tile(np.round(bin_starts + step, 4), len(labels)),
+        "count": counts.ravel(),
+    }
 
-    auto_approve_rate = auto_approved_count / total_docs
-    human_review_rate = 1.0 - auto_approve_rate
 
+def confusion_matrix_cells(cm: np.ndarray, labels: list) -> dict[str, np.ndarray]:
+    """
+    Flattens a confusion matrix into heatmap cells (true, predicted, count).
+    """
+    label_array = np.asarray(labels, dtype=np.str_)
     return {
-        "p50_latency": p50_latency,
-        "p95_latency": p95_latency,
-        "cost_per_doc": avg_cost,
-        "auto_approve_rate": auto_approve_rate,
-        "human_review_rate": human_review_rate,
-        "total_cost": total_cost,
-        "total_docs": total_docs,
+        "True Label": np.repeat(label_array, len(labels)),
+        "Predicted Label": np.tile(label_array, len(labels)),
+        "Count": np.asarray(cm).ravel(),
     }
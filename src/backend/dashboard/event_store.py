@@ -0,0 +1,491 @@
+import atexit
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+
+from .dashboard import _calculate_exact_match
+from .dashboard import _calculate_f1_token
+from .dashboard import calculate_confidence_histogram
+from .dashboard import latency_histogram
+
+# Lists the parts of a day that reads see.
+MANIFEST_NAME = "manifest.json"
+
+# Column types per event kind. Every event also carries a float "timestamp".
+EVENT_SCHEMAS: dict[str, dict[str, str]] = {
+    "document_processed": {
+        "document_name": "str",
+        "doc_type": "str",
+        "confidence": "float",
+        "latency_seconds": "float",
+        "cost_usd": "float",
+        "stage_latencies": "json",
+        "time_to_first_field_seconds": "float",
+    },
+    "document_reviewed": {
+        "document_name": "str",
+        "status": "str",
+    },
+    "classify_review": {
+        "predicted_type": "str",
+        "actual_type": "str",
+    },
+    "extraction_review": {
+        "doc_type": "str",
+        "predicted_data": "json",
+        "corrected_data": "json",
+    },
+    "confidence_review": {
+        "doc_type": "str",
+        "field": "str",
+        "confidence": "float",
+        "correct": "float",
+    },
+    "route_decision": {
+        "document_name": "str",
+        "stage": "str",
+        "doc_type": "str",
+        "page_count": "float",
+        "route": "str",
+        "model": "str",
+        "reason": "str",
+        "escalated_from": "str",
+        "latency_seconds": "float",
+    },
+    "route_outcome": {
+        "stage": "str",
+        "doc_type": "str",
+        "route": "str",
+        "correct": "float",
+    },
+    "near_duplicate": {
+        "document_name": "str",
+        "doc_type": "str",
+        "matched_document": "str",
+        "similarity": "float",
+        "page_count": "float",
+        "changed_pages": "float",
+    },
+    "deadline": {
+        "document_name": "str",
+        "budget_seconds": "float",
+        "elapsed_seconds": "float",
+        "missed": "float",
+        "degradations": "json",
+    },
+}
+
+# Columns added after the first release; absent in older parts and
+# optional on append.
+_OPTIONAL_COLUMNS = {"time_to_first_field_seconds"}
+
+
+def _missing_column(kind: str, column: str, rows: int) -> np.ndarray:
+    if EVENT_SCHEMAS[kind][column] == "float":
+        return np.full(rows, np.nan)
+    return np.full(rows, "", dtype=np.str_)
+
+
+def _merge_rollups(left: dict, right: dict) -> dict:
+    merged = dict(left)
+    for key, value in right.items():
+        if key not in merged:
+            merged[key] = value
+        elif isinstance(value, dict):
+            merged[key] = _merge_rollups(merged[key], value)
+        else:
+            merged[key] = merged[key] + value
+    return merged
+
+
+def _rollup_events(kind: str, columns: dict[str, np.ndarray]) -> dict[str, Any]:
+    """
+    Pre-aggregates one batch of events into additive daily counters.
+    """
+    match kind:
+        case "document_processed":
+            stage_histograms: dict[str, dict[str, int]] = {}
+            stage_values: dict[str, list[float]] = {}
+            for stage_latencies in columns["stage_latencies"]:
+                for stage, latency in json.loads(str(stage_latencies)).items():
+                    stage_values.setdefault(stage, []).append(latency)
+            for stage, values in stage_values.items():
+                stage_histograms[stage] = latency_histogram(np.asarray(values))
+
+            return {
+                "documents": int(columns["timestamp"].size),
+                "cost_usd": float(columns["cost_usd"].sum()),
+                "latency_hist": latency_histogram(columns["latency_seconds"]),
+                "ttff_hist": latency_histogram(
+                    columns["time_to_first_field_seconds"][
+                        ~np.isnan(columns["time_to_first_field_seconds"])
+                    ]
+                ),
+                "stage_hist": stage_histograms,
+                "confidence_hist": calculate_confidence_histogram(
+                    columns["doc_type"], columns["confidence"]
+                ),
+            }
+        case "classify_review":
+            pairs = np.char.add(
+                np.char.add(columns["predicted_type"], "\t"), columns["actual_type"]
+            )
+            keys, counts = np.unique(pairs, return_counts=True)
+            return {
+                "confusion": {str(key): int(count) for key, count in zip(keys, counts)}
+            }
+        case "extraction_review":
+            fields: dict[str, dict[str, float]] = {}
+            for predicted_json, corrected_json in zip(
+                columns["predicted_data"], columns["corrected_data"]
+            ):
+                predicted_data = json.loads(str(predicted_json))
+                for field, true_val in json.loads(str(corrected_json)).items():
+                    pred_val = predicted_data.get(field, None)
+                    scores = fields.setdefault(
+                        field, {"exact": 0.0, "f1": 0.0, "samples": 0}
+                    )
+                    scores["exact"] += _calculate_exact_match(pred_val, true_val)
+                    scores["f1"] += _calculate_f1_token(pred_val, true_val)
+                    scores["samples"] += 1
+            return {"fields": fields}
+        case _:
+            return {"events": int(columns["timestamp"].size)}
+
+
+class EventStore:
+    """
+    Append-only columnar store for processing and review events.
+
+    Events are buffered in memory and flushed as compressed NumPy column
+    files partitioned by kind and day:
+
+        {root_dir}/{kind}/date=YYYY-MM-DD/part-<id>.npz
+        {root_dir}/{kind}/date=YYYY-MM-DD/part-<id>.rollup.json
+        {root_dir}/{kind}/date=YYYY-MM-DD/manifest.json
+
+    Each part carries its pre-aggregated rollup, so daily totals are read
+    without touching the columns. Only the parts listed in the day's
+    manifest are read, and the manifest is replaced atomically once the
+    files of a part are complete, so an interrupted write or compaction
+    never shows partial or duplicated events. Reads add the buffered events to the
+    stored ones instead of flushing them. `compact` merges the small parts
+    of a day into one; the first flush of each day compacts the days
+    before it in the background.
+    """
+
+    def __init__(self, root_dir: str, flush_size: int = 50):
+        self._root_dir = root_dir
+        self._flush_size = flush_size
+        self._buffers: dict[str, list[dict[str, Any]]] = {
+            kind: [] for kind in EVENT_SCHEMAS
+        }
+        self._rollup_cache: dict[str, tuple[tuple[str, ...], dict]] = {}
+        self._lock = threading.RLock()
+        self._compacted_before: str | None = None
+        self.version = 0
+        atexit.register(self.flush)
+
+    def append(self, kind: str, event: dict[str, Any]):
+        if kind not in EVENT_SCHEMAS:
+            raise ValueError(f"Unknown event kind: {kind}")
+
+        missing = set(EVENT_SCHEMAS[kind]) - set(event) - _OPTIONAL_COLUMNS
+        if missing:
+            raise ValueError(f"Missing fields for {kind}: {sorted(missing)}")
+
+        with self._lock:
+            self._buffers[kind].append({"timestamp": time.time(), **event})
+            self.version += 1
+            if len(self._buffers[kind]) >= self._flush_size:
+                self._flush_kind(kind)
+
+    def flush(self):
+        with self._lock:
+            for kind in EVENT_SCHEMAS:
+                self._flush_kind(kind)
+
+    def _flush_kind(self, kind: str):
+        events = self._buffers[kind]
+        if not events:
+            return
+        self._buffers[kind] = []
+
+        events_by_day: dict[str, list[dict[str, Any]]] = {}
+        for event in events:
+            day = _day_of(event["timestamp"])
+            events_by_day.setdefault(day, []).append(event)
+
+        for day, day_events in events_by_day.items():
+            columns = self._to_columns(kind, day_events)
+            self._write_part(kind, day, columns, _rollup_events(kind, columns))
+
+        today = _day_of(time.time())
+        if self._compacted_before != today:
+            self._compacted_before = today
+            threading.Thread(
+                target=self.compact_days_before,
+                args=(datetime.date.fromisoformat(today),),
+                name="event-store-compaction",
+            ).start()
+
+    def _buffered(
+        self,
+        kind: str,
+        start: datetime.date | None,
+        end: datetime.date | None,
+    ) -> list[dict[str, Any]]:
+        return [
+            event
+            for event in self._buffers[kind]
+            if (start is None or _day_of(event["timestamp"]) >= start.isoformat())
+            and (end is None or _day_of(event["timestamp"]) <= end.isoformat())
+        ]
+
+    @staticmethod
+    def _to_columns(kind: str, events: list[dict[str, Any]]) -> dict[str, np.ndarray]:
+        columns = {
+            "timestamp": np.asarray(
+                [event["timestamp"] for event in events], dtype=np.float64
+            )
+        }
+        for column, column_type in EVENT_SCHEMAS[kind].items():
+            values = [event.get(column) for event in events]
+            if column_type == "float":
+                columns[column] = np.asarray(
+                    [np.nan if value is None else value for value in values],
+                    dtype=np.float64,
+                )
+            elif column_type == "json":
+                columns[column] = np.asarray(
+                    [json.dumps(value, default=str) for value in values], dtype=np.str_
+                )
+            else:
+                columns[column] = np.asarray(
+                    ["" if value is None else str(value) for value in values],
+                    dtype=np.str_,
+                )
+        return columns
+
+    def _write_part(
+        self, kind: str, day: str, columns: dict[str, np.ndarray], rollup: dict
+    ):
+        partition_dir = os.path.join(self._root_dir, kind, f"date={day}")
+        os.makedirs(partition_dir, exist_ok=True)
+
+        part_names = self._part_names(partition_dir)
+        part_name = self._write_part_files(partition_dir, columns, rollup)
+        self._write_manifest(partition_dir, (*part_names, part_name))
+
+    @staticmethod
+    def _write_part_files(
+        partition_dir: str, columns: dict[str, np.ndarray], rollup: dict
+    ) -> str:
+        """
+        Writes the columns and the rollup of a new part, which stays
+        invisible until it is listed in the manifest.
+        """
+        part_name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        part_path = os.path.join(partition_dir, f"{part_name}.npz")
+        rollup_path = os.path.join(partition_dir, f"{part_name}.rollup.json")
+
+        arrays: dict[str, Any] = columns
+        with open(f"{part_path}.tmp", "wb") as file:
+            np.savez_compressed(file, **arrays)
+        with open(f"{rollup_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(rollup, file)
+        os.replace(f"{part_path}.tmp", part_path)
+        os.replace(f"{rollup_path}.tmp", rollup_path)
+        return part_name
+
+    @staticmethod
+    def _write_manifest(partition_dir: str, part_names: tuple[str, ...]):
+        manifest_path = os.path.join(partition_dir, MANIFEST_NAME)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({"parts": sorted(part_names)}, file)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _partition_dirs(
+        self,
+        kind: str,
+        start: datetime.date | None,
+        end: datetime.date | None,
+    ) -> list[str]:
+        kind_dir = os.path.join(self._root_dir, kind)
+        if not os.path.isdir(kind_dir):
+            return []
+
+        partition_dirs = []
+        for entry in sorted(os.listdir(kind_dir)):
+            if not entry.startswith("date="):
+                continue
+            day = datetime.date.fromisoformat(entry.removeprefix("date="))
+            if (start and day < start) or (end and day > end):
+                continue
+            partition_dirs.append(os.path.join(kind_dir, entry))
+        return partition_dirs
+
+    @staticmethod
+    def _part_names(partition_dir: str) -> tuple[str, ...]:
+        manifest_path = os.path.join(partition_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            # Days written before the manifest existed hold only complete
+            # parts.
+            return EventStore._stored_part_names(partition_dir)
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            return tuple(json.load(file)["parts"])
+
+    @staticmethod
+    def _stored_part_names(partition_dir: str) -> tuple[str, ...]:
+        return tuple(
+            sorted(
+                entry.removesuffix(".npz")
+                for entry in os.listdir(partition_dir)
+                if entry.endswith(".npz")
+            )
+        )
+
+    def read(
+        self,
+        kind: str,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        columns: list[str] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Reads the raw columns of a kind between two days (inclusive),
+        pruning partitions outside the range.
+        """
+        wanted = columns or ["timestamp", *EVENT_SCHEMAS[kind]]
+        with self._lock:
+            chunks = self._read_parts(kind, start, end, wanted)
+            buffered = self._buffered(kind, start, end)
+        if buffered:
+            buffered_columns = self._to_columns(kind, buffered)
+            for column in wanted:
+                chunks[column].append(buffered_columns[column])
+
+        return {
+            column: np.concatenate(parts) if parts else np.asarray([])
+            for column, parts in chunks.items()
+        }
+
+    def _read_parts(
+        self,
+        kind: str,
+        start: datetime.date | None,
+        end: datetime.date | None,
+        wanted: list[str],
+    ) -> dict[str, list[np.ndarray]]:
+        chunks: dict[str, list[np.ndarray]] = {column: [] for column in wanted}
+        for partition_dir in self._partition_dirs(kind, start, end):
+            for part_name in self._part_names(partition_dir):
+                with np.load(os.path.join(partition_dir, f"{part_name}.npz")) as part:
+                    rows = part["timestamp"].size
+                    for column in wanted:
+                        chunks[column].append(
+                            part[column]
+                            if column in part.files
+                            else _missing_column(kind, column, rows)
+                        )
+        return chunks
+
+    def read_rollup(
+        self,
+        kind: str,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> dict[str, Any]:
+        """
+        Merges the daily rollups of a kind between two days (inclusive).
+        """
+        rollup: dict[str, Any] = {}
+        with self._lock:
+            for partition_dir in self._partition_dirs(kind, start, end):
+                rollup = _merge_rollups(rollup, self._daily_rollup(partition_dir))
+            buffered = self._buffered(kind, start, end)
+        if buffered:
+            rollup = _merge_rollups(
+                rollup, _rollup_events(kind, self._to_columns(kind, buffered))
+            )
+        return rollup
+
+    def _daily_rollup(self, partition_dir: str) -> dict[str, Any]:
+        part_names = self._part_names(partition_dir)
+        cached = self._rollup_cache.get(partition_dir)
+        if cached and cached[0] == part_names:
+            return cached[1]
+
+        rollup: dict[str, Any] = {}
+        for part_name in part_names:
+            rollup_path = os.path.join(partition_dir, f"{part_name}.rollup.json")
+            with open(rollup_path, "r", encoding="utf-8") as file:
+                rollup = _merge_rollups(rollup, json.load(file))
+
+        self._rollup_cache[partition_dir] = (part_names, rollup)
+        return rollup
+
+    def compact(self, kind: str, day: datetime.date):
+        """
+        Rewrites all stored parts of one day as a single part and rollup.
+        The merged part replaces the others in one manifest write; the files
+        no longer listed, including those of interrupted writes, are
+        removed afterwards.
+        """
+        with self._lock:
+            for partition_dir in self._partition_dirs(kind, day, day):
+                part_names = self._part_names(partition_dir)
+                if len(part_names) > 1:
+                    columns = self._read_parts(
+                        kind, day, day, ["timestamp", *EVENT_SCHEMAS[kind]]
+                    )
+                    part_names = (
+                        self._write_part_files(
+                            partition_dir,
+                            {
+                                column: np.concatenate(parts)
+                                for column, parts in columns.items()
+                            },
+                            self._daily_rollup(partition_dir),
+                        ),
+                    )
+                    self._write_manifest(partition_dir, part_names)
+
+                for part_name in self._stored_part_names(partition_dir):
+                    if part_name in part_names:
+                        continue
+                    os.remove(os.path.join(partition_dir, f"{part_name}.npz"))
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(
+                            os.path.join(partition_dir, f"{part_name}.rollup.json")
+                        )
+
+    def compact_days_before(self, day: datetime.date):
+        """
+        Compacts every stored day before the given one; past days no longer
+        receive events.
+        """
+        last_day = day - datetime.timedelta(days=1)
+        for kind in EVENT_SCHEMAS:
+            for partition_dir in self._partition_dirs(kind, None, last_day):
+                self.compact(
+                    kind,
+                    datetime.date.fromisoformat(
+                        os.path.basename(partition_dir).removeprefix("date=")
+                    ),
+                )
+
+
+def _day_of(timestamp: float) -> str:
+    return (
+        datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+        .date()
+        .isoformat()
+    )
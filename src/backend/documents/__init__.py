@@ -0,0 +1,9 @@
+from .document_index import DOCUMENT_SORT_KEYS
+from .document_index import DocumentIndex
+from .document_index import DocumentPage
+from .document_index import DocumentSummary
+from .page_renderer import PageRenderer
+from .similarity_index import DocumentFingerprint
+from .similarity_index import NearDuplicate
+from .similarity_index import page_dhash
+from .similarity_index import SimilarityIndex
@@ -0,0 +1,208 @@
+import itertools
+import math
+import threading
+from dataclasses import dataclass
+
+DOCUMENT_SORT_KEYS = ("uploaded", "name", "status", "predicted_type", "confidence")
+
+
+@dataclass(frozen=True)
+class DocumentSummary:
+    """
+    The listing fields of one document.
+    """
+
+    name: str
+    status: str
+    predicted_type: str
+    confidence: float
+    sequence: int
+
+
+@dataclass
+class DocumentPage:
+    """
+    One page of a document query.
+    """
+
+    items: list[DocumentSummary]
+    total: int
+    page: int
+    page_size: int
+
+    @property
+    def page_count(self) -> int:
+        return max(1, math.ceil(self.total / self.page_size))
+
+
+class DocumentIndex:
+    """
+    Index of the documents of a session for the document list.
+
+    Documents are kept with secondary indexes by status and predicted type,
+    so a filtered query only visits matching documents, and sorted results
+    are cached until the next change, so paging through a query only slices
+    a list.
+    """
+
+    def __init__(self, max_cached_queries: int = 8):
+        self._documents: dict[str, DocumentSummary] = {}
+        self._by_status: dict[str, set[str]] = {}
+        self._by_type: dict[str, set[str]] = {}
+        self._sequence = itertools.count()
+        self._max_cached_queries = max_cached_queries
+        self._query_cache: dict[tuple, list[DocumentSummary]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._documents
+
+    def upsert(self, name: str, status: str, predicted_type: str, confidence: float):
+        """
+        Adds a document or updates its listing fields, keeping its upload
+        position.
+        """
+        with self._lock:
+            current = self._documents.get(name)
+            if current is not None:
+                self._unindex(current)
+            summary = DocumentSummary(
+                name=name,
+                status=status,
+                predicted_type=predicted_type,
+                confidence=float(confidence),
+                sequence=(
+                    current.sequence if current is not None else next(self._sequence)
+                ),
+            )
+            self._documents[name] = summary
+            self._by_status.setdefault(status, set()).add(name)
+            self._by_type.setdefault(predicted_type, set()).add(name)
+            self._query_cache.clear()
+
+    def remove(self, name: str):
+        with self._lock:
+            summary = self._documents.pop(name, None)
+            if summary is not None:
+                self._unindex(summary)
+                self._query_cache.clear()
+
+    def _unindex(self, summary: DocumentSummary):
+        self._by_status[summary.status].discard(summary.name)
+        self._by_type[summary.predicted_type].discard(summary.name)
+
+    def statuses(self) -> list[str]:
+        with self._lock:
+            return sorted(status for status, names in self._by_status.items() if names)
+
+    def predicted_types(self) -> list[str]:
+        with self._lock:
+            return sorted(
+                predicted_type
+                for predicted_type, names in self._by_type.items()
+                if names
+            )
+
+    def query(
+        self,
+        statuses: list[str] | None = None,
+        predicted_types: list[str] | None = None,
+        below_thresholds: dict[str, float] | None = None,
+        sort_by: str = "uploaded",
+        descending: bool = False,
+        page: int = 1,
+        page_size: int = 20,
+    ) -> DocumentPage:
+        """
+        Filters, sorts and pages the documents.
+
+        Args:
+            statuses: Keep only these statuses; all when None or empty.
+            predicted_types: Keep only these predicted types; all when None
+                or empty.
+            below_thresholds: Keep only documents whose confidence is below
+                the threshold of their predicted type (1.0 when missing).
+            sort_by: One of DOCUMENT_SORT_KEYS.
+            descending: Reverse the sort order.
+            page: The 1-based page, clamped to the available pages.
+            page_size: Documents per page.
+        """
+        if sort_by not in DOCUMENT_SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort_by}")
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+
+        cache_key = (
+            tuple(sorted(statuses or ())),
+            tuple(sorted(predicted_types or ())),
+            tuple(sorted((below_thresholds or {}).items()))
+            if below_thresholds is not None
+            else None,
+            sort_by,
+            descending,
+        )
+
+        with self._lock:
+            results = self._query_cache.get(cache_key)
+            if results is None:
+                results = self._filter_and_sort(
+                    statuses, predicted_types, below_thresholds, sort_by, descending
+                )
+                if len(self._query_cache) >= self._max_cached_queries:
+                    self._query_cache.pop(next(iter(self._query_cache)))
+                self._query_cache[cache_key] = results
+
+        total = len(results)
+        page_count = max(1, math.ceil(total / page_size))
+        page = min(max(1, page), page_count)
+        start = (page - 1) * page_size
+        return DocumentPage(
+            items=results[start : start + page_size],
+            total=total,
+            page=page,
+            page_size=page_size,
+        )
+
+    def _filter_and_sort(
+        self,
+        statuses: list[str] | None,
+        predicted_types: list[str] | None,
+        below_thresholds: dict[str, float] | None,
+        sort_by: str,
+        descending: bool,
+    ) -> list[DocumentSummary]:
+        candidates: set[str] | None = None
+        for index, values in (
+            (self._by_status, statuses),
+            (self._by_type, predicted_types),
+        ):
+            if not values:
+                continue
+            matches = set().union(*(index.get(value, set()) for value in values))
+            candidates = matches if candidates is None else candidates & matches
+
+        documents = (
+            self._documents.values()
+            if candidates is None
+            else [self._documents[name] for name in candidates]
+        )
+        if below_thresholds is not None:
+            documents = [
+                document
+                for document in documents
+                if document.confidence
+                < below_thresholds.get(document.predicted_type, 1.0)
+            ]
+
+        sort_attribute = "sequence" if sort_by == "uploaded" else sort_by
+        return sorted(
+            documents,
+            key=lambda document: (
+                getattr(document, sort_attribute),
+                document.sequence,
+            ),
+            reverse=descending,
+        )
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from ..commons import get_tracer
+
+IMAGE_FORMATS = ("png", "jpg")
+
+
+class PageRenderer:
+    """
+    Rasterises single PDF pages, annotations included, into image bytes and
+    keeps them in an LRU cache bounded by total size.
+
+    Entries are keyed by (document hash, page, zoom, format): the hash
+    changes whenever the file is rewritten, annotations included.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._images: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size_bytes = 0
+        self._hashes: dict[str, tuple[tuple[int, int], str]] = {}
+        self._page_counts: dict[str, int] = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def document_hash(self, pdf_path: str) -> str:
+        """
+        Content hash of a file, recomputed only when its size or
+        modification time changes.
+        """
+        stat = os.stat(pdf_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(pdf_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha1()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        document_hash = digest.hexdigest()
+        self._hashes[pdf_path] = (signature, document_hash)
+        return document_hash
+
+    def page_count(self, pdf_path: str) -> int:
+        document_hash = self.document_hash(pdf_path)
+        if document_hash not in self._page_counts:
+            import fitz  # type: ignore[import-untyped]
+
+            with self._lock, fitz.open(pdf_path) as doc:
+                self._page_counts[document_hash] = doc.page_count
+        return self._page_counts[document_hash]
+
+    def render_page(
+        self,
+        pdf_path: str,
+        page: int,
+        zoom: float = 1.5,
+        image_format: str = "png",
+    ) -> bytes:
+        """
+        Returns the image of one 1-based page, rendering it on a cache miss.
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+
+        key = (
+            self.document_hash(pdf_path),
+            page,
+            zoom,
+            image_format,
+        )
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self._hits += 1
+                return image
+            self._misses += 1
+
+            # Rendering stays under the lock: PyMuPDF is not thread-safe.
+            image = self._rasterise(pdf_path, page, zoom, image_format)
+            self._store(key, image)
+            return image
+
+    def prefetch(
+        self,
+        pdf_path: str,
+        pages: list[int],
+        zoom: float = 1.5,
+        image_format: str = "png",
+    ):
+        """
+        Renders the given pages into the cache, skipping those out of range.
+        """
+        page_count = self.page_count(pdf_path)
+        for page in pages:
+            if 1 <= page <= page_count:
+                self.render_page(pdf_path, page, zoom, image_format)
+
+    def _rasterise(
+        self, pdf_path: str, page: int, zoom: float, image_format: str
+    ) -> bytes:
+        import fitz  # type: ignore[import-untyped]
+
+        with get_tracer().span("viewer.render_page", page=page, zoom=zoom):
+            with fitz.open(pdf_path) as doc:
+                if not 1 <= page <= doc.page_count:
+                    raise ValueError(
+                        f"Page {page} out of range for {doc.page_count} pages"
+                    )
+                pixmap = doc[page - 1].get_pixmap(
+                    matrix=fitz.Matrix(zoom, zoom), annots=True
+                )
+                return pixmap.tobytes(image_format)
+
+    def _store(self, key: tuple, image: bytes):
+        if len(image) > self._max_bytes:
+            return
+
+        self._images[key] = image
+        self._size_bytes += len(image)
+        while self._size_bytes > self._max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self._size_bytes -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._images),
+                "size_bytes": self._size_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
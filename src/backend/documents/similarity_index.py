@@ -0,0 +1,405 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from ..commons import get_tracer
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+@dataclass
+class DocumentFingerprint:
+    """
+    What a document is compared on: a difference hash of each rendered page,
+    a hash of each page's text, and a MinHash signature over the word
+    shingles of the whole text layer.
+    """
+
+    page_hashes: np.ndarray
+    page_text_hashes: np.ndarray
+    signature: np.ndarray
+    has_text: bool
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_hashes)
+
+
+@dataclass
+class NearDuplicate:
+    """
+    A previously processed document matching a new one. Only matches on
+    the text layer are reusable: a scan matching on its rendering may be
+    another applicant's copy of the same form.
+    """
+
+    document_name: str
+    similarity: float
+    changed_pages: list[int]
+    result: dict[str, Any] | None
+    reusable: bool = False
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _signed64(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def page_dhash(page, hash_size: int = 8) -> int:
+    """
+    64-bit difference hash of a page: the page is rendered small in
+    grayscale, averaged down to 9x8 cells, and each bit tells whether a cell
+    is brighter than its right neighbour.
+    """
+    import fitz  # type: ignore[import-untyped]
+
+    zoom = 64 / max(page.rect.width, 1)
+    pixmap = page.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False
+    )
+    pixels = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(
+        pixmap.height, pixmap.stride
+    )[:, : pixmap.width]
+
+    cells = np.array(
+        [
+            [block.mean() for block in np.array_split(row, hash_size + 1, axis=1)]
+            for row in np.array_split(pixels.astype(np.float32), hash_size, axis=0)
+        ]
+    )
+    bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _hamming(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return np.array(
+        [bin(int(a) ^ int(b)).count("1") for a, b in zip(left, right)], dtype=np.int64
+    )
+
+
+class SimilarityIndex:
+    """
+    Persistent index of processed documents for near-duplicate lookup.
+
+    MinHash signatures are split into bands and each band is stored as a
+    bucket key in SQLite, so a lookup only reads the documents sharing a
+    bucket (locality-sensitive hashing) instead of scanning the index. With
+    32 bands of 4 rows, documents of Jaccard similarity 0.6 share a bucket
+    99% of the time, and of similarity 0.3 about 23% of the time.
+    Documents without a text layer are bucketed on 16-bit slices of their
+    first page hash: two hashes within 3 bits share at least one slice.
+
+    Candidates are then verified on the estimated Jaccard similarity of
+    their text, or on the share of matching pages when there is no text.
+    A coarse page hash cannot tell two people's scans of the same form
+    apart, so matches without text are never offered for reuse, only as
+    possible resubmissions.
+    """
+
+    PAGE_HASH_SLICES = 4
+
+    def __init__(
+        self,
+        path: str,
+        num_perm: int = 128,
+        bands: int = 32,
+        threshold: float = 0.6,
+        max_page_distance: int = 4,
+        shingle_size: int = 5,
+        max_candidates: int = 64,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self._num_perm = num_perm
+        self._bands = bands
+        self._threshold = threshold
+        self._max_page_distance = max_page_distance
+        self._shingle_size = shingle_size
+        self._max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                page_hashes BLOB NOT NULL,
+                page_text_hashes BLOB NOT NULL,
+                signature BLOB NOT NULL,
+                has_text INTEGER NOT NULL,
+                result TEXT,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                document_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, document_id)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def fingerprint(self, pdf_path: str) -> DocumentFingerprint:
+        import fitz  # type: ignore[import-untyped]
+
+        with get_tracer().span("similarity.fingerprint") as span:
+            page_hashes = []
+            page_text_hashes = []
+            words: list[str] = []
+            with fitz.open(pdf_path) as doc:
+                for page in doc:
+                    page_words = [
+                        word
+                        for word in (
+                            _NON_ALPHANUMERIC.sub("", entry[4].lower())
+                            for entry in page.get_text("words")
+                        )
+                        if word
+                    ]
+                    words.extend(page_words)
+                    page_hashes.append(page_dhash(page))
+                    page_text_hashes.append(
+                        _hash64(" ".join(page_words).encode()) if page_words else 0
+                    )
+            span.set_attribute("pages", len(page_hashes))
+
+            return DocumentFingerprint(
+                page_hashes=np.array(page_hashes, dtype=np.uint64),
+                page_text_hashes=np.array(page_text_hashes, dtype=np.uint64),
+                signature=self.minhash(words),
+                has_text=bool(words),
+            )
+
+    def minhash(self, words: list[str]) -> np.ndarray:
+        """
+        MinHash signature of the word shingles of a text.
+        """
+        size = self._shingle_size
+        shingles = {
+            " ".join(words[start : start + size])
+            for start in range(max(1, len(words) - size + 1))
+        }
+        signature = np.full(self._num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        if not words:
+            return signature
+
+        values = np.array(
+            [_hash64(shingle.encode()) % _MERSENNE_PRIME for shingle in shingles],
+            dtype=np.uint64,
+        )
+        for start in range(0, len(values), 4096):
+            chunk = values[start : start + 4096]
+            permuted = (self._a[:, None] * chunk[None, :] + self._b[:, None]) % (
+                _MERSENNE_PRIME
+            )
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature
+
+    def _bucket_keys(self, fingerprint: DocumentFingerprint) -> list[tuple[int, int]]:
+        if fingerprint.has_text:
+            rows = self._num_perm // self._bands
+            return [
+                (band, _signed64(_hash64(band_values.tobytes())))
+                for band, band_values in enumerate(
+                    fingerprint.signature.reshape(self._bands, rows)
+                )
+            ]
+
+        if not fingerprint.page_count:
+            return []
+        # Negative bands keep page-hash buckets apart from text bands.
+        first_page = int(fingerprint.page_hashes[0])
+        return [
+            (-1 - index, (first_page >> (16 * index)) & 0xFFFF)
+            for index in range(self.PAGE_HASH_SLICES)
+        ]
+
+    def changed_pages(
+        self, fingerprint: DocumentFingerprint, previous: DocumentFingerprint
+    ) -> list[int]:
+        """
+        1-based pages of a document that differ from the same page of a
+        previous one. Pages of documents with text are unchanged only when
+        both have the same text and the same rendering, so a page without
+        text, or with an added signature or stamp, is always changed;
+        scanned documents are compared on their rendering alone.
+        """
+        common = min(fingerprint.page_count, previous.page_count)
+        text_hashes = fingerprint.page_text_hashes[:common]
+        previous_text_hashes = previous.page_text_hashes[:common]
+        distances = _hamming(
+            fingerprint.page_hashes[:common], previous.page_hashes[:common]
+        )
+        if fingerprint.has_text or previous.has_text:
+            unchanged = (
+                (text_hashes != 0)
+                & (text_hashes == previous_text_hashes)
+                & (distances == 0)
+            )
+        else:
+            unchanged = distances <= self._max_page_distance
+        changed = np.flatnonzero(~unchanged) + 1
+        return [int(page) for page in changed] + list(
+            range(common + 1, fingerprint.page_count + 1)
+        )
+
+    def similarity(
+        self, fingerprint: DocumentFingerprint, previous: DocumentFingerprint
+    ) -> float:
+        if fingerprint.has_text and previous.has_text:
+            return float(np.mean(fingerprint.signature == previous.signature))
+
+        pages = max(fingerprint.page_count, previous.page_count)
+        if not pages:
+            return 0.0
+        return 1 - len(self.changed_pages(fingerprint, previous)) / pages
+
+    def find(
+        self, fingerprint: DocumentFingerprint, exclude: str | None = None
+    ) -> NearDuplicate | None:
+        """
+        The most similar indexed document above the threshold, if any.
+        """
+        with get_tracer().span("similarity.find") as span, self._lock:
+            # The newest documents of a bucket first: for a common template
+            # they are the likeliest to match, and older ones are dropped
+            # past max_candidates.
+            candidates: dict[int, float] = {}
+            for band, bucket in self._bucket_keys(fingerprint):
+                candidates.update(
+                    self._db.execute(
+                        "SELECT buckets.document_id, documents.created FROM buckets"
+                        " JOIN documents ON documents.id = buckets.document_id"
+                        " WHERE band = ? AND bucket = ?"
+                        " ORDER BY documents.created DESC LIMIT ?",
+                        (band, bucket, self._max_candidates),
+                    ).fetchall()
+                )
+            span.set_attribute("candidates", len(candidates))
+
+            best = None
+            newest = sorted(candidates, key=candidates.__getitem__, reverse=True)
+            for document_id in newest[: self._max_candidates]:
+                name, previous, result = self._load(document_id)
+                if name == exclude:
+                    continue
+                similarity = self.similarity(fingerprint, previous)
+                if similarity >= self._threshold and (
+                    best is None or similarity > best.similarity
+                ):
+                    best = NearDuplicate(
+                        document_name=name,
+                        similarity=similarity,
+                        changed_pages=self.changed_pages(fingerprint, previous),
+                        result=json.loads(result) if result else None,
+                        reusable=fingerprint.has_text and previous.has_text,
+                    )
+            return best
+
+    def _load(self, document_id: int) -> tuple[str, DocumentFingerprint, str | None]:
+        name, page_hashes, page_text_hashes, signature, has_text, result = (
+            self._db.execute(
+                "SELECT name, page_hashes, page_text_hashes, signature, has_text,"
+                " result FROM documents WHERE id = ?",
+                (document_id,),
+            ).fetchone()
+        )
+        return (
+            name,
+            DocumentFingerprint(
+                page_hashes=np.frombuffer(page_hashes, dtype=np.uint64),
+                page_text_hashes=np.frombuffer(page_text_hashes, dtype=np.uint64),
+                signature=np.frombuffer(signature, dtype=np.uint64),
+                has_text=bool(has_text),
+            ),
+            result,
+        )
+
+    def add(
+        self,
+        document_name: str,
+        fingerprint: DocumentFingerprint,
+        result: dict[str, Any] | None = None,
+    ):
+        """
+        Indexes a document with the results to offer for its near
+        duplicates, replacing any previous entry of the same name.
+        """
+        with self._lock, self._db:
+            self._remove(document_name)
+            cursor = self._db.execute(
+                "INSERT INTO documents (name, page_hashes, page_text_hashes,"
+                " signature, has_text, result, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document_name,
+                    fingerprint.page_hashes.tobytes(),
+                    fingerprint.page_text_hashes.tobytes(),
+                    fingerprint.signature.tobytes(),
+                    int(fingerprint.has_text),
+                    json.dumps(result) if result is not None else None,
+                    time.time(),
+                ),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO buckets (band, bucket, document_id)"
+                " VALUES (?, ?, ?)",
+                [
+                    (band, bucket, cursor.lastrowid)
+                    for band, bucket in self._bucket_keys(fingerprint)
+                ],
+            )
+
+    def get_result(self, document_name: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM documents WHERE name = ?", (document_name,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def set_result(self, document_name: str, result: dict[str, Any]):
+        """
+        Replaces the results offered for an indexed document, e.g. once
+        they were reviewed.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE documents SET result = ? WHERE name = ?",
+                (json.dumps(result), document_name),
+            )
+
+    def remove(self, document_name: str):
+        with self._lock, self._db:
+            self._remove(document_name)
+
+    def _remove(self, document_name: str):
+        row = self._db.execute(
+            "SELECT id FROM documents WHERE name = ?", (document_name,)
+        ).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM buckets WHERE document_id = ?", (row[0],))
+        self._db.execute("DELETE FROM documents WHERE id = ?", (row[0],))
@@ -1,3 +1,13 @@
+from .coordinate_snapper import CoordinateSnapper
+from .coordinate_snapper import PageWordIndex
 from .data_document_extraction import DataDocumentExtraction
-from .data_document_extraction import DocumentFieldExtractionOutput
-from .data_document_extraction import DocumentListExtractionOutput
+from .incremental_parser import IncrementalFieldParser
+from .schemas import DOCUMENT_FIELDS
+from .schemas import DocumentFieldExtractionOutput
+from .schemas import DocumentListExtractionOutput
+from .schemas import DocumentSchema
+from .schemas import get_document_schema
+from .shard_merge import FIELD_MERGE_RULES
+from .shard_merge import merge_duplicate_fields
+from .shard_merge import merge_extracted_fields
+from .shard_merge import page_windows
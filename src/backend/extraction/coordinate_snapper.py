@@ -0,0 +1,295 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from ..commons import get_tracer
+from .schemas import DocumentFieldExtractionOutput
+
+# Model coordinates are [ymin, xmin, ymax, xmax] normalised to 0-1000.
+Box = tuple[float, float, float, float]
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+_ISO_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+_BOOLEANS = {"true", "false", "yes", "no"}
+_MONTHS = [
+    "january",
+    "february",
+    "march",
+    "april",
+    "may",
+    "june",
+    "july",
+    "august",
+    "september",
+    "october",
+    "november",
+    "december",
+]
+
+# A value found only inside a longer word must be at least this long, so
+# short values do not match inside unrelated numbers.
+MIN_SUBSTRING_LENGTH = 4
+
+
+def _normalize(text: str) -> str:
+    return _NON_ALPHANUMERIC.sub("", str(text).lower())
+
+
+def _page_spellings(value: str) -> list[str]:
+    """
+    The ways a value may be written on the page: ISO dates in the common
+    numeric and month-name orders, none for values the model derives
+    rather than copies (yes/no answers and lists), else the value itself.
+    """
+    text = str(value).strip()
+    if text.lower() in _BOOLEANS or (text.startswith("[") and text.endswith("]")):
+        return []
+
+    match = _ISO_DATE.match(text)
+    if match is None or not 1 <= int(match.group(2)) <= 12:
+        return [text]
+    year, month, day = match.groups()
+    short_month, short_day = str(int(month)), str(int(day))
+    month_name = _MONTHS[int(month) - 1]
+    spellings = [text]
+    for month_text, day_text in ((month, day), (short_month, short_day)):
+        spellings += [
+            f"{month_text}/{day_text}/{year}",
+            f"{day_text}/{month_text}/{year}",
+            f"{month_text}/{day_text}/{year[2:]}",
+        ]
+    for name in (month_name, month_name[:3]):
+        spellings += [f"{name} {short_day} {year}", f"{short_day} {name} {year}"]
+    return list(dict.fromkeys(spellings))
+
+
+def _union(boxes: list[Box]) -> Box:
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+
+def _distance(box: Box, other: Box) -> float:
+    return ((box[0] + box[2]) - (other[0] + other[2])) ** 2 + (
+        (box[1] + box[3]) - (other[1] + other[3])
+    ) ** 2
+
+
+class PageWordIndex:
+    """
+    Uniform grid over the word boxes of one page, in reading order, in the
+    normalised 0-1000 space of the model coordinates.
+    """
+
+    def __init__(self, words: list[tuple[str, Box]], cell_size: float = 50.0):
+        self._texts = [_normalize(text) for text, _ in words]
+        self._boxes = [box for _, box in words]
+        self._cell_size = cell_size
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        for index, box in enumerate(self._boxes):
+            for cell in self._cells(box):
+                self._grid.setdefault(cell, []).append(index)
+
+    @classmethod
+    def from_page(cls, page, cell_size: float = 50.0) -> "PageWordIndex":
+        import fitz  # type: ignore[import-untyped]
+
+        width, height = page.rect.width, page.rect.height
+        rotation_matrix = page.rotation_matrix if page.rotation else None
+
+        words = []
+        for x0, y0, x1, y1, text, *_ in page.get_text("words"):
+            rect = fitz.Rect(x0, y0, x1, y1)
+            if rotation_matrix is not None:
+                rect = (rect * rotation_matrix).normalize()
+            words.append(
+                (
+                    text,
+                    (
+                        rect.y0 / height * 1000,
+                        rect.x0 / width * 1000,
+                        rect.y1 / height * 1000,
+                        rect.x1 / width * 1000,
+                    ),
+                )
+            )
+        return cls(words, cell_size)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _cells(self, box: Box):
+        ymin, xmin, ymax, xmax = (int(value // self._cell_size) for value in box)
+        for row in range(ymin, ymax + 1):
+            for column in range(xmin, xmax + 1):
+                yield row, column
+
+    def nearby(self, box: Box, margin: float) -> list[int]:
+        """
+        Indexes of the words whose grid cells overlap the box grown by the
+        margin, in reading order.
+        """
+        ymin, xmin, ymax, xmax = box
+        window = (ymin - margin, xmin - margin, ymax + margin, xmax + margin)
+        indexes: set[int] = set()
+        for cell in self._cells(window):
+            indexes.update(self._grid.get(cell, ()))
+        return sorted(indexes)
+
+    def find(self, value: str, near: Box | None, margin: float = 150.0) -> Box | None:
+        """
+        Box of the tightest run of consecutive words spelling the value
+        (ignoring case, spacing and punctuation), closest to the predicted
+        box. Words near the prediction are tried first, then the whole page.
+        """
+        target = _normalize(value)
+        if not target:
+            return None
+
+        if near is not None:
+            match = self._closest_run(target, self.nearby(near, margin), near)
+            if match is not None:
+                return match
+        return self._closest_run(target, range(len(self._texts)), near)
+
+    def _closest_run(self, target: str, starts, near: Box | None) -> Box | None:
+        runs = []
+        for start in starts:
+            run = self._run_from(start, target)
+            if run is not None:
+                runs.append(run)
+
+        # A word holding the value after a label, e.g. 'EIN:12-3456789'.
+        if not runs and len(target) >= MIN_SUBSTRING_LENGTH:
+            runs = [
+                self._boxes[start]
+                for start in starts
+                if self._texts[start].endswith(target)
+            ]
+
+        if not runs:
+            return None
+        if near is None:
+            return runs[0]
+        return min(runs, key=lambda box: _distance(box, near))
+
+    def _run_from(self, start: int, target: str) -> Box | None:
+        text = self._texts[start]
+        if not text or not target.startswith(text):
+            return None
+
+        matched = [start]
+        spelled = text
+        index = start
+        while len(spelled) < len(target) and index + 1 < len(self._texts):
+            index += 1
+            word = self._texts[index]
+            if not word:
+                continue
+            if not target.startswith(spelled + word):
+                return None
+            spelled += word
+            matched.append(index)
+
+        if spelled != target:
+            return None
+        return _union([self._boxes[index] for index in matched])
+
+
+class CoordinateSnapper:
+    """
+    Snaps the model coordinates of extracted fields to the words of the
+    page that spell their value, and reports the fields whose value could
+    not be located.
+
+    Page indexes are built on first use and cached per document (keyed by
+    path and modification time) for the most recent documents.
+    """
+
+    def __init__(self, max_documents: int = 16, margin: float = 150.0):
+        self._max_documents = max_documents
+        self._margin = margin
+        self._indexes: OrderedDict[tuple, dict[int, PageWordIndex]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _page_indexes(self, pdf_path: str) -> dict[int, PageWordIndex]:
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        indexes = self._indexes.get(key)
+        if indexes is None:
+            indexes = {}
+            self._indexes[key] = indexes
+            if len(self._indexes) > self._max_documents:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(key)
+        return indexes
+
+    def snap_fields(
+        self, pdf_path: str, extracted_fields: list[DocumentFieldExtractionOutput]
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[str]]:
+        """
+        Returns the fields with snapped coordinates, and the names of the
+        fields whose value was not found on their page. Fields whose value
+        is not copied from the page keep the model coordinates and are
+        never reported.
+        """
+        import fitz  # type: ignore[import-untyped]
+
+        with get_tracer().span(
+            "extraction.snap", fields=len(extracted_fields)
+        ) as span, self._lock:
+            page_indexes = self._page_indexes(pdf_path)
+            snapped_fields = []
+            unlocated = []
+
+            with fitz.open(pdf_path) as doc:
+                for field in extracted_fields:
+                    spellings = _page_spellings(field.value)
+                    if (
+                        not 1 <= field.page <= doc.page_count
+                        or not _normalize(field.value)
+                        or not spellings
+                    ):
+                        snapped_fields.append(field)
+                        continue
+
+                    page_index = page_indexes.get(field.page)
+                    if page_index is None:
+                        page_index = PageWordIndex.from_page(doc[field.page - 1])
+                        page_indexes[field.page] = page_index
+
+                    near: Box | None = (
+                        (
+                            field.coordinates[0],
+                            field.coordinates[1],
+                            field.coordinates[2],
+                            field.coordinates[3],
+                        )
+                        if len(field.coordinates) == 4
+                        else None
+                    )
+                    box = None
+                    for spelling in spellings:
+                        box = page_index.find(spelling, near, self._margin)
+                        if box is not None:
+                            break
+                    if box is None:
+                        # Scans have no text layer to check against.
+                        if len(page_index):
+                            unlocated.append(field.name)
+                        snapped_fields.append(field)
+                        continue
+
+                    snapped_fields.append(
+                        field.model_copy(
+                            update={"coordinates": [round(value) for value in box]}
+                        )
+                    )
+
+            span.set_attribute("unlocated_fields", len(unlocated))
+            return snapped_fields, unlocated
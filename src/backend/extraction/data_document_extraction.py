@@ -1,41 +1,22 @@
+import asyncio
+import time
+from collections.abc import Generator
 from typing import Any
 
-import fitz
-from google.genai import types
-from pydantic import BaseModel
-from pydantic import Field
-
+from ..commons import call_timeout_config
+from ..commons import current_deadline
+from ..commons import get_tracer
+from ..commons import get_usage_ledger
 from ..commons import LLM
+from ..learning_loop import FieldNormalization
+from ..learning_loop import FormatNormalizer
 from ..learning_loop import LearningLoop
 from ..prompts import Prompt
-
-
-class DocumentFieldExtractionOutput(BaseModel):
-    """
-    Represents the extracted data from a document.
-    """
-
-    name: str = Field(description="The name of the field.")
-    value: str = Field(description="The value of the field.")
-    confidence: float = Field(
-        description="The confidence of the classifier. e.g., 0.95"
-    )
-    page: int = Field(
-        description="The page of the document where the field is located."
-    )
-    coordinates: list[int] = Field(
-        description="The coordinates of the field in the document."
-    )
-
-
-class DocumentListExtractionOutput(BaseModel):
-    """
-    Represents a list of extracted data from a document.
-    """
-
-    extracted_fields: list[DocumentFieldExtractionOutput] = Field(
-        description="A list of extracted fields, each with a name, value, confidence, and page number."
-    )
+from .incremental_parser import IncrementalFieldParser
+from .schemas import DocumentFieldExtractionOutput
+from .schemas import DocumentListExtractionOutput
+from .schemas import get_document_schema
+from .shard_merge import merge_duplicate_fields
 
 
 class DataDocumentExtraction:
@@ -48,47 +29,328 @@ class DataDocumentExtraction:
         llm_client: LLM,
         prompt: Prompt,
         learning_loop: LearningLoop,
+        normalizer: FormatNormalizer | None = None,
+        compact_responses: bool = False,
     ):
+        """
+        Args:
+            compact_responses: Ask for one positional array per field
+                instead of an object, which roughly halves the output
+                tokens; callers get the same output models.
+        """
         self._llm_client = llm_client
         self._prompt = prompt
         self._learning_loop = learning_loop
+        self._normalizer = normalizer
+        self._compact_responses = compact_responses
+
+    @property
+    def llm_client(self) -> LLM:
+        return self._llm_client
 
     def extract_data_document(
-        self, document_content_id: str, document_type: str
+        self,
+        document_content_id: str,
+        document_type: str,
+        document_name: str = "",
+        model: str | None = None,
+        config_overrides: dict[str, Any] | None = None,
     ) -> tuple[DocumentListExtractionOutput, dict[str, Any]]:
-        if not self._prompt:
-            raise ValueError("Unknown Prompt")
+        """
+        Extracts the fields of a loaded document.
 
-        examples_text = self._learning_loop.get_learning_context(document_type)
-        print(f"examples_text => {examples_text}")
+        Args:
+            model: Overrides the model of the prompt.
+            config_overrides: Overrides of the generation config.
+        """
+        prompt_schema, prompt_model = self._build_prompt(document_type)
+        model = model or prompt_model
 
-        schema = self._get_schema(document_type)
+        with get_tracer().span("extraction", document_type=document_type):
+            response, usage = self._llm_client.generate(
+                prompt=prompt_schema,
+                model=model,
+                document_cache_id=document_content_id,
+                config={
+                    **self._generation_config(document_type),
+                    **(config_overrides or {}),
+                },
+            )
 
-        prompt = self._prompt.create()
-        prompt_schema = prompt["instruction"].replace("{SPECIFIC_SCHEMA}", schema)
-        prompt_schema = prompt_schema.replace("{LEARNING_NOTES}", examples_text)
+            document_extraction = self._parse_extraction(
+                response, document_type, document_name
+            )
+
+        get_usage_ledger().record(
+            stage="extraction",
+            model=model,
+            usage_metadata=usage,
+            document_type=document_type,
+            document_name=document_name,
+        )
+        return document_extraction, usage
+
+    async def aextract_data_document(
+        self,
+        document_content_id: str,
+        document_type: str,
+        document_name: str = "",
+        model: str | None = None,
+        config_overrides: dict[str, Any] | None = None,
+    ) -> tuple[DocumentListExtractionOutput, dict[str, Any]]:
+        """
+        Async variant of extract_data_document. The learning context is
+        still read from Firestore's blocking client, in a worker thread.
+        """
+        prompt_schema, prompt_model = await asyncio.to_thread(
+            self._build_prompt, document_type
+        )
+        model = model or prompt_model
+
+        with get_tracer().span("extraction", document_type=document_type):
+            response, usage = await self._llm_client.agenerate(
+                prompt=prompt_schema,
+                model=model,
+                document_cache_id=document_content_id,
+                config={
+                    **self._generation_config(document_type),
+                    **(config_overrides or {}),
+                },
+            )
+
+            document_extraction = self._parse_extraction(
+                response, document_type, document_name
+            )
+
+        get_usage_ledger().record(
+            stage="extraction",
+            model=model,
+            usage_metadata=usage,
+            document_type=document_type,
+            document_name=document_name,
+        )
+        return document_extraction, usage
+
+    def _parse_extraction(
+        self, response: str, document_type: str, document_name: str
+    ) -> DocumentListExtractionOutput:
+        schema = get_document_schema(document_type)
+        document_extraction = (
+            schema.decode_compact(response)
+            if self._compact_responses
+            else schema.validate_json(response)
+        )
+        document_extraction.extracted_fields = self._normalize_fields(
+            document_type,
+            merge_duplicate_fields(document_extraction.extracted_fields, document_type),
+            document_name,
+        )
+        return document_extraction
+
+    def extract_data_document_stream(
+        self,
+        document_content_id: str,
+        document_type: str,
+        document_name: str = "",
+        model: str | None = None,
+        config_overrides: dict[str, Any] | None = None,
+    ) -> Generator[
+        DocumentFieldExtractionOutput,
+        None,
+        tuple[DocumentListExtractionOutput, dict[str, Any]],
+    ]:
+        """
+        Streams the extraction, yielding each field as soon as the model
+        closes its JSON object.
 
-        response, usage = self._llm_client.generate(
+        Returns:
+            The fully validated extraction and its usage, as the generator
+            return value.
+        """
+        prompt_schema, prompt_model = self._build_prompt(document_type)
+        model = model or prompt_model
+        document_extraction, usage = yield from get_tracer().stream(
+            "extraction",
+            self._stream_fields(
+                document_content_id,
+                document_type,
+                document_name,
+                prompt_schema,
+                model,
+                config_overrides,
+            ),
+            document_type=document_type,
+            streaming=True,
+        )
+
+        get_usage_ledger().record(
+            stage="extraction",
+            model=model,
+            usage_metadata=usage,
+            document_type=document_type,
+            document_name=document_name,
+        )
+        return document_extraction, usage
+
+    def _stream_fields(
+        self,
+        document_content_id: str,
+        document_type: str,
+        document_name: str,
+        prompt_schema: str,
+        model: str,
+        config_overrides: dict[str, Any] | None,
+    ) -> Generator[
+        DocumentFieldExtractionOutput,
+        None,
+        tuple[DocumentListExtractionOutput, Any],
+    ]:
+        """
+        The body of extract_data_document_stream, run inside its span.
+        """
+        schema = get_document_schema(document_type)
+        parser = IncrementalFieldParser(
+            schema.field_model,
+            decode=schema.decode_compact_row if self._compact_responses else None,
+        )
+        usage = None
+        span = get_tracer().current_span()
+        start = time.perf_counter()
+        for chunk, chunk_usage in self._llm_client.generate_stream(
             prompt=prompt_schema,
-            model=prompt["model"],
+            model=model,
             document_cache_id=document_content_id,
             config={
-                "response_mime_type": "application/json",
-                "response_json_schema": DocumentListExtractionOutput.model_json_schema(),
-                "temperature": 0.1,
-                "thinking_config": types.ThinkingConfig(thinking_level="minimal"),
-                "media_resolution": types.MediaResolution.MEDIA_RESOLUTION_HIGH,
+                **self._generation_config(document_type),
+                **(config_overrides or {}),
             },
-        )
+        ):
+            if chunk_usage:
+                usage = chunk_usage
+            for field in parser.feed(chunk):
+                if span is not None and (
+                    "time_to_first_field_seconds" not in span.attributes
+                ):
+                    span.set_attribute(
+                        "time_to_first_field_seconds", time.perf_counter() - start
+                    )
+                yield self._normalize_fields(document_type, [field])[0]
 
-        document_extraction = DocumentListExtractionOutput.model_validate_json(response)
+        document_extraction = self._parse_extraction(
+            parser.text, document_type, document_name
+        )
         return document_extraction, usage
 
+    def _build_prompt(self, document_type: str) -> tuple[str, str]:
+        if not self._prompt:
+            raise ValueError("Unknown Prompt")
+
+        schema = get_document_schema(document_type)
+
+        deadline = current_deadline()
+        if deadline is not None and deadline.should_degrade("skip_learning_context"):
+            examples_text = ""
+        else:
+            examples_text = self._learning_loop.get_learning_context(
+                document_type, fields=schema.field_names
+            )
+        print(f"examples_text => {examples_text}")
+
+        prompt = self._prompt.create()
+        prompt_schema = prompt["instruction"].replace(
+            "{SPECIFIC_SCHEMA}",
+            schema.compact_prompt_schema
+            if self._compact_responses
+            else schema.prompt_schema,
+        )
+        prompt_schema = prompt_schema.replace("{LEARNING_NOTES}", examples_text)
+        return prompt_schema, prompt["model"]
+
+    def _normalize_fields(
+        self,
+        document_type: str,
+        fields: list[DocumentFieldExtractionOutput],
+        document_name: str | None = None,
+    ) -> list[DocumentFieldExtractionOutput]:
+        """
+        Rewrites values matching a learned format rule. Provenance is recorded
+        in the normalizer when a document name is given, so the response
+        schema stays unchanged.
+        """
+        if self._normalizer is None:
+            return fields
+
+        normalized_fields = []
+        normalizations = []
+        for field in fields:
+            value, rule = self._normalizer.normalize(
+                document_type, field.name, field.value
+            )
+            if rule is None:
+                normalized_fields.append(field)
+                continue
+
+            normalized_fields.append(field.model_copy(update={"value": value}))
+            normalizations.append(
+                FieldNormalization(
+                    document_name=document_name or "",
+                    field=field.name,
+                    original_value=field.value,
+                    normalized_value=value,
+                    rule=f"{rule.bad_signature} -> {rule.good_signature}",
+                    rule_count=rule.count,
+                )
+            )
+
+        if document_name is not None and normalizations:
+            self._normalizer.record(normalizations)
+            span = get_tracer().current_span()
+            if span is not None:
+                span.set_attribute("normalized_fields", len(normalizations))
+        return normalized_fields
+
+    def _generation_config(self, document_type: str) -> dict[str, Any]:
+        from google.genai import types
+
+        schema = get_document_schema(document_type)
+        deadline = current_deadline()
+        media_resolution = (
+            types.MediaResolution.MEDIA_RESOLUTION_MEDIUM
+            if deadline is not None and deadline.should_degrade("low_media_resolution")
+            else types.MediaResolution.MEDIA_RESOLUTION_HIGH
+        )
+        return {
+            "response_mime_type": "application/json",
+            "response_json_schema": (
+                schema.compact_json_schema
+                if self._compact_responses
+                else schema.json_schema
+            ),
+            "temperature": 0.1,
+            "thinking_config": types.ThinkingConfig(thinking_level="minimal"),
+            "media_resolution": media_resolution,
+            **call_timeout_config(),
+        }
+
     def draw_from_model_coords(
         self,
         pdf_path: str,
         extracted_fields: list[DocumentFieldExtractionOutput],
     ) -> str:
+        with get_tracer().span("extraction.annotate", fields=len(extracted_fields)):
+            return self.draw_annotations(pdf_path, extracted_fields)
+
+    @staticmethod
+    def draw_annotations(
+        pdf_path: str,
+        extracted_fields: list[DocumentFieldExtractionOutput],
+    ) -> str:
+        """
+        Draws the field boxes on a copy of the document. Needs no client, so
+        it can run in another process.
+        """
+        import fitz  # type: ignore[import-untyped]
+
         doc = fitz.open(pdf_path)
 
         for field in extracted_fields:
@@ -138,45 +400,3 @@ class DataDocumentExtraction:
         doc.save(output_path, encryption=fitz.PDF_ENCRYPT_KEEP)
         doc.close()
         return output_path
-
-    def _get_schema(self, document_type: str) -> str:
-        match document_type:
-            case "bank_statement":
-                return """{
-                    "account_holder_name": "Name of the person or entity owning the account.",
-                    "account_number_masked": "Last 4 digits of the account number (e.g., '****1234').",
-                    "statement_start_date": "Start date of the statement period (YYYY-MM-DD).",
-                    "statement_end_date": "End date of the statement period (YYYY-MM-DD).",
-                    "starting_balance": "Balance at the beginning of the period (number).",
-                    "ending_balance": "Balance at the end of the period (number).",
-                }"""
-            case "government_id":
-                return """{
-                    "full_name": "Full legal name as displayed on the ID.",
-                    "date_of_birth": "Date of birth (YYYY-MM-DD).",
-                    "id_number": "The unique license or passport number.",
-                    "address": "Full residential address if present.",
-                    "expiration_date": "Date the ID expires (YYYY-MM-DD).",
-                }"""
-            case "w9_form":
-                return """{
-                    "legal_name": "Name as shown on your income tax return.",
-                    "ein_or_ssn": "The Employer Identification Number or Social Security Number (digits only).",
-                    "business_address": "Address (number, street, and apt. or suite no.).",
-                    "tax_classification": "Check the appropriate box (e.g., 'Individual/proprietor', 'C Corporation', 'S Corporation', 'Partnership', 'Trust/estate', 'LLC').",
-                    "signature_present": "Boolean (true if a signature is visible in Part II, else false).",
-                }"""
-            case "certificate_of_insurance":
-                return """{
-                    "insured_name": "Name of the insured entity.",
-                    "policy_number": "The policy number for General Liability or primary policy.",
-                    "policy_effective_date": "Policy effective start date (YYYY-MM-DD).",
-                    "policy_expiration_date": "Policy expiration date (YYYY-MM-DD).",
-                    "coverage_types": "List of strings. Detect active sections like 'Commercial General Liability', 'Automobile Liability', 'Umbrella Liability', 'Workers Compensation'.",
-                }"""
-            case _:
-                return """{
-                    "suggested_label": "A short classification of what this document appears to be (e.g., 'Invoice', 'Contract', 'Bank Statement', 'Receipt').",
-                    "summary": "A brief 1-sentence summary of the document contents.",
-                    FIELDS THAT YOU FIND IMPORTANT IN THE DOCUMENT
-                }"""
@@ -0,0 +1,92 @@
+from typing import Callable
+from typing import Generic
+from typing import TypeVar
+
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+FieldModel = TypeVar("FieldModel", bound=BaseModel)
+
+
+class IncrementalFieldParser(Generic[FieldModel]):
+    """
+    Parses a streamed DocumentListExtractionOutput JSON and returns each
+    field model as soon as its object closes.
+
+    Expected shape: {"extracted_fields": [{...}, {...}]}. Objects opened at
+    depth 3 (root object, fields array, field object) are the fields. With
+    a decoder, arrays at that depth are fields too, as in the compact
+    {"fields": [[...], [...]]} format.
+    """
+
+    FIELD_DEPTH = 3
+
+    def __init__(
+        self,
+        field_model: type[FieldModel],
+        decode: Callable[[str], FieldModel] | None = None,
+    ):
+        self._field_model = field_model
+        self._decode = decode or field_model.model_validate_json
+        self._field_openers = "{[" if decode is not None else "{"
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._field_start: int | None = None
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> list[FieldModel]:
+        """
+        Consumes a chunk of the response.
+
+        Args:
+            chunk: The next piece of streamed text.
+
+        Returns:
+            The fields completed by this chunk.
+        """
+        self._buffer += chunk
+        fields = []
+
+        for index in range(self._position, len(self._buffer)):
+            char = self._buffer[index]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == self.FIELD_DEPTH and char in self._field_openers:
+                    self._field_start = index
+            elif char in "}]":
+                if self._depth == self.FIELD_DEPTH and self._field_start is not None:
+                    field = self._parse_field(
+                        self._buffer[self._field_start : index + 1]
+                    )
+                    if field is not None:
+                        fields.append(field)
+                    self._field_start = None
+                self._depth -= 1
+
+        self._position = len(self._buffer)
+        return fields
+
+    def _parse_field(self, field_json: str) -> FieldModel | None:
+        try:
+            return self._decode(field_json)
+        except ValidationError as e:
+            print(f"Skipping malformed streamed field {field_json}: {e}")
+            return None
@@ -0,0 +1,272 @@
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Annotated
+from typing import Any
+from typing import Literal
+
+from pydantic import BaseModel
+from pydantic import create_model
+from pydantic import Field
+from pydantic import TypeAdapter
+
+
+class DocumentFieldExtractionOutput(BaseModel):
+    """
+    Represents the extracted data from a document.
+    """
+
+    name: str = Field(description="The name of the field.")
+    value: str = Field(description="The value of the field.")
+    confidence: float = Field(
+        description="The confidence of the classifier. e.g., 0.95"
+    )
+    page: int = Field(
+        description="The page of the document where the field is located."
+    )
+    coordinates: list[int] = Field(
+        description="The coordinates of the field in the document."
+    )
+
+
+class DocumentListExtractionOutput(BaseModel):
+    """
+    Represents a list of extracted data from a document.
+    """
+
+    extracted_fields: list[DocumentFieldExtractionOutput] = Field(
+        description="A list of extracted fields, each with a name, value, confidence, and page number."
+    )
+
+
+# Fields to extract per document type, with the instructions the model gets
+# for each of them.
+DOCUMENT_FIELDS: dict[str, dict[str, str]] = {
+    "bank_statement": {
+        "account_holder_name": "Name of the person or entity owning the account.",
+        "account_number_masked": "Last 4 digits of the account number (e.g., '****1234').",
+        "statement_start_date": "Start date of the statement period (YYYY-MM-DD).",
+        "statement_end_date": "End date of the statement period (YYYY-MM-DD).",
+        "starting_balance": "Balance at the beginning of the period (number).",
+        "ending_balance": "Balance at the end of the period (number).",
+    },
+    "government_id": {
+        "full_name": "Full legal name as displayed on the ID.",
+        "date_of_birth": "Date of birth (YYYY-MM-DD).",
+        "id_number": "The unique license or passport number.",
+        "address": "Full residential address if present.",
+        "expiration_date": "Date the ID expires (YYYY-MM-DD).",
+    },
+    "w9_form": {
+        "legal_name": "Name as shown on your income tax return.",
+        "ein_or_ssn": "The Employer Identification Number or Social Security Number (digits only).",
+        "business_address": "Address (number, street, and apt. or suite no.).",
+        "tax_classification": "Check the appropriate box (e.g., 'Individual/proprietor', 'C Corporation', 'S Corporation', 'Partnership', 'Trust/estate', 'LLC').",
+        "signature_present": "Boolean (true if a signature is visible in Part II, else false).",
+    },
+    "certificate_of_insurance": {
+        "insured_name": "Name of the insured entity.",
+        "policy_number": "The policy number for General Liability or primary policy.",
+        "policy_effective_date": "Policy effective start date (YYYY-MM-DD).",
+        "policy_expiration_date": "Policy expiration date (YYYY-MM-DD).",
+        "coverage_types": "List of strings. Detect active sections like 'Commercial General Liability', 'Automobile Liability', 'Umbrella Liability', 'Workers Compensation'.",
+    },
+}
+
+# Documents of other types suggest their own fields besides these.
+OPEN_DOCUMENT_FIELDS: dict[str, str] = {
+    "suggested_label": "A short classification of what this document appears to be (e.g., 'Invoice', 'Contract', 'Bank Statement', 'Receipt').",
+    "summary": "A brief 1-sentence summary of the document contents.",
+    "<other_field>": "Any other field that you find important in the document.",
+}
+
+
+COMPACT_RESPONSE_FORMAT = """
+---
+RESPONSE FORMAT:
+Return {{"fields": [...]}} with one array per extracted field:
+[field, value, confidence, page, ymin, xmin, ymax, xmax]
+where field is {field_reference} and ymin, xmin, ymax, xmax is the bounding box.
+"""
+
+
+@dataclass(frozen=True)
+class DocumentSchema:
+    """
+    The extraction schema of one document type: the models, the JSON schema
+    sent as response schema, the field list pasted into the prompt, and the
+    validator of the response, all built once.
+
+    The compact variant asks for one positional array per field instead of
+    an object, with typed fields referenced by their index, and is expanded
+    back into the same output models.
+    """
+
+    document_type: str
+    fields: dict[str, str]
+    open: bool
+    field_model: type[DocumentFieldExtractionOutput]
+    output_model: type[DocumentListExtractionOutput]
+    json_schema: dict[str, Any]
+    prompt_schema: str
+    adapter: TypeAdapter
+    compact_json_schema: dict[str, Any]
+    compact_prompt_schema: str
+    compact_adapter: TypeAdapter
+    compact_row_adapter: TypeAdapter
+
+    @property
+    def field_names(self) -> list[str]:
+        return [name for name in self.fields if not name.startswith("<")]
+
+    def validate_json(self, response: str) -> DocumentListExtractionOutput:
+        return self.adapter.validate_json(response)
+
+    def decode_compact(self, response: str) -> DocumentListExtractionOutput:
+        """
+        Validates a compact response and expands it into the output model.
+        """
+        rows = self.compact_adapter.validate_json(response).fields
+        names = self.field_names
+        return self.adapter.validate_python(
+            {"extracted_fields": [self._expand_row(row, names) for row in rows]}
+        )
+
+    def decode_compact_row(self, row_json: str) -> DocumentFieldExtractionOutput:
+        """
+        Validates and expands one streamed compact field.
+        """
+        row = self.compact_row_adapter.validate_json(row_json)
+        return self.field_model.model_validate(self._expand_row(row, self.field_names))
+
+    def _expand_row(self, row: tuple, names: list[str]) -> dict[str, Any]:
+        field, value, confidence, page, *coordinates = row
+        return {
+            "name": field if self.open else names[field],
+            "value": value,
+            "confidence": confidence,
+            "page": page,
+            "coordinates": coordinates,
+        }
+
+
+def _typed_models(
+    document_type: str, fields: dict[str, str]
+) -> tuple[type[DocumentFieldExtractionOutput], type[DocumentListExtractionOutput]]:
+    """
+    Narrows the generic models to the fields of a document type: names are
+    an enum, confidences are within [0, 1] and coordinates hold four values.
+    The schema asks for each field at most once, but a repeated field is
+    still accepted and merged by the extraction.
+    """
+    class_prefix = "".join(part.title() for part in document_type.split("_"))
+
+    field_model = create_model(
+        f"{class_prefix}Field",
+        __base__=DocumentFieldExtractionOutput,
+        name=(
+            Literal[tuple(fields)],  # type: ignore[valid-type]
+            Field(description="The name of the field."),
+        ),
+        confidence=(
+            float,
+            Field(ge=0, le=1, description="The confidence of the value. e.g., 0.95"),
+        ),
+        coordinates=(
+            list[int],
+            Field(
+                min_length=4,
+                max_length=4,
+                description="[ymin, xmin, ymax, xmax] of the value, normalized to 0-1000.",
+            ),
+        ),
+    )
+    output_model = create_model(
+        f"{class_prefix}Extraction",
+        __base__=DocumentListExtractionOutput,
+        extracted_fields=(
+            list[field_model],  # type: ignore[valid-type]
+            Field(
+                json_schema_extra={"maxItems": len(fields)},
+                description="The extracted fields, each at most once.",
+            ),
+        ),
+    )
+    return field_model, output_model
+
+
+def _compact_types(fields: dict[str, str] | None) -> tuple[Any, Any]:
+    """
+    The row type [field, value, confidence, page, ymin, xmin, ymax, xmax]
+    and the response type {"fields": [row, ...]}. Typed fields are
+    referenced by index, the others by name.
+    """
+    field_type: Any = (
+        str if fields is None else Literal[tuple(range(len(fields)))]  # type: ignore[misc]
+    )
+    row_type = tuple[  # type: ignore[valid-type]
+        field_type,
+        str,
+        Annotated[float, Field(ge=0, le=1)],
+        int,
+        int,
+        int,
+        int,
+        int,
+    ]
+    response_type = create_model(
+        "CompactExtraction",
+        fields=(
+            list[row_type],  # type: ignore[valid-type]
+            Field(json_schema_extra={"maxItems": len(fields)})
+            if fields is not None
+            else Field(),
+        ),
+    )
+    return row_type, response_type
+
+
+@lru_cache(maxsize=None)
+def _build_schema(document_type: str | None) -> DocumentSchema:
+    if document_type is None:
+        document_type, fields, is_open = "unknown", OPEN_DOCUMENT_FIELDS, True
+        field_model, output_model = (
+            DocumentFieldExtractionOutput,
+            DocumentListExtractionOutput,
+        )
+        row_type, compact_model = _compact_types(None)
+        compact_fields = fields
+        field_reference = "the field name"
+    else:
+        fields, is_open = DOCUMENT_FIELDS[document_type], False
+        field_model, output_model = _typed_models(document_type, fields)
+        row_type, compact_model = _compact_types(fields)
+        compact_fields = {
+            f"{index}. {name}": text
+            for index, (name, text) in enumerate(fields.items())
+        }
+        field_reference = "the number before the field name"
+
+    return DocumentSchema(
+        document_type=document_type,
+        fields=fields,
+        open=is_open,
+        field_model=field_model,
+        output_model=output_model,
+        json_schema=output_model.model_json_schema(),
+        prompt_schema=json.dumps(fields, indent=2),
+        adapter=TypeAdapter(output_model),
+        compact_json_schema=compact_model.model_json_schema(),
+        compact_prompt_schema=json.dumps(compact_fields, indent=2)
+        + COMPACT_RESPONSE_FORMAT.format(field_reference=field_reference),
+        compact_adapter=TypeAdapter(compact_model),
+        compact_row_adapter=TypeAdapter(row_type),
+    )
+
+
+def get_document_schema(document_type: str) -> DocumentSchema:
+    """
+    The cached schema of a document type; types without registered fields
+    share the open-ended schema.
+    """
+    return _build_schema(document_type if document_type in DOCUMENT_FIELDS else None)
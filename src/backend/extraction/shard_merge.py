@@ -0,0 +1,81 @@
+from .schemas import DocumentFieldExtractionOutput
+
+HIGHEST_CONFIDENCE = "highest_confidence"
+EARLIEST_PAGE = "earliest_page"
+LATEST_PAGE = "latest_page"
+
+# Conflict resolution per field when several page windows extract the same
+# field. Fields not listed here keep the most confident value.
+FIELD_MERGE_RULES: dict[str, dict[str, str]] = {
+    "bank_statement": {
+        "statement_start_date": EARLIEST_PAGE,
+        "starting_balance": EARLIEST_PAGE,
+        "statement_end_date": LATEST_PAGE,
+        "ending_balance": LATEST_PAGE,
+    },
+}
+
+
+def page_windows(page_count: int, window_size: int) -> list[tuple[int, int]]:
+    """
+    Splits 1..page_count into consecutive 1-based inclusive page windows.
+    """
+    return [
+        (start, min(start + window_size - 1, page_count))
+        for start in range(1, page_count + 1, window_size)
+    ]
+
+
+def _has_value(field: DocumentFieldExtractionOutput) -> bool:
+    return field.confidence > 0 and str(field.value).strip().lower() not in (
+        "",
+        "none",
+        "null",
+    )
+
+
+def _pick(candidates: list[DocumentFieldExtractionOutput], rule: str):
+    match rule:
+        case "earliest_page":
+            return min(candidates, key=lambda field: (field.page, -field.confidence))
+        case "latest_page":
+            return max(candidates, key=lambda field: (field.page, field.confidence))
+        case _:
+            return max(candidates, key=lambda field: (field.confidence, -field.page))
+
+
+def merge_extracted_fields(
+    shard_fields: list[list[DocumentFieldExtractionOutput]], document_type: str
+) -> list[DocumentFieldExtractionOutput]:
+    """
+    Merges the fields extracted from each page window into one list,
+    resolving conflicts with FIELD_MERGE_RULES. Pages must already be
+    relative to the original document.
+    """
+    rules = FIELD_MERGE_RULES.get(document_type, {})
+    candidates: dict[str, list[DocumentFieldExtractionOutput]] = {}
+    for fields in shard_fields:
+        for field in fields:
+            candidates.setdefault(field.name, []).append(field)
+
+    merged = []
+    for name, fields in candidates.items():
+        found = [field for field in fields if _has_value(field)] or fields
+        merged.append(_pick(found, rules.get(name, HIGHEST_CONFIDENCE)))
+    return merged
+
+
+def merge_duplicate_fields(
+    fields: list[DocumentFieldExtractionOutput], document_type: str
+) -> list[DocumentFieldExtractionOutput]:
+    """
+    Merges the fields a single response extracted more than once, with the
+    same rules as the page windows, instead of failing the document.
+    """
+    names = [field.name for field in fields]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if not duplicates:
+        return fields
+
+    print(f"Merging fields extracted more than once: {duplicates}")
+    return merge_extracted_fields([fields], document_type)
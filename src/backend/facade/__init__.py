@@ -1 +1,4 @@
+from .facade_loan import DEFAULT_PIPELINE_WORKERS
 from .facade_loan import FacadeLoan
+from .facade_loan import PacketSegmentResult
+from .facade_loan import PipelineDocument
@@ -1,21 +1,166 @@
+import contextvars
+import dataclasses
+import datetime
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterator
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from typing import Any
+from typing import ContextManager
 
-from google.cloud import firestore
+import numpy as np
 
+from ..calibration import ConfidenceCalibrator
+from ..calibration import DOCUMENT_TYPE_FIELD
 from ..classifier import DocumentClassificationOutput
 from ..classifier import DocumentClassifier
+from ..commons import current_deadline
+from ..commons import Deadline
+from ..commons import deadline_scope
+from ..commons import DEFAULT_MODEL
+from ..commons import DEFAULT_ROUTES
 from ..commons import get_llm_factory
+from ..commons import get_profiler
+from ..commons import get_tracer
+from ..commons import get_usage_ledger
 from ..commons import GoogleCloudStorage
+from ..commons import InMemoryFirestore
+from ..commons import InMemorySpanExporter
+from ..commons import JsonlSpanExporter
+from ..commons import LLM
 from ..commons import LLMFactory
+from ..commons import LLMRouter
+from ..commons import LocalStorage
+from ..commons import PipelineStage
+from ..commons import profile_scope
+from ..commons import RecordingLLMFactory
+from ..commons import Route
+from ..commons import RouteDecision
+from ..commons import set_profiled_document_type
+from ..commons import Span
+from ..commons import StagedPipeline
+from ..commons import StageStats
 from ..dashboard import calculate_cost
-from ..dashboard import calculate_extraction_metrics
-from ..dashboard import calculate_ops_metrics
-from ..dashboard import calculate_tagging_metrics
+from ..dashboard import calculate_deadline_metrics
+from ..dashboard import calculate_extraction_metrics_from_rollup
+from ..dashboard import calculate_ops_metrics_from_rollup
+from ..dashboard import calculate_stage_metrics_from_rollup
+from ..dashboard import calculate_tagging_metrics_from_confusion
+from ..dashboard import confidence_histogram_table
+from ..dashboard import confusion_matrix_cells
+from ..dashboard import EventStore
+from ..documents import DocumentFingerprint
+from ..documents import NearDuplicate
+from ..documents import PageRenderer
+from ..documents import SimilarityIndex
+from ..extraction import CoordinateSnapper
 from ..extraction import DataDocumentExtraction
 from ..extraction import DocumentFieldExtractionOutput
+from ..extraction import get_document_schema
+from ..extraction import merge_extracted_fields
+from ..extraction import page_windows
+from ..learning_loop import FieldNormalization
+from ..learning_loop import FormatNormalizer
+from ..learning_loop import LearningIndex
 from ..learning_loop import LearningLoop
 from ..prompts import ClassifierPrompt
 from ..prompts import ExtractionPrompt
+from ..splitter import DocumentSegment
+from ..splitter import PacketSplitter
+
+
+@dataclass
+class PacketSegmentResult:
+    """
+    Classification and extraction of one segment of a combined packet, with
+    pages relative to the original file.
+    """
+
+    segment: DocumentSegment
+    document_name: str
+    classification: DocumentClassificationOutput
+    extracted_fields: list[DocumentFieldExtractionOutput]
+
+
+# Workers of each stage of the document pipeline; annotate runs in processes,
+# the other stages wait on files, storage and models in threads.
+DEFAULT_PIPELINE_WORKERS: dict[str, int] = {
+    "store": 2,
+    "upload": 8,
+    "classify": 8,
+    "extract": 8,
+    "annotate": max(1, (os.cpu_count() or 2) // 2),
+    "persist": 2,
+}
+
+# How often the learning examples are compacted in the background.
+LEARNING_COMPACTION_SECONDS = 300.0
+
+
+@dataclass
+class PipelineDocument:
+    """
+    A document moving through the staged pipeline, filled in by each stage.
+    Content given with the document is stored under resources/documents
+    first.
+    """
+
+    document_name: str
+    content: bytes | None = None
+    deadline: Deadline = dataclasses.field(default_factory=Deadline)
+    page_count: int = 0
+    document_id: Any = None
+    classification: DocumentClassificationOutput | None = None
+    extracted_fields: list[DocumentFieldExtractionOutput] = dataclasses.field(
+        default_factory=list
+    )
+    usage: list[Any] = dataclasses.field(default_factory=list)
+    annotated_file: str | None = None
+    stage_latencies: dict[str, float] = dataclasses.field(default_factory=dict)
+
+    def classified(self) -> DocumentClassificationOutput:
+        if self.classification is None:
+            raise ValueError(f"{self.document_name} is not classified yet")
+        return self.classification
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Sent to the process stages of the pipeline with plain fields, as
+        # the typed field models are built at runtime and cannot be pickled.
+        state = self.__dict__.copy()
+        state["extracted_fields"] = [
+            field.model_dump() for field in self.extracted_fields
+        ]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        field_model = DocumentFieldExtractionOutput
+        if self.classification is not None:
+            field_model = get_document_schema(
+                self.classification.document_type
+            ).field_model
+        self.extracted_fields = [
+            field_model.model_construct(**field) for field in state["extracted_fields"]
+        ]
+
+
+def annotate_pipeline_document(document: PipelineDocument) -> PipelineDocument:
+    """
+    The annotate stage of the pipeline, run in a worker process.
+    """
+    start = time.perf_counter()
+    document.annotated_file = DataDocumentExtraction.draw_annotations(
+        f"resources/documents/{document.document_name}", document.extracted_fields
+    )
+    document.stage_latencies["annotate"] = time.perf_counter() - start
+    return document
 
 
 class FacadeLoan:
@@ -28,124 +173,1624 @@ class FacadeLoan:
     def __init__(
         self,
         llm_factory: LLMFactory,
-        storage_client: GoogleCloudStorage,
+        storage_client: GoogleCloudStorage | LocalStorage,
         bucket_name: str,
         api_key: str,
-        db,
+        db=None,
+        event_store: EventStore | None = None,
+        shard_page_threshold: int = 20,
+        shard_window_size: int = 10,
+        shard_max_workers: int = 4,
+        calibrator: ConfidenceCalibrator | None = None,
+        page_renderer: PageRenderer | None = None,
+        coordinate_snapper: CoordinateSnapper | None = None,
+        router: LLMRouter | None = None,
+        compact_responses: bool = False,
+        similarity_index: SimilarityIndex | None = None,
+        reuse_near_duplicates: bool = True,
+        pipeline_workers: dict[str, int] | None = None,
     ):
+        """
+        Args:
+            similarity_index: Index of processed documents; opened under
+                resources/ on first use unless given.
+            reuse_near_duplicates: Start the extraction of a near duplicate
+                of a processed document from its results, extracting only
+                the pages that changed.
+            pipeline_workers: Workers of the pipeline stages, overriding
+                DEFAULT_PIPELINE_WORKERS.
+        """
         self._llm_factory = llm_factory
         self._storage_client = storage_client
         self._bucket_name = bucket_name
         self._api_key = api_key
         self._db = db
+        self._event_store = event_store or EventStore(root_dir="resources/events")
+        self._chart_cache: dict[tuple, dict[str, Any]] = {}
+        self._metrics_cache: dict[tuple, tuple] = {}
+        self._learning_index = LearningIndex()
+        self._format_normalizer = FormatNormalizer(self._learning_index)
+        self._shard_page_threshold = shard_page_threshold
+        self._shard_window_size = shard_window_size
+        self._shard_max_workers = shard_max_workers
+        self._calibrator = calibrator or ConfidenceCalibrator()
+        self._calibration_loaded = False
+        self._page_renderer = page_renderer or PageRenderer()
+        self._coordinate_snapper = coordinate_snapper or CoordinateSnapper()
+        self._unlocated_fields: dict[str, list[str]] = {}
+        self._router = router or LLMRouter(
+            llm_factory, provider_configs={"gemini": {"api_key": api_key}}
+        )
+        self._routing_loaded = False
+        self._compact_responses = compact_responses
+        self._document_routes: dict[str, dict[str, list[RouteDecision]]] = {}
+        self._uploads: dict[str, dict[str, Any]] = {}
+        self._routes_lock = threading.Lock()
+        self._similarity_index = similarity_index
+        self._reuse_near_duplicates = reuse_near_duplicates
+        self._fingerprints: dict[str, Future[DocumentFingerprint]] = {}
+        self._fingerprints_lock = threading.Lock()
+        self._fingerprint_executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="fingerprint"
+        )
+        self._near_duplicates: dict[str, NearDuplicate | None] = {}
+        self._annotation_executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="annotation"
+        )
+        self._deferred_annotations: dict[str, Future] = {}
+        self._pipeline_workers = {
+            **DEFAULT_PIPELINE_WORKERS,
+            **(pipeline_workers or {}),
+        }
+        self._pipeline: StagedPipeline | None = None
+        self._pipeline_lock = threading.Lock()
+        self._compaction_thread: threading.Thread | None = None
+        self._compaction_stopped = threading.Event()
+        self._compaction_lock = threading.Lock()
+
+    @property
+    def db(self):
+        """
+        The Firestore client, created on first use unless one was given.
+        """
+        if self._db is None:
+            from google.cloud import firestore
+
+            self._db = firestore.Client()
+        return self._db
+
+    @property
+    def similarity_index(self) -> SimilarityIndex:
+        """
+        The index of processed documents, opened on first use unless one
+        was given.
+        """
+        if self._similarity_index is None:
+            self._similarity_index = SimilarityIndex(
+                "resources/similarity_index.sqlite"
+            )
+        return self._similarity_index
 
     def classify_document(
+        self, document_name: str, deadline: Deadline | None = None
+    ) -> tuple[DocumentClassificationOutput, str, dict[str, Any]]:
+        """
+        Classifies a document on the routed model, escalating to the next
+        tier when the classifier is not confident enough and the deadline
+        leaves time for it.
+        """
+        with deadline_scope(deadline):
+            return self._classify_document(document_name)
+
+    def _classify_document(
         self, document_name: str
     ) -> tuple[DocumentClassificationOutput, str, dict[str, Any]]:
+        self._reset_document(document_name)
+        self._start_fingerprint(document_name)
+        return self._classify_uploaded(document_name)
+
+    def _reset_document(self, document_name: str):
+        # A new classification starts from a fresh upload of the file.
+        with self._routes_lock:
+            self._uploads.pop(document_name, None)
+            self._document_routes.pop(document_name, None)
+        with self._fingerprints_lock:
+            self._fingerprints.pop(document_name, None)
+        self._near_duplicates.pop(document_name, None)
+        self._unlocated_fields.pop(document_name, None)
+        self._format_normalizer.forget(document_name)
+        self._deferred_annotations.pop(f"resources/documents/{document_name}", None)
+
+    def _classify_uploaded(
+        self, document_name: str
+    ) -> tuple[DocumentClassificationOutput, str, dict[str, Any]]:
+        decision = self._select_route(
+            "classification",
+            page_count=self._page_count(f"resources/documents/{document_name}"),
+        )
+        while True:
+            route = self._router.get_route(decision.route)
+            llm = self._router.get_llm(route)
+            document_id = self._document_id_for(document_name, None, route, llm)
+
+            document_classifier = DocumentClassifier(
+                llm_client=llm,
+                prompt=ClassifierPrompt(),
+            )
+            start = time.perf_counter()
+            with get_tracer().span("classification", route=route.name):
+                document_classification, usage = document_classifier.classify_document(
+                    document_content_id=document_id,
+                    document_name=document_name,
+                    model=route.model,
+                    config_overrides=route.generation_config,
+                )
+            self._record_route(document_name, decision, time.perf_counter() - start)
+
+            escalation = self._router.escalate(
+                decision, document_classification.confidence
+            )
+            if escalation is None or self._should_degrade("skip_escalation"):
+                break
+            decision = escalation
+        self._keep_route(document_name, decision)
+        set_profiled_document_type(document_classification.document_type)
+
+        print(f"Document Classification: {document_classification}")
+
+        return document_classification, document_id, usage
+
+    def document_extraction(
+        self,
+        document_name: str,
+        document_id: str,
+        document_type: str,
+        deadline: Deadline | None = None,
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[Any], str]:
+        """
+        Extracts the fields of a classified document and annotates it.
+        Documents longer than the shard page threshold are extracted in
+        concurrent page windows instead of a single request, and near
+        duplicates of a processed document only on their changed pages.
+
+        Args:
+            deadline: The time budget of the document, which ends with this
+                stage and is recorded once it completes.
+
+        Returns:
+            The fields, the usage metadata of each model call made, and the
+            annotated file.
+        """
+        with deadline_scope(deadline):
+            result = self._document_extraction(
+                document_name, document_id, document_type
+            )
+        if deadline is not None:
+            self.record_deadline(document_name, deadline)
+        return result
+
+    def _document_extraction(
+        self,
+        document_name: str,
+        document_id: str,
+        document_type: str,
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[Any], str]:
+        source_file_name = f"resources/documents/{document_name}"
+
+        data_document_extraction = self._create_data_document_extraction()
+
+        extracted_fields, usage = self._extract_fields(
+            document_name, document_id, document_type
+        )
+        annoted_file = self._annotate(
+            source_file_name, extracted_fields, data_document_extraction
+        )
+
+        print(f"Data Extraction: {extracted_fields}")
+
+        return extracted_fields, usage, annoted_file
+
+    def _extract_fields(
+        self,
+        document_name: str,
+        document_id: str,
+        document_type: str,
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[Any]]:
+        source_file_name = f"resources/documents/{document_name}"
+        set_profiled_document_type(document_type)
+
+        page_count = self._page_count(source_file_name)
+        near_duplicate = self._reusable_near_duplicate(document_name, document_type)
+        if near_duplicate is not None:
+            extracted_fields, usage = self._extract_changed_pages(
+                document_name, document_type, near_duplicate
+            )
+        elif page_count > self._shard_page_threshold:
+            extracted_fields, usage = self._extract_sharded(
+                document_name, document_type, page_count
+            )
+        else:
+            extracted_fields, routed_usage = self._extract_routed(
+                document_name, document_name, document_type, page_count, document_id
+            )
+            usage = [routed_usage]
+
+        print(f"Source File Name: {source_file_name}")
+
+        extracted_fields = self._snap_fields(
+            document_name, source_file_name, extracted_fields
+        )
+        self._index_result(document_name, document_type, extracted_fields)
+        return extracted_fields, usage
+
+    def document_extraction_stream(
+        self,
+        document_name: str,
+        document_id: str,
+        document_type: str,
+        deadline: Deadline | None = None,
+    ) -> Generator[
+        DocumentFieldExtractionOutput,
+        None,
+        tuple[list[DocumentFieldExtractionOutput], list[Any], str],
+    ]:
+        """
+        Streaming variant of document_extraction. Yields each field as soon
+        as it is generated and returns the same tuple as document_extraction
+        once the response and the annotation are complete.
+
+        Fields already shown cannot be taken back, so a streamed extraction
+        is routed but never escalated. The deadline is only current while
+        the extraction runs, not while the caller handles a field.
+        """
+        stream = self._document_extraction_stream(
+            document_name, document_id, document_type
+        )
+        while True:
+            with deadline_scope(deadline):
+                try:
+                    field = next(stream)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+            yield field
+        if deadline is not None:
+            self.record_deadline(document_name, deadline)
+        return result
+
+    def _document_extraction_stream(
+        self,
+        document_name: str,
+        document_id: str,
+        document_type: str,
+    ) -> Generator[
+        DocumentFieldExtractionOutput,
+        None,
+        tuple[list[DocumentFieldExtractionOutput], list[Any], str],
+    ]:
+        source_file_name = f"resources/documents/{document_name}"
+        set_profiled_document_type(document_type)
+
+        page_count = self._page_count(source_file_name)
+        near_duplicate = self._reusable_near_duplicate(document_name, document_type)
+        if near_duplicate is not None:
+            data_document_extraction = self._create_data_document_extraction()
+            extracted_fields, usage = self._extract_changed_pages(
+                document_name, document_type, near_duplicate
+            )
+            yield from extracted_fields
+        elif page_count > self._shard_page_threshold:
+            data_document_extraction = self._create_data_document_extraction()
+            extracted_fields, usage = self._extract_sharded(
+                document_name, document_type, page_count
+            )
+            yield from extracted_fields
+        else:
+            decision = self._select_route("extraction", document_type, page_count)
+            route = self._router.get_route(decision.route)
+            data_document_extraction = self._create_data_document_extraction(route)
+            stream = data_document_extraction.extract_data_document_stream(
+                document_content_id=self._document_id_for(
+                    document_name,
+                    document_id,
+                    route,
+                    data_document_extraction.llm_client,
+                ),
+                document_type=document_type,
+                document_name=document_name,
+                model=route.model,
+                config_overrides=route.generation_config,
+            )
+            # The route latency leaves out the time the caller spends on
+            # each field.
+            latency_seconds = 0.0
+            while True:
+                start = time.perf_counter()
+                try:
+                    field = next(stream)
+                except StopIteration as stop:
+                    extraction, routed_usage = stop.value
+                    break
+                finally:
+                    latency_seconds += time.perf_counter() - start
+                yield field
+            self._record_route(document_name, decision, latency_seconds)
+            usage = [routed_usage]
+            self._keep_route(document_name, decision)
+            extracted_fields = extraction.extracted_fields
+
+        extracted_fields = self._snap_fields(
+            document_name, source_file_name, extracted_fields
+        )
+        self._index_result(document_name, document_type, extracted_fields)
+        annoted_file = self._annotate(
+            source_file_name, extracted_fields, data_document_extraction
+        )
+
+        print(f"Data Extraction: {extracted_fields}")
+
+        return extracted_fields, usage, annoted_file
+
+    def _snap_fields(
+        self,
+        document_name: str,
+        pdf_path: str,
+        extracted_fields: list[DocumentFieldExtractionOutput],
+    ) -> list[DocumentFieldExtractionOutput]:
+        """
+        Moves the model boxes onto the words spelling each value, and keeps
+        the names of the fields whose value is not on their page.
+        """
+        snapped_fields, unlocated = self._coordinate_snapper.snap_fields(
+            pdf_path, extracted_fields
+        )
+        self._unlocated_fields[document_name] = unlocated
+        return snapped_fields
+
+    def _annotate(
+        self,
+        pdf_path: str,
+        extracted_fields: list[DocumentFieldExtractionOutput],
+        data_document_extraction: DataDocumentExtraction,
+    ) -> str:
+        """
+        Annotates the document, or when the deadline is close returns it
+        unannotated and draws the boxes in the background; see
+        get_annotated_file.
+        """
+        if not self._should_degrade("defer_annotation"):
+            return data_document_extraction.draw_from_model_coords(
+                pdf_path=pdf_path, extracted_fields=extracted_fields
+            )
+
+        self._deferred_annotations[pdf_path] = self._annotation_executor.submit(
+            contextvars.copy_context().run,
+            data_document_extraction.draw_from_model_coords,
+            pdf_path,
+            extracted_fields,
+        )
+        return pdf_path
+
+    def get_annotated_file(self, pdf_path: str) -> str:
+        """
+        The annotated copy of a file whose annotation was deferred, once
+        drawn; the file itself until then. The annotation is handed out
+        once, callers keep the returned path.
+        """
+        future = self._deferred_annotations.get(pdf_path)
+        if future is None or not future.done():
+            return pdf_path
+        self._deferred_annotations.pop(pdf_path, None)
+        return future.result()
+
+    @staticmethod
+    def _should_degrade(degradation: str) -> bool:
+        deadline = current_deadline()
+        return deadline is not None and deadline.should_degrade(degradation)
+
+    def _extract_sharded(
+        self,
+        document_name: str,
+        document_type: str,
+        page_count: int,
+        windows: list[tuple[int, int]] | None = None,
+        prior_fields: list[DocumentFieldExtractionOutput] | None = None,
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[Any]]:
+        """
+        Extracts page windows concurrently and merges their fields, with
+        any fields already known for the other pages.
+        """
+        source_file_name = f"resources/documents/{document_name}"
+        if windows is None:
+            windows = page_windows(page_count, self._shard_window_size)
+        if not windows:
+            return merge_extracted_fields([prior_fields or []], document_type), []
+
+        with get_tracer().span(
+            "extraction.sharded", pages=page_count, shards=len(windows)
+        ):
+            with ThreadPoolExecutor(
+                max_workers=min(self._shard_max_workers, len(windows))
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._extract_shard,
+                        source_file_name,
+                        document_type,
+                        start_page,
+                        end_page,
+                    )
+                    for start_page, end_page in windows
+                ]
+                shard_results = [future.result() for future in futures]
+
+        extracted_fields = merge_extracted_fields(
+            [prior_fields or [], *(fields for fields, _ in shard_results)],
+            document_type,
+        )
+        return extracted_fields, [usage for _, usage in shard_results]
+
+    def find_near_duplicate(self, document_name: str) -> NearDuplicate | None:
+        """
+        The most similar document processed before this one, with the pages
+        that differ from it and its stored results.
+        """
+        if document_name not in self._near_duplicates:
+            fingerprint = self._fingerprint(document_name)
+            self._near_duplicates[document_name] = self.similarity_index.find(
+                fingerprint, exclude=document_name
+            )
+        return self._near_duplicates[document_name]
+
+    def get_reused_result(self, document_name: str) -> NearDuplicate | None:
+        """
+        The near duplicate whose results the last extraction of a document
+        started from, if any.
+        """
+        near_duplicate = self._near_duplicates.get(document_name)
+        if (
+            near_duplicate is None
+            or not near_duplicate.reusable
+            or not self._reuse_near_duplicates
+        ):
+            return None
+        return near_duplicate
+
+    def get_possible_resubmission(self, document_name: str) -> NearDuplicate | None:
+        """
+        A processed document that a scanned one looks like. Its results are
+        not reused, since scans of the same form by different applicants
+        look alike, but the match may be worth a look during review.
+        """
+        near_duplicate = self._near_duplicates.get(document_name)
+        if near_duplicate is None or near_duplicate.reusable:
+            return None
+        return near_duplicate
+
+    def _start_fingerprint(self, document_name: str) -> Future[DocumentFingerprint]:
+        """
+        Fingerprints a document in the background, so rendering its pages
+        overlaps the classification instead of delaying the extraction.
+        """
+        with self._fingerprints_lock:
+            if document_name not in self._fingerprints:
+                self._fingerprints[document_name] = self._fingerprint_executor.submit(
+                    contextvars.copy_context().run,
+                    self.similarity_index.fingerprint,
+                    f"resources/documents/{document_name}",
+                )
+            return self._fingerprints[document_name]
+
+    def _fingerprint(self, document_name: str) -> DocumentFingerprint:
+        return self._start_fingerprint(document_name).result()
+
+    def _reusable_near_duplicate(
+        self, document_name: str, document_type: str
+    ) -> NearDuplicate | None:
+        """
+        A near duplicate whose results are of the same document type, when
+        reuse is enabled.
+        """
+        if not self._reuse_near_duplicates:
+            return None
+
+        self._near_duplicates.pop(document_name, None)
+        if not self._start_fingerprint(document_name).done():
+            # Waiting would delay every extraction; the document is indexed
+            # once extracted, so its own near duplicates still benefit.
+            print(f"{document_name} is not fingerprinted yet, extracting it in full")
+            return None
+        near_duplicate = self.find_near_duplicate(document_name)
+        if near_duplicate is not None and not near_duplicate.reusable:
+            print(
+                f"Possible resubmission of {near_duplicate.document_name}: "
+                f"{document_name} has no text layer, extracting it in full"
+            )
+            return None
+        if (
+            near_duplicate is None
+            or near_duplicate.result is None
+            or near_duplicate.result["document_type"] != document_type
+        ):
+            self._near_duplicates[document_name] = None
+            return None
+
+        fingerprint = self._fingerprint(document_name)
+        self.record_event(
+            "near_duplicate",
+            {
+                "document_name": document_name,
+                "doc_type": document_type,
+                "matched_document": near_duplicate.document_name,
+                "similarity": near_duplicate.similarity,
+                "page_count": fingerprint.page_count,
+                "changed_pages": len(near_duplicate.changed_pages),
+            },
+        )
+        return near_duplicate
+
+    def _extract_changed_pages(
+        self, document_name: str, document_type: str, near_duplicate: NearDuplicate
+    ) -> tuple[list[DocumentFieldExtractionOutput], list[Any]]:
+        """
+        Keeps the results of a near duplicate on the pages that did not
+        change and extracts the runs of changed pages as shards.
+        """
+        page_count = self._fingerprint(document_name).page_count
+        changed_pages = set(near_duplicate.changed_pages)
+        field_model = get_document_schema(document_type).field_model
+        prior_fields = [
+            field_model.model_validate(field)
+            for field in (near_duplicate.result or {}).get("fields", [])
+            if field["page"] <= page_count and field["page"] not in changed_pages
+        ]
+
+        windows: list[tuple[int, int]] = []
+        for page in sorted(changed_pages):
+            if windows and windows[-1][1] == page - 1:
+                windows[-1] = (windows[-1][0], page)
+            else:
+                windows.append((page, page))
+
+        with get_tracer().span(
+            "extraction.near_duplicate",
+            matched_document=near_duplicate.document_name,
+            changed_pages=len(changed_pages),
+        ):
+            return self._extract_sharded(
+                document_name,
+                document_type,
+                page_count,
+                windows=windows,
+                prior_fields=prior_fields,
+            )
+
+    def _index_result(
+        self,
+        document_name: str,
+        document_type: str,
+        extracted_fields: list[DocumentFieldExtractionOutput],
+    ):
+        """
+        Stores the results of a document so its near duplicates can reuse
+        them.
+        """
+        self.similarity_index.add(
+            document_name,
+            self._fingerprint(document_name),
+            {
+                "document_type": document_type,
+                "fields": [field.model_dump() for field in extracted_fields],
+            },
+        )
+
+    def save_reviewed_result(
+        self, document_name: str, document_type: str, values: dict[str, str]
+    ):
+        """
+        Replaces the stored results of a document with its reviewed type
+        and values, so near duplicates start from the corrected data.
+        """
+        result = self.similarity_index.get_result(document_name)
+        if result is None:
+            return
+
+        if result["document_type"] != document_type:
+            result = {"document_type": document_type, "fields": []}
+        for field in result["fields"]:
+            if field["name"] in values:
+                field["value"] = values[field["name"]]
+        self.similarity_index.set_result(document_name, result)
+
+    def _extract_shard(
+        self,
+        source_file_name: str,
+        document_type: str,
+        start_page: int,
+        end_page: int,
+    ) -> tuple[list[DocumentFieldExtractionOutput], Any]:
+        shard_path = PacketSplitter.write_segment(
+            source_file_name, start_page, end_page
+        )
+        shard_name = os.path.basename(shard_path)
+
+        extracted_fields, usage = self._extract_routed(
+            shard_name,
+            os.path.basename(source_file_name),
+            document_type,
+            end_page - start_page + 1,
+        )
+
+        page_offset = start_page - 1
+        return [
+            field.model_copy(update={"page": field.page + page_offset})
+            for field in extracted_fields
+        ], usage
+
+    def _extract_routed(
+        self,
+        upload_name: str,
+        document_name: str,
+        document_type: str,
+        page_count: int,
+        document_id: Any = None,
+    ) -> tuple[list[DocumentFieldExtractionOutput], Any]:
+        """
+        Extracts a file on the routed model, escalating to the next tier
+        while the mean field confidence is too low.
+
+        Args:
+            upload_name: The file under resources/documents to extract.
+            document_name: The document the usage and routes are kept for.
+            document_id: The file as already loaded, if any.
+        """
+        if document_id is None:
+            with self._routes_lock:
+                self._uploads.pop(upload_name, None)
+
+        decision = self._select_route("extraction", document_type, page_count)
+        while True:
+            route = self._router.get_route(decision.route)
+            data_document_extraction = self._create_data_document_extraction(route)
+            start = time.perf_counter()
+            extraction, usage = data_document_extraction.extract_data_document(
+                document_content_id=self._document_id_for(
+                    upload_name, document_id, route, data_document_extraction.llm_client
+                ),
+                document_type=document_type,
+                document_name=document_name,
+                model=route.model,
+                config_overrides=route.generation_config,
+            )
+            self._record_route(document_name, decision, time.perf_counter() - start)
+
+            fields = extraction.extracted_fields
+            escalation = self._router.escalate(
+                decision,
+                (
+                    sum(field.confidence for field in fields) / len(fields)
+                    if fields
+                    else 1.0
+                ),
+            )
+            if escalation is None or self._should_degrade("skip_escalation"):
+                self._keep_route(document_name, decision)
+                return fields, usage
+            decision = escalation
+
+    def _upload_document(
+        self, document_name: str, llm_client: LLM, llm_type: str = "gemini"
+    ):
+        deadline = current_deadline()
         document_url = self._storage_client.upload_file(
             bucket_name=self._bucket_name,
             source_file_name=f"resources/documents/{document_name}",
             destination_blob_name=f"loan_system/{document_name}",
+            timeout=deadline.call_timeout() if deadline is not None else None,
         )
+        document_id = llm_client.load_document(document_url)
+        with self._routes_lock:
+            self._uploads.setdefault(document_name, {})[llm_type] = document_id
+        return document_id
+
+    def _document_id_for(
+        self, document_name: str, document_id: Any, route: Route, llm_client: LLM
+    ):
+        """
+        The document as loaded by the provider of the route. Files are
+        uploaded again when the route switches provider; an id given for a
+        document without known uploads is trusted as is.
+        """
+        with self._routes_lock:
+            uploads = self._uploads.get(document_name)
+            if uploads is not None and route.llm_type in uploads:
+                return uploads[route.llm_type]
+        if document_id is not None and uploads is None:
+            return document_id
+        return self._upload_document(document_name, llm_client, route.llm_type)
 
-        gemini_llm = self._llm_factory.create_llm(
-            "gemini",
+    def _select_route(
+        self, stage: str, document_type: str = "", page_count: int = 0
+    ) -> RouteDecision:
+        self._load_routing()
+        return self._router.select(stage, document_type, page_count)
+
+    def _record_route(
+        self, document_name: str, decision: RouteDecision, latency_seconds: float
+    ):
+        self.record_event(
+            "route_decision",
             {
-                "api_key": self._api_key,
+                "document_name": document_name,
+                "stage": decision.stage,
+                "doc_type": decision.document_type,
+                "page_count": decision.page_count,
+                "route": decision.route,
+                "model": decision.model,
+                "reason": decision.reason,
+                "escalated_from": decision.escalated_from,
+                "latency_seconds": latency_seconds,
             },
         )
-        document_id = gemini_llm.load_document(document_url)
 
-        document_classifier = DocumentClassifier(
-            llm_client=gemini_llm,
-            prompt=ClassifierPrompt(),
-        )
-        document_classification, usage = document_classifier.classify_document(
-            document_content_id=document_id
+    def _keep_route(self, document_name: str, decision: RouteDecision):
+        """
+        Remembers the route whose output was kept, to credit it with the
+        review outcome.
+        """
+        with self._routes_lock:
+            self._document_routes.setdefault(document_name, {}).setdefault(
+                decision.stage, []
+            ).append(decision)
+
+    @staticmethod
+    def _page_count(pdf_path: str) -> int:
+        import fitz  # type: ignore[import-untyped]
+
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+    def split_packet(self, document_name: str) -> list[DocumentSegment]:
+        return PacketSplitter(classify_image_page=self._classify_scanned_page).split(
+            f"resources/documents/{document_name}"
         )
 
-        print(f"Document Classification: {document_classification}")
+    def _classify_scanned_page(self, pdf_path: str, page: int) -> str:
+        """
+        Classifies a packet page without a text layer on the cheapest route
+        at low media resolution, so that a scan starts its own segment
+        instead of being merged into its neighbours.
+        """
+        page_path = PacketSplitter.write_segment(pdf_path, page, page)
+        page_name = os.path.basename(page_path)
+        route = self._router.routes[0]
+        llm = self._router.get_llm(route)
+        try:
+            document_id = self._upload_document(page_name, llm, route.llm_type)
+            document_classifier = DocumentClassifier(
+                llm_client=llm,
+                prompt=ClassifierPrompt(),
+            )
+            with get_tracer().span("splitter.page", page=page, route=route.name):
+                document_classification, _ = document_classifier.classify_document(
+                    document_content_id=document_id,
+                    document_name=os.path.basename(pdf_path),
+                    model=route.model,
+                    config_overrides={
+                        **route.generation_config,
+                        "media_resolution": "MEDIA_RESOLUTION_LOW",
+                    },
+                )
+        finally:
+            with self._routes_lock:
+                self._uploads.pop(page_name, None)
+            os.remove(page_path)
+        return document_classification.document_type
 
-        return document_classification, document_id, usage
+    def process_packet(
+        self,
+        document_name: str,
+        segments: list[DocumentSegment],
+        max_workers: int = 4,
+        deadline: Deadline | None = None,
+    ) -> tuple[list[PacketSegmentResult], str]:
+        """
+        Classifies and extracts every segment of a combined packet in
+        parallel, then annotates the original file with the fields mapped
+        back to their original page numbers. All segments share the
+        deadline of the packet.
+        """
+        with deadline_scope(deadline):
+            result = self._process_packet(document_name, segments, max_workers)
+        if deadline is not None:
+            self.record_deadline(document_name, deadline)
+        return result
 
-    def document_extraction(
+    def _process_packet(
         self,
         document_name: str,
-        document_id: str,
-        document_type: str,
-    ) -> tuple[list[DocumentFieldExtractionOutput], dict[str, Any], str]:
+        segments: list[DocumentSegment],
+        max_workers: int,
+    ) -> tuple[list[PacketSegmentResult], str]:
         source_file_name = f"resources/documents/{document_name}"
 
-        gemini_llm = self._llm_factory.create_llm(
-            "gemini",
-            {
-                "api_key": self._api_key,
-            },
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(segments)))
+        ) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._process_segment,
+                    source_file_name,
+                    segment,
+                )
+                for segment in segments
+            ]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            result.extracted_fields = self._snap_fields(
+                result.document_name, source_file_name, result.extracted_fields
+            )
+
+        annoted_file = self._annotate(
+            source_file_name,
+            [field for result in results for field in result.extracted_fields],
+            self._create_data_document_extraction(),
         )
 
-        data_document_extraction = DataDocumentExtraction(
-            llm_client=gemini_llm,
-            prompt=ExtractionPrompt(),
-            learning_loop=LearningLoop(db=self._db),
+        return results, annoted_file
+
+    def _process_segment(
+        self, source_file_name: str, segment: DocumentSegment
+    ) -> PacketSegmentResult:
+        segment_path = PacketSplitter.write_segment(
+            source_file_name, segment.start_page, segment.end_page
         )
+        segment_name = os.path.basename(segment_path)
 
-        extraction, usage = data_document_extraction.extract_data_document(
-            document_content_id=document_id,
-            document_type=document_type,
+        with get_tracer().span(
+            "packet.segment",
+            start_page=segment.start_page,
+            end_page=segment.end_page,
+        ):
+            document_classification, document_id, _ = self.classify_document(
+                segment_name
+            )
+            extracted_fields, _ = self._extract_routed(
+                segment_name,
+                segment_name,
+                document_classification.document_type,
+                segment.end_page - segment.start_page + 1,
+                document_id,
+            )
+
+        page_offset = segment.start_page - 1
+        return PacketSegmentResult(
+            segment=segment,
+            document_name=segment_name,
+            classification=document_classification,
+            extracted_fields=[
+                field.model_copy(update={"page": field.page + page_offset})
+                for field in extracted_fields
+            ],
         )
 
-        print(f"Source File Name: {source_file_name}")
+    @property
+    def pipeline(self) -> StagedPipeline:
+        """
+        The staged document pipeline, started on first use: store, upload,
+        classify, extract, annotate and persist, each with its own workers.
+        """
+        with self._pipeline_lock:
+            if self._pipeline is None:
+                workers = self._pipeline_workers
+                self._pipeline = StagedPipeline(
+                    [
+                        self._pipeline_stage("store", self._store_document),
+                        self._pipeline_stage("upload", self._upload_for_classification),
+                        self._pipeline_stage("classify", self._classify_stage),
+                        self._pipeline_stage("extract", self._extract_stage),
+                        PipelineStage(
+                            "annotate",
+                            annotate_pipeline_document,
+                            workers=workers["annotate"],
+                            kind="process",
+                        ),
+                        self._pipeline_stage("persist", self._persist_document),
+                    ]
+                )
+            return self._pipeline
 
-        annoted_file = data_document_extraction.draw_from_model_coords(
-            pdf_path=source_file_name,
-            extracted_fields=extraction.extracted_fields,
+    def submit_document(
+        self,
+        document_name: str,
+        content: bytes | None = None,
+        deadline: Deadline | None = None,
+    ) -> Future:
+        """
+        Queues a document for the pipeline, blocking while the first stage
+        is saturated.
+
+        Returns:
+            A future of the processed PipelineDocument.
+        """
+        document = PipelineDocument(
+            document_name=document_name,
+            content=content,
+            deadline=deadline or Deadline(),
         )
+        profiled_request = get_profiler().begin(document_name)
+        with deadline_scope(document.deadline), profile_scope(profiled_request):
+            future = self.pipeline.submit(document)
+        if profiled_request is not None:
+            future.add_done_callback(lambda _: get_profiler().end(profiled_request))
+        return future
+
+    def process_documents(self, document_names: list[str]) -> list[PipelineDocument]:
+        """
+        Classifies, extracts, annotates and records a batch of stored
+        documents through the pipeline, each stage working on a different
+        document at once.
+        """
+        futures = [
+            self.submit_document(document_name) for document_name in document_names
+        ]
+        return [future.result() for future in futures]
+
+    def get_pipeline_stats(self) -> list[StageStats]:
+        """
+        Utilisation and backpressure of each pipeline stage; empty until
+        the pipeline is used.
+        """
+        if self._pipeline is None:
+            return []
+        return self._pipeline.stats()
 
-        print(f"Data Extraction: {extraction}")
+    def _pipeline_stage(
+        self, name: str, function: Callable[[PipelineDocument], None]
+    ) -> PipelineStage:
+        def run(document: PipelineDocument) -> PipelineDocument:
+            start = time.perf_counter()
+            function(document)
+            document.stage_latencies[name] = time.perf_counter() - start
+            return document
 
-        return extraction.extracted_fields, usage, annoted_file
+        return PipelineStage(name, run, workers=self._pipeline_workers[name])
+
+    def _store_document(self, document: PipelineDocument):
+        source_file_name = f"resources/documents/{document.document_name}"
+        if document.content is not None:
+            os.makedirs(os.path.dirname(source_file_name), exist_ok=True)
+            with open(source_file_name, "wb") as file:
+                file.write(document.content)
+            document.content = None
+        document.page_count = self._page_count(source_file_name)
+
+    def _upload_for_classification(self, document: PipelineDocument):
+        self._reset_document(document.document_name)
+        self._start_fingerprint(document.document_name)
+        decision = self._select_route("classification", page_count=document.page_count)
+        route = self._router.get_route(decision.route)
+        document.document_id = self._document_id_for(
+            document.document_name, None, route, self._router.get_llm(route)
+        )
+
+    def _classify_stage(self, document: PipelineDocument):
+        document.classification, document.document_id, _ = self._classify_uploaded(
+            document.document_name
+        )
+
+    def _extract_stage(self, document: PipelineDocument):
+        document.extracted_fields, document.usage = self._extract_fields(
+            document.document_name,
+            document.document_id,
+            document.classified().document_type,
+        )
+
+    def _persist_document(self, document: PipelineDocument):
+        classification = document.classified()
+        self.record_event(
+            "document_processed",
+            {
+                "document_name": document.document_name,
+                "doc_type": classification.document_type,
+                "confidence": self.calibrate_confidence(
+                    classification.document_type, classification.confidence
+                ),
+                "latency_seconds": document.deadline.elapsed_seconds,
+                "cost_usd": self.get_document_cost(document.document_name),
+                "stage_latencies": document.stage_latencies,
+            },
+        )
+        self.record_deadline(document.document_name, document.deadline)
+
+    def _create_data_document_extraction(
+        self, route: Route | None = None
+    ) -> DataDocumentExtraction:
+        return DataDocumentExtraction(
+            llm_client=self._router.get_llm(route or self._router.routes[0]),
+            prompt=ExtractionPrompt(),
+            learning_loop=LearningLoop(db=self.db, index=self._learning_index),
+            normalizer=self._format_normalizer,
+            compact_responses=self._compact_responses,
+        )
 
     def save_learning_example(
         self, doc_type: str, field_name: str, ai_value: str, human_value: str
     ):
         print("Saving learning example...")
-        LearningLoop(db=self._db).save_learning_example(
+        LearningLoop(db=self.db, index=self._learning_index).save_learning_example(
             doc_type,
             field_name,
             ai_value,
             human_value,
         )
 
+    def compact_learning_examples(self) -> int:
+        """
+        Collapses the learning examples saved since the last run into the
+        aggregated learning rules.
+
+        Returns:
+            The number of examples compacted.
+        """
+        print("Compacting learning examples...")
+        return LearningLoop(db=self.db, index=self._learning_index).compact()
+
+    def start_learning_compaction(
+        self, interval_seconds: float = LEARNING_COMPACTION_SECONDS
+    ):
+        """
+        Compacts the learning examples now and then every interval on a
+        background thread, keeping compaction off the extraction path.
+        Does nothing when already started.
+        """
+        with self._compaction_lock:
+            if self._compaction_thread is not None:
+                return
+            self._compaction_stopped.clear()
+            self._compaction_thread = threading.Thread(
+                target=self._compact_periodically,
+                args=(interval_seconds,),
+                name="learning-compaction",
+                daemon=True,
+            )
+            self._compaction_thread.start()
+
+    def stop_learning_compaction(self):
+        with self._compaction_lock:
+            thread, self._compaction_thread = self._compaction_thread, None
+        if thread is not None:
+            self._compaction_stopped.set()
+            thread.join()
+
+    def _compact_periodically(self, interval_seconds: float):
+        while True:
+            try:
+                self.compact_learning_examples()
+            except Exception as e:
+                print(f"An error occurred while compacting learning examples: {e}")
+            if self._compaction_stopped.wait(interval_seconds):
+                return
+
+    def get_normalizations(self, document_name: str) -> list[FieldNormalization]:
+        """
+        Values of a document rewritten by learned format rules, with the
+        original value and the rule applied.
+        """
+        return self._format_normalizer.get_normalizations(document_name)
+
+    def get_unlocated_fields(self, document_name: str) -> list[str]:
+        """
+        Fields of the last extraction of a document whose value could not be
+        found in the text of their page.
+        """
+        return self._unlocated_fields.get(document_name, [])
+
+    def get_page_count(self, pdf_path: str) -> int:
+        return self._page_renderer.page_count(pdf_path)
+
+    def render_page(self, pdf_path: str, page: int, zoom: float = 1.5) -> bytes:
+        """
+        PNG image of one 1-based page of a (possibly annotated) PDF, served
+        from the page cache when possible.
+        """
+        return self._page_renderer.render_page(pdf_path, page, zoom=zoom)
+
+    def prefetch_pages(
+        self,
+        pdf_path: str,
+        page: int,
+        zoom: float = 1.5,
+        neighbours: int = 1,
+    ):
+        """
+        Warms the page cache with the pages around the visible one.
+        """
+        self._page_renderer.prefetch(
+            pdf_path,
+            [
+                neighbour
+                for offset in range(1, neighbours + 1)
+                for neighbour in (page + offset, page - offset)
+            ],
+            zoom=zoom,
+        )
+
+    @contextmanager
+    def trace_document(self, document_name: str) -> Iterator[Span]:
+        """
+        Opens the root span that groups every stage of one document, which
+        is profiled too when sampled or forced.
+        """
+        with get_profiler().request(document_name), get_tracer().span(
+            "document.process", document_name=document_name
+        ) as span:
+            yield span
+
+    @staticmethod
+    def configure_profiling(sample_rate: float):
+        """
+        Profiles this share of the documents and dashboard refreshes; see
+        SamplingProfiler.
+        """
+        get_profiler().configure(sample_rate=sample_rate)
+
     @staticmethod
+    def profile_document(document_name: str):
+        """
+        Profiles the next request of a document, e.g. its extraction,
+        whatever the sample rate. Its collapsed stacks are written under
+        resources/profiles.
+        """
+        get_profiler().force(document_name)
+
+    @staticmethod
+    def stop_profiling_document(document_name: str):
+        """
+        Cancels profile_document before the document is processed.
+        """
+        get_profiler().release(document_name)
+
+    @staticmethod
+    def is_document_profiled(document_name: str) -> bool:
+        """
+        Whether the next request of a document is going to be profiled.
+        """
+        return get_profiler().is_forced(document_name)
+
+    @staticmethod
+    def profile_request(name: str, document_type: str = "") -> ContextManager:
+        """
+        Profiles the enclosed block as one request when sampled or forced.
+        """
+        return get_profiler().request(name, document_type)
+
+    @staticmethod
+    def get_profile(document_type: str | None = None) -> list[str]:
+        """
+        The collapsed stacks sampled so far, optionally of one document type.
+        """
+        return get_profiler().collapsed(document_type)
+
+    @staticmethod
+    def get_stage_latencies(trace_id: str) -> dict[str, float]:
+        """
+        Sums the duration of each stage recorded under the given trace.
+        """
+        exporter = get_tracer().get_exporter(InMemorySpanExporter)
+        if exporter is None:
+            return {}
+
+        stage_latencies: dict[str, float] = {}
+        for span in exporter.get_finished_spans(trace_id):
+            if span.parent_id is None:
+                continue
+            stage_latencies[span.name] = (
+                stage_latencies.get(span.name, 0.0) + span.duration_seconds
+            )
+        return stage_latencies
+
+    def record_event(self, kind: str, event: dict[str, Any]):
+        self._event_store.append(kind, event)
+        if kind == "route_decision" and self._routing_loaded:
+            self._router.record_outcome(
+                event["route"],
+                event["stage"],
+                event["doc_type"],
+                latency_seconds=event["latency_seconds"],
+            )
+        if kind == "route_outcome" and self._routing_loaded:
+            self._router.record_outcome(
+                event["route"],
+                event["stage"],
+                event["doc_type"],
+                correct=event["correct"],
+            )
+        if kind == "confidence_review" and self._calibration_loaded:
+            self._calibrator.add_outcomes(
+                event["doc_type"],
+                event["field"],
+                [event["confidence"]],
+                [event["correct"]],
+            )
+
+    def _load_calibration(self):
+        """
+        Fits the calibrator from the stored review outcomes on first use;
+        later outcomes are added incrementally by record_event.
+        """
+        if self._calibration_loaded:
+            return
+        self._calibration_loaded = True
+
+        reviews = self._event_store.read("confidence_review")
+        if not reviews["timestamp"].size:
+            return
+
+        keys = np.char.add(np.char.add(reviews["doc_type"], "\t"), reviews["field"])
+        for key in np.unique(keys):
+            doc_type, field_name = str(key).split("\t", 1)
+            selected = keys == key
+            self._calibrator.add_outcomes(
+                doc_type,
+                field_name,
+                reviews["confidence"][selected],
+                reviews["correct"][selected],
+            )
+
+    def _load_routing(self):
+        """
+        Replays the stored route latencies and review outcomes into the
+        router on first use; later ones are added by record_event.
+        """
+        if self._routing_loaded:
+            return
+        self._routing_loaded = True
+
+        decisions = self._event_store.read(
+            "route_decision", columns=["stage", "doc_type", "route", "latency_seconds"]
+        )
+        for stage, doc_type, route, latency_seconds in zip(
+            decisions["stage"],
+            decisions["doc_type"],
+            decisions["route"],
+            decisions["latency_seconds"],
+        ):
+            self._router.record_outcome(
+                str(route),
+                str(stage),
+                str(doc_type),
+                latency_seconds=float(latency_seconds),
+            )
+
+        outcomes = self._event_store.read("route_outcome")
+        for stage, doc_type, route, correct in zip(
+            outcomes["stage"],
+            outcomes["doc_type"],
+            outcomes["route"],
+            outcomes["correct"],
+        ):
+            self._router.record_outcome(
+                str(route), str(stage), str(doc_type), correct=float(correct)
+            )
+
+    def record_route_outcome(self, document_name: str, stage: str, correct: float):
+        """
+        Credits the routes that produced a document's stage output with its
+        review result: 1.0 correct, 0.0 wrong, or the share of correct
+        fields.
+        """
+        self._load_routing()
+        with self._routes_lock:
+            decisions = list(
+                self._document_routes.get(document_name, {}).get(stage, [])
+            )
+        for decision in decisions:
+            self.record_event(
+                "route_outcome",
+                {
+                    "stage": stage,
+                    "doc_type": decision.document_type,
+                    "route": decision.route,
+                    "correct": correct,
+                },
+            )
+
+    def record_deadline(self, document_name: str, deadline: Deadline):
+        """
+        Records whether a document met its deadline and how it degraded.
+        """
+        self.record_event(
+            "deadline",
+            {
+                "document_name": document_name,
+                "budget_seconds": deadline.budget_seconds,
+                "elapsed_seconds": deadline.elapsed_seconds,
+                "missed": float(deadline.missed),
+                "degradations": list(deadline.degradations),
+            },
+        )
+
+    def get_deadline_metrics(
+        self,
+        start_date: datetime.date | None = None,
+        end_date: datetime.date | None = None,
+    ) -> dict[str, Any] | None:
+        """
+        Deadline miss rate and the rate of each degradation between two
+        days, None without recorded deadlines.
+        """
+        events = self._event_store.read(
+            "deadline",
+            start_date,
+            end_date,
+            columns=["elapsed_seconds", "missed", "degradations"],
+        )
+        return calculate_deadline_metrics(
+            [
+                {
+                    "elapsed_seconds": elapsed_seconds,
+                    "missed": missed,
+                    "degradations": json.loads(str(degradations)),
+                }
+                for elapsed_seconds, missed, degradations in zip(
+                    events["elapsed_seconds"],
+                    events["missed"],
+                    events["degradations"],
+                )
+            ]
+        )
+
+    def get_route_stats(self) -> list[dict[str, Any]]:
+        """
+        Observed latency and reviewed accuracy per route, stage and document
+        type.
+        """
+        self._load_routing()
+        return self._router.get_stats()
+
+    def calibrate_confidence(
+        self, doc_type: str, confidence: float, field_name: str = DOCUMENT_TYPE_FIELD
+    ) -> float:
+        """
+        Calibrates a raw model confidence from the review outcomes of the
+        document type (or of one of its fields) before it is thresholded.
+        """
+        self._load_calibration()
+        return self._calibrator.calibrate(doc_type, field_name, confidence)
+
+    def get_auto_approve_rates(
+        self, target_error_rate: float = 0.02
+    ) -> list[dict[str, Any]]:
+        """
+        Share of reviewed predictions that could be auto-approved at the
+        target error rate, per document type and field.
+        """
+        self._load_calibration()
+        rates = []
+        for doc_type, field_name in sorted(self._calibrator.keys()):
+            rate = self._calibrator.auto_approve_rate(
+                doc_type, field_name, target_error_rate
+            )
+            if rate is None:
+                continue
+            rates.append(
+                {
+                    "doc_type": doc_type,
+                    "field": (
+                        "document type"
+                        if field_name == DOCUMENT_TYPE_FIELD
+                        else field_name
+                    ),
+                    "calibrated": self._calibrator.is_fitted(doc_type, field_name),
+                    **rate,
+                }
+            )
+        return rates
+
+    @property
+    def events_version(self) -> int:
+        return self._event_store.version
+
     def calculate_metrics(
-        classify_data: list, extraction_data: list, ops_metrics: list
-    ) -> tuple[dict[Any, Any] | None, Any, Any]:
-        print("Calculating metrics...")
-        print(f"Classify Data: {classify_data}")
-        print(f"Extraction Data: {extraction_data}")
-        print(f"Ops Metrics: {ops_metrics}")
-
-        tagging_metrics = calculate_tagging_metrics(classify_data)
-        extraction_metrics = calculate_extraction_metrics(extraction_data)
-        ops_metrics_result = calculate_ops_metrics(ops_metrics)
-
-        print(f"Tagging Metrics: {tagging_metrics}")
-        print(f"Extraction Metrics: {extraction_metrics}")
-        print(f"Ops Metrics: {ops_metrics_result}")
-        return tagging_metrics, extraction_metrics, ops_metrics_result
+        self,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> tuple[dict[Any, Any] | None, Any, Any, list[dict[str, Any]]]:
+        """
+        Computes the dashboard metrics from the event store rollups between
+        two days (inclusive), of all the events when no day is given, cached
+        on the event store version.
+        """
+        cache_key = (self._event_store.version, start, end)
+        if cache_key in self._metrics_cache:
+            return self._metrics_cache[cache_key]
+
+        processed_rollup = self._event_store.read_rollup(
+            "document_processed", start, end
+        )
+        classify_rollup = self._event_store.read_rollup("classify_review", start, end)
+        extraction_rollup = self._event_store.read_rollup(
+            "extraction_review", start, end
+        )
+        reviewed = self._event_store.read(
+            "document_reviewed", start, end, columns=["document_name", "status"]
+        )
+        reviewed_statuses = dict(zip(reviewed["document_name"], reviewed["status"]))
+
+        tagging_metrics = calculate_tagging_metrics_from_confusion(
+            classify_rollup.get("confusion", {})
+        )
+        extraction_metrics = calculate_extraction_metrics_from_rollup(extraction_rollup)
+        ops_metrics_result = calculate_ops_metrics_from_rollup(
+            processed_rollup, reviewed_statuses
+        )
+        stage_metrics = calculate_stage_metrics_from_rollup(processed_rollup)
+        metrics = (
+            tagging_metrics,
+            extraction_metrics,
+            ops_metrics_result,
+            stage_metrics,
+        )
+
+        if len(self._metrics_cache) >= 16:
+            self._metrics_cache.pop(next(iter(self._metrics_cache)))
+        self._metrics_cache[cache_key] = metrics
+        return metrics
+
+    def get_chart_data(
+        self, start: datetime.date | None, end: datetime.date | None
+    ) -> dict[str, Any]:
+        """
+        Returns pre-aggregated, fixed-size tables for the dashboard charts,
+        cached on the event store version.
+        """
+        cache_key = (self._event_store.version, start, end)
+        if cache_key in self._chart_cache:
+            return self._chart_cache[cache_key]
+
+        processed_rollup = self._event_store.read_rollup(
+            "document_processed", start, end
+        )
+        tagging_metrics = calculate_tagging_metrics_from_confusion(
+            self._event_store.read_rollup("classify_review", start, end).get(
+                "confusion", {}
+            ),
+            bootstrap_samples=0,
+        )
+
+        chart_data = {
+            "confidence": confidence_histogram_table(
+                processed_rollup.get("confidence_hist", {})
+            ),
+            "confusion": (
+                confusion_matrix_cells(
+                    tagging_metrics["confusion_matrix"], tagging_metrics["labels"]
+                )
+                if tagging_metrics
+                else None
+            ),
+        }
+
+        if len(self._chart_cache) >= 16:
+            self._chart_cache.pop(next(iter(self._chart_cache)))
+        self._chart_cache[cache_key] = chart_data
+        return chart_data
+
+    @staticmethod
+    def calculate_cost(usage: dict, model: str = DEFAULT_MODEL) -> float:
+        return calculate_cost(usage, model)
+
+    @staticmethod
+    def get_document_cost(document_name: str) -> float:
+        return get_usage_ledger().document_cost(document_name)
+
+    @staticmethod
+    def get_usage_rollup(group_by: tuple[str, ...]) -> list[dict[str, Any]]:
+        return get_usage_ledger().rollup(group_by)
 
     @staticmethod
-    def calculate_cost(usage: dict) -> float:
-        return calculate_cost(usage)
+    def _add_exporters(trace_file: str | None):
+        tracer = get_tracer()
+        if tracer.get_exporter(InMemorySpanExporter) is None:
+            tracer.add_exporter(InMemorySpanExporter())
+        if trace_file and tracer.get_exporter(JsonlSpanExporter) is None:
+            tracer.add_exporter(JsonlSpanExporter(trace_file))
 
     @staticmethod
-    def get_facade(project_id: str, bucket_name: str, api_key: str):
+    def get_facade(
+        project_id: str,
+        bucket_name: str,
+        api_key: str,
+        trace_file: str | None = None,
+        event_store_dir: str = "resources/events",
+        shard_page_threshold: int = 20,
+        compact_responses: bool = False,
+        reuse_near_duplicates: bool = True,
+        llm_recording_path: str | None = None,
+        learning_compaction_seconds: float | None = LEARNING_COMPACTION_SECONDS,
+    ):
+        """
+        The facade of the app, built once on the live services.
+
+        Args:
+            llm_recording_path: Appends every LLM call to this recording,
+                for get_replay_facade.
+            learning_compaction_seconds: Interval of the background
+                compaction of learning examples; None to not run it.
+        """
         if FacadeLoan.facade is None:
+            FacadeLoan._add_exporters(trace_file)
+
+            llm_factory = get_llm_factory()
+            if llm_recording_path:
+                llm_factory = RecordingLLMFactory(llm_factory, llm_recording_path)
+
             FacadeLoan.facade = FacadeLoan(
-                llm_factory=get_llm_factory(),
+                llm_factory=llm_factory,
                 storage_client=GoogleCloudStorage(project_id=project_id),
                 bucket_name=bucket_name,
                 api_key=api_key,
-                db=firestore.Client(),
+                event_store=EventStore(root_dir=event_store_dir),
+                shard_page_threshold=shard_page_threshold,
+                compact_responses=compact_responses,
+                reuse_near_duplicates=reuse_near_duplicates,
             )
+            if learning_compaction_seconds is not None:
+                FacadeLoan.facade.start_learning_compaction(learning_compaction_seconds)
         return FacadeLoan.facade
+
+    @staticmethod
+    def get_replay_facade(
+        recording_path: str,
+        latency_scale: float = 1.0,
+        root_dir: str = "resources/replay",
+        trace_file: str | None = None,
+        shard_page_threshold: int = 20,
+        compact_responses: bool = False,
+    ) -> "FacadeLoan":
+        """
+        A facade replaying a recording instead of calling Gemini, with local
+        storage and an in-memory Firestore, to run the rest of the pipeline
+        offline and deterministically. Near-duplicate reuse is off so every
+        recorded call is replayed.
+
+        Args:
+            latency_scale: Factor of the recorded latencies, e.g. 0.1 to
+                replay ten times faster.
+            root_dir: Where uploads, events and the similarity index go.
+        """
+        FacadeLoan._add_exporters(trace_file)
+        os.makedirs(root_dir, exist_ok=True)
+
+        llm_factory = get_llm_factory()
+        return FacadeLoan(
+            llm_factory=llm_factory,
+            storage_client=LocalStorage(root_dir=os.path.join(root_dir, "storage")),
+            bucket_name="replay",
+            api_key="",
+            db=InMemoryFirestore(),
+            event_store=EventStore(root_dir=os.path.join(root_dir, "events")),
+            shard_page_threshold=shard_page_threshold,
+            similarity_index=SimilarityIndex(
+                os.path.join(root_dir, "similarity_index.sqlite")
+            ),
+            reuse_near_duplicates=False,
+            router=LLMRouter(
+                llm_factory,
+                routes=tuple(
+                    dataclasses.replace(route, llm_type="replay")
+                    for route in DEFAULT_ROUTES
+                ),
+                provider_configs={
+                    "replay": {
+                        "recording_path": recording_path,
+                        "latency_scale": latency_scale,
+                    }
+                },
+            ),
+            compact_responses=compact_responses,
+        )
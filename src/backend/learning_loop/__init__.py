@@ -1 +1,8 @@
+from .compaction import LearningCompactor
 from .learning import LearningLoop
+from .learning_index import format_signature
+from .learning_index import LearningExample
+from .learning_index import LearningIndex
+from .normalizer import FieldNormalization
+from .normalizer import FormatNormalizer
+from .normalizer import FormatRule
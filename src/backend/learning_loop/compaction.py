@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import time
+import uuid
+from typing import Any
+
+from ..commons import get_tracer
+from .learning_index import format_signature
+from .learning_index import LearningExample
+
+EXAMPLES_COLLECTION = "learning_examples"
+RULES_COLLECTION = "learning_rules"
+META_COLLECTION = "learning_meta"
+WATERMARK_DOCUMENT = "compaction"
+
+# Firestore caps a write batch at 500 operations.
+_MAX_BATCH_WRITES = 500
+
+# A compaction run holds the watermark for at most this long, so a crashed
+# run does not block the next ones.
+LEASE_SECONDS = 600.0
+
+# Compactions of this process run one at a time; the lease serializes them
+# across processes.
+_compaction_lock = threading.Lock()
+
+_RELEASED_LEASE = {"lease_owner": None, "lease_expires_at": 0.0}
+
+
+def rule_id(doc_type: str, field: str, bad_signature: str, good_signature: str) -> str:
+    key = "\x1f".join([doc_type, field, bad_signature, good_signature])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class LearningCompactor:
+    """
+    Collapses raw learning examples into aggregated rules, one per
+    (doc_type, field, format transformation), with an occurrence count, the
+    last time it was seen and its most recent example.
+
+    Runs incrementally: only examples newer than the stored watermark are
+    read, and the watermark advances after every run. A run takes a lease
+    on the watermark in a transaction first, so two runs never fold the
+    same examples into the counts twice.
+    """
+
+    def __init__(self, db, delete_compacted: bool = False):
+        self.db = db
+        self._delete_compacted = delete_compacted
+        self._owner = uuid.uuid4().hex
+
+    def _watermark_ref(self):
+        return self.db.collection(META_COLLECTION).document(WATERMARK_DOCUMENT)
+
+    def get_watermark(self):
+        snapshot = self._watermark_ref().get()
+        if not snapshot.exists:
+            return None
+        return snapshot.get("watermark")
+
+    def compact(self) -> int:
+        """
+        Folds the examples added since the last run into the rules. Returns
+        at once when another process is compacting.
+
+        Returns:
+            The number of examples compacted.
+        """
+        with get_tracer().span("learning.compact"), _compaction_lock:
+            claimed, watermark = self._claim_lease()
+            if not claimed:
+                print("Learning compaction already running elsewhere")
+                return 0
+            try:
+                return self._compact_since(watermark)
+            except BaseException:
+                self._watermark_ref().set(_RELEASED_LEASE, merge=True)
+                raise
+
+    def _claim_lease(self) -> tuple[bool, Any]:
+        """
+        Takes the lease on the watermark unless another run holds it.
+
+        Returns:
+            Whether the lease was taken, and the watermark.
+        """
+        from google.cloud import firestore
+
+        reference = self._watermark_ref()
+
+        @firestore.transactional
+        def claim(transaction) -> tuple[bool, Any]:
+            snapshot = reference.get(transaction=transaction)
+            data = (snapshot.to_dict() if snapshot.exists else None) or {}
+            now = time.time()
+            if (
+                data.get("lease_owner") not in (None, self._owner)
+                and data.get("lease_expires_at", 0.0) > now
+            ):
+                return False, None
+            transaction.set(
+                reference,
+                {"lease_owner": self._owner, "lease_expires_at": now + LEASE_SECONDS},
+                merge=True,
+            )
+            return True, data.get("watermark")
+
+        return claim(self.db.transaction())
+
+    def _compact_since(self, watermark) -> int:
+        query = self.db.collection(EXAMPLES_COLLECTION)
+        if watermark is not None:
+            query = query.where("timestamp", ">", watermark)
+        docs = list(query.order_by("timestamp").stream())
+        if not docs:
+            self._watermark_ref().set(_RELEASED_LEASE, merge=True)
+            return 0
+
+        from google.cloud import firestore
+
+        rules: dict[str, dict] = {}
+        for doc in docs:
+            data = doc.to_dict()
+            bad_signature = format_signature(data["bad_example"])
+            good_signature = format_signature(data["good_example"])
+            key = rule_id(
+                data["doc_type"], data["field"], bad_signature, good_signature
+            )
+            rule = rules.setdefault(
+                key,
+                {
+                    "doc_type": data["doc_type"],
+                    "field": data["field"],
+                    "bad_signature": bad_signature,
+                    "good_signature": good_signature,
+                    "count": 0,
+                },
+            )
+            rule["count"] += 1
+            rule["bad_example"] = data["bad_example"]
+            rule["good_example"] = data["good_example"]
+            rule["last_seen"] = data["timestamp"]
+
+        writes: list[tuple] = [
+            (
+                "set",
+                self.db.collection(RULES_COLLECTION).document(key),
+                {**rule, "count": firestore.Increment(rule["count"])},
+            )
+            for key, rule in rules.items()
+        ]
+        if self._delete_compacted:
+            writes.extend(("delete", doc.reference, None) for doc in docs)
+        # The watermark advances and the lease is released in the same batch
+        # as the last counts.
+        writes.append(
+            (
+                "set",
+                self._watermark_ref(),
+                {"watermark": docs[-1].get("timestamp"), **_RELEASED_LEASE},
+            )
+        )
+        self._commit(writes)
+        return len(docs)
+
+    def _commit(self, writes: list[tuple]):
+        for start in range(0, len(writes), _MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for operation, reference, data in writes[start : start + _MAX_BATCH_WRITES]:
+                if operation == "delete":
+                    batch.delete(reference)
+                else:
+                    batch.set(reference, data, merge=True)
+            batch.commit()
+
+    def get_rules(self, doc_type: str) -> list[LearningExample]:
+        """
+        Reads the aggregated rules of a document type.
+        """
+        docs = (
+            self.db.collection(RULES_COLLECTION)
+            .where("doc_type", "==", doc_type)
+            .stream()
+        )
+
+        rules = []
+        for doc in docs:
+            data = doc.to_dict()
+            last_seen = data.get("last_seen")
+            rules.append(
+                LearningExample(
+                    doc_type=doc_type,
+                    field=data["field"],
+                    bad_example=data["bad_example"],
+                    good_example=data["good_example"],
+                    timestamp=last_seen.timestamp() if last_seen else 0.0,
+                    count=data.get("count", 1),
+                )
+            )
+        return rules
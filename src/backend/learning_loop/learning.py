@@ -1,9 +1,17 @@
-from google.cloud import firestore
+import time
+
+from ..commons import get_tracer
+from .compaction import EXAMPLES_COLLECTION
+from .compaction import LearningCompactor
+from .learning_index import LearningExample
+from .learning_index import LearningIndex
 
 
 class LearningLoop:
-    def __init__(self, db):
+    def __init__(self, db, index: LearningIndex | None = None):
         self.db = db
+        self.index = index
+        self.compactor = LearningCompactor(db)
 
     def save_learning_example(
         self, doc_type: str, field_name: str, ai_value: str, human_value: str
@@ -11,7 +19,9 @@ class LearningLoop:
         if ai_value == human_value:
             return
 
-        self.db.collection("learning_examples").add(
+        from google.cloud import firestore
+
+        self.db.collection(EXAMPLES_COLLECTION).add(
             {
                 "doc_type": doc_type,
                 "field": field_name,
@@ -21,18 +31,58 @@ class LearningLoop:
             }
         )
 
-    def get_learning_context(self, doc_type: str) -> str:
-        docs = (
-            self.db.collection("learning_examples")
-            .where("doc_type", "==", doc_type)
-            .order_by("timestamp", direction="DESCENDING")
-            .limit(3)
-            .stream()
-        )
+        if self.index is not None and self.index.is_loaded(doc_type):
+            self.index.add(
+                LearningExample(
+                    doc_type=doc_type,
+                    field=field_name,
+                    bad_example=ai_value,
+                    good_example=human_value,
+                    timestamp=time.time(),
+                )
+            )
+
+    def get_learning_context(
+        self, doc_type: str, fields: list[str] | None = None
+    ) -> str:
+        """
+        Builds the learning notes for the extraction prompt from the
+        compacted rule set, where repeats of the same correction are already
+        collapsed into one rule with a count.
+
+        With an index, the most relevant rules per schema field are selected
+        within a token budget; otherwise the three most frequent rules for
+        the document type are used.
+        """
+        if self.index is not None:
+            with get_tracer().span("learning.get_context", doc_type=doc_type):
+                if not self.index.is_loaded(doc_type):
+                    with self.index.load_lock(doc_type):
+                        if not self.index.is_loaded(doc_type):
+                            self._load_index(self.index, doc_type)
+                examples = self.index.select(doc_type, fields)
+            return "".join(example.rule_text for example in examples)
+
+        with get_tracer().span("learning.get_context", doc_type=doc_type):
+            rules = self.compactor.get_rules(doc_type)
+
+        rules.sort(key=lambda rule: (rule.count, rule.timestamp), reverse=True)
+        return "".join(rule.rule_text for rule in rules[:3])
 
-        examples_text = ""
-        for doc in docs:
-            data = doc.to_dict()
-            examples_text += f"- FORMATTING RULE for '{data['field']}': previously, the user corrected the format '{data['bad_example']}' to '{data['good_example']}'. Ensure you apply a similar FORMAT pattern (e.g. hyphens, spacing) to the data you see now, but DO NOT copy the values.\n"
+    def compact(self) -> int:
+        """
+        Folds the corrections saved since the last run into the rule set and
+        reloads the document types already in the index, so they include
+        the corrections saved by other processes.
+        """
+        compacted = self.compactor.compact()
+        if compacted and self.index is not None:
+            for doc_type in self.index.loaded_doc_types():
+                with self.index.load_lock(doc_type):
+                    self._load_index(self.index, doc_type)
+        return compacted
 
-        return examples_text
+    def _load_index(self, index: LearningIndex, doc_type: str):
+        # The rules as compacted so far; compaction runs in the background,
+        # never on the extraction path.
+        index.load(doc_type, self.compactor.get_rules(doc_type))
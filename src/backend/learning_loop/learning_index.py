@@ -0,0 +1,176 @@
+import threading
+from dataclasses import dataclass
+from dataclasses import replace
+
+
+def format_signature(value) -> str:
+    """
+    Character-class shape of a value: digits become '9', uppercase letters
+    'A', lowercase letters 'a', anything else is kept.
+    e.g. '12-3456789' -> '99-9999999', 'Acme Corp.' -> 'Aaaa Aaaa.'
+    """
+    if value is None:
+        return ""
+
+    signature = []
+    for char in str(value):
+        if char.isdigit():
+            signature.append("9")
+        elif char.isalpha():
+            signature.append("A" if char.isupper() else "a")
+        else:
+            signature.append(char)
+    return "".join(signature)
+
+
+def format_rule_text(field: str, bad_example: str, good_example: str) -> str:
+    return f"- FORMATTING RULE for '{field}': previously, the user corrected the format '{bad_example}' to '{good_example}'. Ensure you apply a similar FORMAT pattern (e.g. hyphens, spacing) to the data you see now, but DO NOT copy the values.\n"
+
+
+@dataclass
+class LearningExample:
+    """
+    A human correction of an extracted field.
+    """
+
+    doc_type: str
+    field: str
+    bad_example: str
+    good_example: str
+    timestamp: float = 0.0
+    count: int = 1
+
+    @property
+    def transformation(self) -> tuple[str, str]:
+        return format_signature(self.bad_example), format_signature(self.good_example)
+
+    @property
+    def rule_text(self) -> str:
+        return format_rule_text(self.field, self.bad_example, self.good_example)
+
+
+class LearningIndex:
+    """
+    In-memory index of learning examples keyed by (doc_type, field).
+
+    Within a key, examples sharing the same format transformation
+    (signature of the bad value -> signature of the good value) are
+    collapsed, so one rule per distinct mistake is kept with its number of
+    occurrences and most recent example.
+    """
+
+    def __init__(self, max_rules_per_field: int = 20):
+        self._max_rules_per_field = max_rules_per_field
+        self._rules: dict[tuple[str, str], dict[tuple[str, str], LearningExample]] = {}
+        self._loaded_doc_types: set[str] = set()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def is_loaded(self, doc_type: str) -> bool:
+        return doc_type in self._loaded_doc_types
+
+    def loaded_doc_types(self) -> list[str]:
+        with self._lock:
+            return sorted(self._loaded_doc_types)
+
+    def load_lock(self, doc_type: str) -> threading.Lock:
+        """
+        Held while a document type is loaded, so it is loaded once.
+        """
+        with self._lock:
+            return self._load_locks.setdefault(doc_type, threading.Lock())
+
+    def load(self, doc_type: str, examples: list[LearningExample]):
+        """
+        Replaces the rules of a document type with the stored ones, whose
+        counts already include every saved correction.
+        """
+        with self._lock:
+            for key in [key for key in self._rules if key[0] == doc_type]:
+                del self._rules[key]
+            self.version += 1
+            for example in examples:
+                self._add(example)
+            self._loaded_doc_types.add(doc_type)
+
+    def add(self, example: LearningExample):
+        with self._lock:
+            self._add(example)
+
+    def rules(self, doc_type: str) -> list[LearningExample]:
+        with self._lock:
+            return [
+                example
+                for (indexed_type, _), field_rules in self._rules.items()
+                if indexed_type == doc_type
+                for example in field_rules.values()
+            ]
+
+    def _add(self, example: LearningExample):
+        self.version += 1
+        field_rules = self._rules.setdefault((example.doc_type, example.field), {})
+        transformation = example.transformation
+        current = field_rules.get(transformation)
+
+        if current is None:
+            field_rules[transformation] = example
+        elif example.timestamp >= current.timestamp:
+            field_rules[transformation] = replace(
+                example, count=example.count + current.count
+            )
+        else:
+            field_rules[transformation] = replace(
+                current, count=current.count + example.count
+            )
+
+        if len(field_rules) > self._max_rules_per_field:
+            oldest = min(field_rules, key=lambda key: field_rules[key].timestamp)
+            del field_rules[oldest]
+
+    def select(
+        self,
+        doc_type: str,
+        fields: list[str] | None = None,
+        top_k: int = 2,
+        token_budget: int = 400,
+    ) -> list[LearningExample]:
+        """
+        Picks up to top_k rules per field, most frequent and most recent
+        first, filling the token budget round-robin across fields so every
+        field gets its best rule before any field gets a second one.
+
+        Args:
+            doc_type: The document type being extracted.
+            fields: The schema fields; every indexed field when None.
+            top_k: Maximum rules per field.
+            token_budget: Approximate prompt tokens available for rules.
+        """
+        with self._lock:
+            field_names = fields or [
+                field
+                for (indexed_type, field) in self._rules
+                if indexed_type == doc_type
+            ]
+            ranked = [
+                sorted(
+                    self._rules.get((doc_type, field), {}).values(),
+                    key=lambda example: (example.count, example.timestamp),
+                    reverse=True,
+                )[:top_k]
+                for field in field_names
+            ]
+
+        selected: list[LearningExample] = []
+        used_tokens = 0
+        for rank in range(top_k):
+            for field_examples in ranked:
+                if rank >= len(field_examples):
+                    continue
+                example = field_examples[rank]
+                tokens = len(example.rule_text) // 4
+                if used_tokens + tokens > token_budget:
+                    return selected
+                selected.append(example)
+                used_tokens += tokens
+        return selected
@@ -0,0 +1,149 @@
+import threading
+from dataclasses import dataclass
+
+from .learning_index import format_signature
+from .learning_index import LearningExample
+from .learning_index import LearningIndex
+
+
+@dataclass
+class FormatRule:
+    """
+    A deterministic rewrite learned from a human correction: a value shaped
+    like bad_signature is rewritten into good_signature, keeping its
+    characters in order.
+    e.g. '999999999' -> '99-9999999' turns '123456789' into '12-3456789'.
+    """
+
+    field: str
+    bad_signature: str
+    good_signature: str
+    count: int = 1
+
+    def apply(self, value: str) -> str:
+        characters = iter(char for char in value if char.isalnum())
+        normalized = []
+        for slot in self.good_signature:
+            match slot:
+                case "9":
+                    normalized.append(next(characters))
+                case "A":
+                    normalized.append(next(characters).upper())
+                case "a":
+                    normalized.append(next(characters).lower())
+                case _:
+                    normalized.append(slot)
+        return "".join(normalized)
+
+
+@dataclass
+class FieldNormalization:
+    """
+    Provenance of a value rewritten by a FormatRule.
+    """
+
+    document_name: str
+    field: str
+    original_value: str
+    normalized_value: str
+    rule: str
+    rule_count: int
+
+
+def _alphanumeric(value: str) -> str:
+    return "".join(char for char in value if char.isalnum()).casefold()
+
+
+def learn_format_rule(example: LearningExample) -> FormatRule | None:
+    """
+    Learns a rewrite rule from a correction, or None when the correction
+    changed the content of the value rather than only its format.
+    """
+    bad_signature, good_signature = example.transformation
+    if bad_signature == good_signature:
+        return None
+    if _alphanumeric(str(example.bad_example)) != _alphanumeric(
+        str(example.good_example)
+    ):
+        return None
+
+    return FormatRule(
+        field=example.field,
+        bad_signature=bad_signature,
+        good_signature=good_signature,
+        count=example.count,
+    )
+
+
+class FormatNormalizer:
+    """
+    Applies the format rules learned from the learning index to extracted
+    values, so known format mistakes are fixed locally instead of through
+    the prompt or an LLM retry.
+
+    Rules are compiled once per document type into a lookup by
+    (field, signature of the value) and recompiled only when the index
+    changes. A rule applies only once min_count corrections agree on it,
+    and never when the same value format was corrected into another one,
+    e.g. nine digits into an EIN and into an SSN for 'ein_or_ssn'.
+    """
+
+    def __init__(self, index: LearningIndex, min_count: int = 3):
+        self._index = index
+        self._min_count = min_count
+        self._compiled: dict[str, tuple[int, dict[tuple[str, str], FormatRule]]] = {}
+        self._normalizations: dict[str, list[FieldNormalization]] = {}
+        self._lock = threading.Lock()
+
+    def _rules(self, doc_type: str) -> dict[tuple[str, str], FormatRule]:
+        version = self._index.version
+        compiled = self._compiled.get(doc_type)
+        if compiled is not None and compiled[0] == version:
+            return compiled[1]
+
+        candidates: dict[tuple[str, str], list[FormatRule]] = {}
+        for example in self._index.rules(doc_type):
+            rule = learn_format_rule(example)
+            if rule is not None:
+                candidates.setdefault((rule.field, rule.bad_signature), []).append(rule)
+
+        rules = {
+            key: key_rules[0]
+            for key, key_rules in candidates.items()
+            if len(key_rules) == 1 and key_rules[0].count >= self._min_count
+        }
+        self._compiled[doc_type] = (version, rules)
+        return rules
+
+    def normalize(
+        self, doc_type: str, field: str, value: str
+    ) -> tuple[str, FormatRule | None]:
+        """
+        Returns the normalized value and the rule applied, if any.
+        """
+        if not value:
+            return value, None
+
+        rule = self._rules(doc_type).get((field, format_signature(value)))
+        if rule is None:
+            return value, None
+        return rule.apply(value), rule
+
+    def record(self, normalizations: list[FieldNormalization]):
+        with self._lock:
+            for normalization in normalizations:
+                self._normalizations.setdefault(normalization.document_name, []).append(
+                    normalization
+                )
+
+    def get_normalizations(self, document_name: str) -> list[FieldNormalization]:
+        with self._lock:
+            return list(self._normalizations.get(document_name, []))
+
+    def forget(self, document_name: str):
+        """
+        Drops the normalizations of a document, e.g. before it is extracted
+        again.
+        """
+        with self._lock:
+            self._normalizations.pop(document_name, None)
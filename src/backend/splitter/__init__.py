@@ -0,0 +1,3 @@
+from .packet_splitter import DocumentSegment
+from .packet_splitter import PacketSplitter
+from .packet_splitter import PageClassification
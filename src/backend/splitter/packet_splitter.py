@@ -0,0 +1,197 @@
+import os
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from ..commons import get_tracer
+
+# Text-layer keywords per document type, taken from the classifier prompt.
+PAGE_KEYWORDS: dict[str, list[str]] = {
+    "bank_statement": [
+        "statement period",
+        "ending balance",
+        "beginning balance",
+        "debits",
+        "credits",
+        "account number",
+        "summary of accounts",
+        "checking",
+        "savings",
+    ],
+    "government_id": [
+        "driver license",
+        "driver's license",
+        "passport",
+        "dob",
+        "exp",
+        "sex",
+        "height",
+        "identification card",
+    ],
+    "w9_form": [
+        "form w-9",
+        "request for taxpayer",
+        "identification number and certification",
+        "backup withholding",
+        "fatca reporting code",
+        "employer identification number",
+        "social security number",
+    ],
+    "certificate_of_insurance": [
+        "acord",
+        "certificate of liability insurance",
+        "producer",
+        "insured",
+        "naic",
+        "commercial general liability",
+        "authorized representative",
+    ],
+}
+
+_KEYWORD_PATTERNS: dict[str, list[re.Pattern]] = {
+    document_type: [re.compile(rf"\b{re.escape(keyword)}\b") for keyword in keywords]
+    for document_type, keywords in PAGE_KEYWORDS.items()
+}
+
+_FIRST_PAGE_PATTERN = re.compile(r"\bpage\s+1\s+(?:of|/)\s+\d+\b")
+
+
+@dataclass
+class PageClassification:
+    """
+    Cheap per-page classification from the text layer, or from a
+    low-resolution LLM call for pages without one.
+    """
+
+    page: int
+    document_type: str
+    score: int
+    is_first_page: bool
+
+
+@dataclass
+class DocumentSegment:
+    """
+    A run of consecutive pages that form one sub-document.
+    Pages are 1-based and inclusive, relative to the original file.
+    """
+
+    document_type: str
+    start_page: int
+    end_page: int
+
+    @property
+    def page_count(self) -> int:
+        return self.end_page - self.start_page + 1
+
+
+class PacketSplitter:
+    """
+    Splits a combined loan packet into sub-documents by classifying each
+    page from its text layer and grouping consecutive pages.
+
+    Pages without a usable text layer (scans) are given to classify_image_page,
+    called with the PDF path and the 1-based page number, when one is set.
+    Otherwise they carry no signal and are attached to the surrounding
+    segment.
+    """
+
+    def __init__(
+        self,
+        min_keyword_hits: int = 2,
+        classify_image_page: Callable[[str, int], str] | None = None,
+    ):
+        self._min_keyword_hits = min_keyword_hits
+        self._classify_image_page = classify_image_page
+
+    def classify_pages(self, pdf_path: str) -> list[PageClassification]:
+        import fitz  # type: ignore[import-untyped]
+
+        with fitz.open(pdf_path) as doc:
+            texts = [page.get_text("text") for page in doc]
+
+        return [
+            self._classify_page(pdf_path, index + 1, text)
+            for index, text in enumerate(texts)
+        ]
+
+    def _classify_page(
+        self, pdf_path: str, page_number: int, text: str
+    ) -> PageClassification:
+        if not text.strip() and self._classify_image_page is not None:
+            return PageClassification(
+                page=page_number,
+                document_type=self._classify_image_page(pdf_path, page_number),
+                score=0,
+                is_first_page=False,
+            )
+        return self._classify_text(page_number, text)
+
+    def _classify_text(self, page_number: int, text: str) -> PageClassification:
+        text = " ".join(text.lower().split())
+        scores = {
+            document_type: sum(1 for pattern in patterns if pattern.search(text))
+            for document_type, patterns in _KEYWORD_PATTERNS.items()
+        }
+        document_type, score = max(scores.items(), key=lambda item: item[1])
+        if score < self._min_keyword_hits:
+            document_type = "unknown"
+
+        return PageClassification(
+            page=page_number,
+            document_type=document_type,
+            score=score,
+            is_first_page=bool(_FIRST_PAGE_PATTERN.search(text)),
+        )
+
+    def split(self, pdf_path: str) -> list[DocumentSegment]:
+        """
+        Groups the pages of a PDF into segments.
+
+        A new segment starts when the page type changes, or when a page of
+        the same type restarts its numbering ("Page 1 of N"), e.g. three
+        consecutive monthly bank statements.
+        """
+        with get_tracer().span("splitter.split"):
+            pages = self.classify_pages(pdf_path)
+
+        segments: list[DocumentSegment] = []
+        for page in pages:
+            current = segments[-1] if segments else None
+
+            if current is None:
+                segments.append(
+                    DocumentSegment(page.document_type, page.page, page.page)
+                )
+            elif page.document_type == "unknown":
+                current.end_page = page.page
+            elif current.document_type == "unknown":
+                current.document_type = page.document_type
+                current.end_page = page.page
+            elif current.document_type != page.document_type or (
+                page.is_first_page and page.page > current.start_page
+            ):
+                segments.append(
+                    DocumentSegment(page.document_type, page.page, page.page)
+                )
+            else:
+                current.end_page = page.page
+
+        return segments
+
+    @staticmethod
+    def write_segment(pdf_path: str, start_page: int, end_page: int) -> str:
+        """
+        Writes the given 1-based inclusive page range as its own PDF, next to
+        the original file, and returns its path.
+        """
+        root, extension = os.path.splitext(pdf_path)
+        output_path = f"{root}_p{start_page}-{end_page}{extension}"
+
+        import fitz  # type: ignore[import-untyped]
+
+        with fitz.open(pdf_path) as doc, fitz.open() as segment_doc:
+            segment_doc.insert_pdf(doc, from_page=start_page - 1, to_page=end_page - 1)
+            segment_doc.save(output_path)
+
+        return output_path
@@ -1,27 +1,15 @@
 import os
 import sys
 import time
-sys.path.insert(0, os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..")))
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import streamlit as st
+from backend import Deadline
+from backend import DOCUMENT_SORT_KEYS
 from backend import FacadeLoan
-from dotenv import load_dotenv
-
-
-load_dotenv()
-
-API_KEY = os.getenv("API_KEY")
-PROJECT_ID = os.getenv("PROJECT_ID")
-BUCKET_NAME = os.getenv("BUCKET_NAME")
-
-
-@st.cache_resource
-def init_facade():
-    return FacadeLoan.get_facade(
-        api_key=API_KEY,
-        project_id=PROJECT_ID,
-        bucket_name=BUCKET_NAME,
-    )
+from services import get_document_index  # type: ignore[import-not-found]
+from services import index_document
+from services import init_facade
 
 
 facade_loan_system = init_facade()
@@ -58,61 +46,109 @@ def initialize_session_state():
         }
     if "selected_document" not in st.session_state:
         st.session_state.selected_document = None
-    if "document_classify_review" not in st.session_state:
-        st.session_state.document_classify_review = {"classify_reviews": []}
-    if "document_extraction_review" not in st.session_state:
-        st.session_state.document_extraction_review = {"extraction_reviews": []}
 
 
 def call_document_classifier(doc_name):
     print(f"Processing document: {doc_name}")
+    doc_info = st.session_state.documents[doc_name]
     document_classification, document_id, classification_usage = (
-        facade_loan_system.classify_document(document_name=doc_name)
+        facade_loan_system.classify_document(
+            document_name=doc_name,
+            deadline=Deadline(started_at=doc_info["processing_started_at"]),
+        )
     )
 
     predicted_type = document_classification.document_type
     confidence = document_classification.confidence
+    calibrated_confidence = facade_loan_system.calibrate_confidence(
+        predicted_type, confidence
+    )
 
-    data_extraction, extraction_usage, annoted_file = (
-        facade_loan_system.document_extraction(
-            document_name=doc_name,
-            document_id=document_id,
-            document_type=predicted_type,
-        )
+    st.session_state.documents[doc_name].update(
+        {
+            "status": "Extracting",
+            "predicted_type": predicted_type,
+            "type_confidence": calibrated_confidence,
+            "type_confidence_original": confidence,
+            "document_id": document_id,
+        }
     )
+    index_document(doc_name)
 
-    cost_usage = FacadeLoan.calculate_cost(
-        classification_usage
-    ) + FacadeLoan.calculate_cost(extraction_usage)
+    facade_loan_system.record_event(
+        "classify_review",
+        {"predicted_type": predicted_type, "actual_type": predicted_type},
+    )
 
-    document_fields = []
 
-    for field in data_extraction:
-        document_fields.append(
-            {
-                "name": field.name,
-                "value": field.value,
-                "confidence": field.confidence,
-                "page": field.page,
-            }
+def call_packet_processing(doc_name, segments):
+    print(f"Processing packet: {doc_name} ({len(segments)} segments)")
+    parent_info = st.session_state.documents[doc_name]
+
+    start_time = time.time()
+    with facade_loan_system.trace_document(doc_name) as document_span:
+        results, annoted_file = facade_loan_system.process_packet(
+            doc_name, segments, deadline=Deadline(started_at=start_time)
         )
+    latency_sec = time.time() - start_time
+    stage_latencies = FacadeLoan.get_stage_latencies(document_span.trace_id)
 
-    st.session_state.documents[doc_name].update(
-        {
+    for result in results:
+        predicted_type = result.classification.document_type
+        confidence = facade_loan_system.calibrate_confidence(
+            predicted_type, result.classification.confidence
+        )
+        cost_usage = FacadeLoan.get_document_cost(result.document_name)
+
+        st.session_state.documents[result.document_name] = {
             "status": "Processed",
             "predicted_type": predicted_type,
             "type_confidence": confidence,
-            "type_confidence_original": confidence,
-            "fields": document_fields,
+            "type_confidence_original": result.classification.confidence,
+            "fields": [
+                {
+                    "name": field.name,
+                    "value": field.value,
+                    "confidence": facade_loan_system.calibrate_confidence(
+                        predicted_type, field.confidence, field.name
+                    ),
+                    "confidence_raw": field.confidence,
+                    "page": field.page,
+                }
+                for field in result.extracted_fields
+            ],
+            "extracted_type": predicted_type,
+            "corrected_type": None,
+            "path": parent_info["path"],
             "file": annoted_file,
+            "parent_document": doc_name,
+            "latency_seconds": latency_sec,
+            "stage_latencies": stage_latencies,
+            "cost_usd": cost_usage,
         }
-    )
+        index_document(result.document_name)
 
-    st.session_state.document_classify_review["classify_reviews"].append(
-        {"predicted_type": predicted_type, "actual_type": predicted_type}
-    )
+        facade_loan_system.record_event(
+            "classify_review",
+            {"predicted_type": predicted_type, "actual_type": predicted_type},
+        )
+        facade_loan_system.record_event(
+            "document_processed",
+            {
+                "document_name": result.document_name,
+                "doc_type": predicted_type,
+                "confidence": confidence,
+                "latency_seconds": latency_sec,
+                "cost_usd": cost_usage,
+                "stage_latencies": stage_latencies,
+            },
+        )
 
-    return cost_usage
+    parent_info["status"] = "Split"
+    parent_info["predicted_type"] = "packet"
+    parent_info["type_confidence"] = 0.0
+    index_document(doc_name)
+    return results[0].document_name
 
 
 def save_file_locally(uploaded_file):
@@ -180,6 +216,7 @@ def main():
                             "corrected_type": None,
                             "path": file_path,
                         }
+                        index_document(uploaded_file.name)
                 st.rerun()
 
     if uploaded_files:
@@ -189,18 +226,32 @@ def main():
                 and st.session_state.documents[uploaded_file.name]["status"]
                 == "Processing"
             ):
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    start_time = time.time()
-                    cost_usage = call_document_classifier(uploaded_file.name)
-                    end_time = time.time()
-                    latency_sec = end_time - start_time
-
-                    st.session_state.documents[uploaded_file.name].update(
-                        {
-                            "latency_seconds": latency_sec,
-                            "cost_usd": cost_usage,
-                            "status": "Processed",
-                        }
+                segments = facade_loan_system.split_packet(uploaded_file.name)
+                if len(segments) > 1:
+                    with st.spinner(
+                        f"Processing {uploaded_file.name} as {len(segments)} documents..."
+                    ):
+                        first_segment_name = call_packet_processing(
+                            uploaded_file.name, segments
+                        )
+                    st.session_state.selected_document = first_segment_name
+                    st.switch_page("pages/1_Document_View.py")
+                    st.rerun()
+
+                with st.spinner(f"Classifying {uploaded_file.name}..."):
+                    doc_info = st.session_state.documents[uploaded_file.name]
+                    doc_info["processing_started_at"] = time.time()
+                    with facade_loan_system.trace_document(
+                        uploaded_file.name
+                    ) as document_span:
+                        call_document_classifier(uploaded_file.name)
+                    # Extraction starts when the document is opened; the
+                    # time until then is not spent on the document.
+                    doc_info["classification_seconds"] = (
+                        time.time() - doc_info["processing_started_at"]
+                    )
+                    doc_info["stage_latencies"] = FacadeLoan.get_stage_latencies(
+                        document_span.trace_id
                     )
                 st.session_state.selected_document = uploaded_file.name
                 st.switch_page("pages/1_Document_View.py")
@@ -212,32 +263,109 @@ def main():
             "No documents uploaded yet. Use the sidebar to upload and process your first document."
         )
     else:
-        doc_keys = list(st.session_state.documents.keys())
-
-        for doc_name in doc_keys:
-            doc_info = st.session_state.documents[doc_name]
-            with st.container(border=True):
-                col1, col2, col3, col4 = st.columns([3, 1, 2, 1])
-                with col1:
-                    st.markdown(f"**📄 {doc_name}**")
-                with col2:
-                    status = doc_info.get("status", "Unknown")
-                    if status == "Processed":
-                        st.success(f"**Status:** {status}")
-                    elif status == "Processing":
-                        st.warning(f"**Status:** {status}")
-                    else:
-                        st.info(f"**Status:** {status}")
-                with col3:
-                    predicted_type = doc_info.get("predicted_type", "N/A")
-                    confidence = doc_info.get("type_confidence", 0)
-                    st.markdown(f"**Type:** {predicted_type} (`{confidence:.2f}`)")
-                with col4:
-                    if st.button(
-                        "View/Edit", key=f"view_{doc_name}", use_container_width=True
-                    ):
-                        st.session_state.selected_document = doc_name
-                        st.switch_page("pages/1_Document_View.py")
+        render_document_list()
+
+
+def render_document_list():
+    """
+    Renders one page of the document list. Only the documents of the
+    current page are drawn, whatever the number of documents in the session.
+    """
+    document_index = get_document_index()
+    document_types = st.session_state.document_types["document_types"]
+    type_thresholds = dict(
+        zip(
+            document_types,
+            st.session_state.settings["confidence_thresholds"].values(),
+        )
+    )
+
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([2, 2, 2, 1])
+    with filter_col1:
+        statuses = st.multiselect("Status", options=document_index.statuses())
+    with filter_col2:
+        predicted_types = st.multiselect(
+            "Predicted type", options=document_index.predicted_types()
+        )
+    with filter_col3:
+        sort_by = st.selectbox(
+            "Sort by",
+            options=list(DOCUMENT_SORT_KEYS),
+            format_func=lambda key: key.replace("_", " ").capitalize(),
+        )
+    with filter_col4:
+        page_size = st.selectbox("Per page", options=[10, 20, 50], index=1)
+
+    option_col1, option_col2 = st.columns(2)
+    with option_col1:
+        below_threshold = st.toggle("Only below confidence threshold")
+    with option_col2:
+        descending = st.toggle("Descending")
+
+    documents_page = document_index.query(
+        statuses=statuses,
+        predicted_types=predicted_types,
+        below_thresholds=type_thresholds if below_threshold else None,
+        sort_by=sort_by,
+        descending=descending,
+        page=st.session_state.get("document_list_page", 1),
+        page_size=page_size,
+    )
+
+    if not documents_page.items:
+        st.info("No documents match the selected filters.")
+
+    for document in documents_page.items:
+        doc_name = document.name
+        with st.container(border=True):
+            col1, col2, col3, col4 = st.columns([3, 1, 2, 1])
+            with col1:
+                st.markdown(f"**📄 {doc_name}**")
+            with col2:
+                status = document.status
+                if status == "Processed":
+                    st.success(f"**Status:** {status}")
+                elif status in ("Processing", "Extracting"):
+                    st.warning(f"**Status:** {status}")
+                else:
+                    st.info(f"**Status:** {status}")
+            with col3:
+                st.markdown(
+                    f"**Type:** {document.predicted_type} (`{document.confidence:.2f}`)"
+                )
+            with col4:
+                if st.button(
+                    "View/Edit",
+                    key=f"view_{doc_name}",
+                    use_container_width=True,
+                    disabled=status == "Split",
+                ):
+                    st.session_state.selected_document = doc_name
+                    st.switch_page("pages/1_Document_View.py")
+
+    page_col1, page_col2, page_col3 = st.columns([1, 2, 1])
+    with page_col1:
+        if st.button(
+            "Previous",
+            use_container_width=True,
+            disabled=documents_page.page <= 1,
+        ):
+            st.session_state.document_list_page = documents_page.page - 1
+            st.rerun()
+    with page_col2:
+        st.caption(
+            f"Page {documents_page.page} of {documents_page.page_count} "
+            f"· {documents_page.total} of {len(document_index)} documents"
+        )
+    with page_col3:
+        if st.button(
+            "Next",
+            use_container_width=True,
+            disabled=documents_page.page >= documents_page.page_count,
+        ):
+            st.session_state.document_list_page = documents_page.page + 1
+            st.rerun()
+    st.session_state.document_list_page = documents_page.page
 
 
 if __name__ == "__main__":
@@ -1,34 +1,145 @@
-import os
+import time
 
 import pandas as pd
 import streamlit as st
+from backend import Deadline
+from backend import DOCUMENT_TYPE_FIELD
 from backend import FacadeLoan
-from dotenv import load_dotenv
-from streamlit_pdf_viewer import pdf_viewer
+from services import index_document  # type: ignore[import-not-found]
+from services import init_facade
 
-load_dotenv()
+facade_loan_system = init_facade()
+
+st.set_page_config(layout="wide")
 
-API_KEY = os.getenv("API_KEY")
-PROJECT_ID = os.getenv("PROJECT_ID")
-BUCKET_NAME = os.getenv("BUCKET_NAME")
 
+def local_css(file_name):
+    with open(file_name) as f:
+        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-def init_facade():
-    return FacadeLoan.get_facade(
-        api_key=API_KEY,
-        project_id=PROJECT_ID,
-        bucket_name=BUCKET_NAME,
+
+def to_document_field(field, doc_type):
+    return {
+        "name": field.name,
+        "value": field.value,
+        "confidence": facade_loan_system.calibrate_confidence(
+            doc_type, field.confidence, field.name
+        ),
+        "confidence_raw": field.confidence,
+        "page": field.page,
+    }
+
+
+def stream_document_extraction(doc_name, doc_info):
+    """
+    Runs the extraction for a classified document, rendering each field
+    as soon as the model produces it.
+    """
+    st.subheader("Extracting Fields...")
+    fields_placeholder = st.empty()
+    document_fields = []
+    time_to_first_field = None
+    # The budget and the latency resume from the end of the classification,
+    # leaving out the time before the document was opened.
+    doc_info["processing_started_at"] = time.time() - doc_info.get(
+        "classification_seconds", 0.0
     )
 
+    with facade_loan_system.trace_document(doc_name) as document_span:
+        stream = facade_loan_system.document_extraction_stream(
+            document_name=doc_name,
+            document_id=doc_info["document_id"],
+            document_type=doc_info["predicted_type"],
+            deadline=Deadline(started_at=doc_info["processing_started_at"]),
+        )
+        while True:
+            try:
+                field = next(stream)
+            except StopIteration as stop:
+                data_extraction, _, annoted_file = stop.value
+                break
 
-facade_loan_system = init_facade()
+            if time_to_first_field is None:
+                time_to_first_field = time.time() - doc_info["processing_started_at"]
+            document_fields.append(to_document_field(field, doc_info["predicted_type"]))
+            fields_placeholder.dataframe(
+                pd.DataFrame(document_fields), hide_index=True, use_container_width=True
+            )
 
-st.set_page_config(layout="wide")
+    latency_sec = time.time() - doc_info["processing_started_at"]
+    stage_latencies = doc_info.get("stage_latencies", {})
+    for stage, latency in FacadeLoan.get_stage_latencies(
+        document_span.trace_id
+    ).items():
+        stage_latencies[stage] = stage_latencies.get(stage, 0.0) + latency
+    cost_usage = FacadeLoan.get_document_cost(doc_name)
 
+    doc_info.update(
+        {
+            "status": "Processed",
+            "fields": [
+                to_document_field(field, doc_info["predicted_type"])
+                for field in data_extraction
+            ],
+            "extracted_type": doc_info["predicted_type"],
+            "file": annoted_file,
+            "latency_seconds": latency_sec,
+            "time_to_first_field_seconds": time_to_first_field,
+            "stage_latencies": stage_latencies,
+            "cost_usd": cost_usage,
+        }
+    )
+    facade_loan_system.record_event(
+        "document_processed",
+        {
+            "document_name": doc_name,
+            "doc_type": doc_info["predicted_type"],
+            "confidence": doc_info["type_confidence"],
+            "latency_seconds": latency_sec,
+            "cost_usd": cost_usage,
+            "stage_latencies": stage_latencies,
+            "time_to_first_field_seconds": time_to_first_field,
+        },
+    )
+    st.session_state.documents[doc_name] = doc_info
+    index_document(doc_name)
+    st.rerun()
 
-def local_css(file_name):
-    with open(file_name) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+
+def render_document_preview(doc_name, doc_info):
+    """
+    Shows one rasterised page at a time; only the visible page is sent to
+    the browser, and its neighbours are rendered into the page cache.
+    """
+    # Annotation is drawn in the background when the deadline was close.
+    pdf_path = doc_info["file"] = facade_loan_system.get_annotated_file(
+        doc_info["file"]
+    )
+    page_count = facade_loan_system.get_page_count(pdf_path)
+
+    page_col, zoom_col = st.columns([2, 1])
+    with page_col:
+        page = st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key=f"preview_page_{doc_name}",
+        )
+    with zoom_col:
+        zoom = st.selectbox(
+            "Zoom",
+            options=[1.0, 1.5, 2.0],
+            index=1,
+            format_func=lambda value: f"{value:.0%}",
+            key=f"preview_zoom_{doc_name}",
+        )
+
+    st.image(
+        facade_loan_system.render_page(pdf_path, page, zoom=zoom),
+        use_container_width=True,
+    )
+    facade_loan_system.prefetch_pages(pdf_path, page, zoom=zoom)
 
 
 def document_view_page():
@@ -52,12 +163,16 @@ def document_view_page():
     if st.button("Back to Document List"):
         st.switch_page("main.py")
 
+    if doc_info["status"] == "Extracting":
+        stream_document_extraction(doc_name, doc_info)
+        return
+
     left_pane, right_pane = st.columns(2)
 
     with left_pane:
         with st.container(border=True):
             st.header("Document Preview")
-            pdf_viewer(input=doc_info["file"], height=600)
+            render_document_preview(doc_name, doc_info)
 
     with right_pane:
         with st.container(border=True):
@@ -106,6 +221,40 @@ def document_view_page():
                     )
 
             st.subheader("Extracted Fields")
+            normalizations = facade_loan_system.get_normalizations(doc_name)
+            if normalizations:
+                st.caption(
+                    "Normalized by learned format rules: "
+                    + ", ".join(
+                        f"{n.field} ({n.original_value} → {n.normalized_value})"
+                        for n in normalizations
+                    )
+                )
+            reused = facade_loan_system.get_reused_result(doc_name)
+            if reused is not None:
+                st.caption(
+                    f"Reused the results of {reused.document_name} "
+                    f"({reused.similarity:.0%} similar); "
+                    + (
+                        "re-extracted pages "
+                        + ", ".join(str(page) for page in reused.changed_pages)
+                        if reused.changed_pages
+                        else "no page changed"
+                    )
+                )
+            resubmission = facade_loan_system.get_possible_resubmission(doc_name)
+            if resubmission is not None:
+                st.warning(
+                    f"This scan looks like {resubmission.document_name} "
+                    f"({resubmission.similarity:.0%} similar). Check that it "
+                    "is not a resubmission; its results were not reused."
+                )
+            unlocated_fields = facade_loan_system.get_unlocated_fields(doc_name)
+            if unlocated_fields:
+                st.warning(
+                    "Not found in the document text, please check: "
+                    + ", ".join(unlocated_fields)
+                )
             if not doc_info["fields"]:
                 st.info("No fields were extracted for this document.")
             else:
@@ -122,6 +271,7 @@ def document_view_page():
                         ),
                     },
                     disabled=["name", "page", "confidence"],
+                    column_order=["name", "value", "confidence", "page"],
                     hide_index=True,
                     key=f"editor_{doc_name}",
                 )
@@ -132,14 +282,37 @@ def document_view_page():
                 type="primary",
             ):
                 with st.spinner("Saving corrections..."):
+                    # The fields keep the type they were extracted with when
+                    # the reviewer corrects the document type.
+                    extracted_type = doc_info.get(
+                        "extracted_type", doc_info["predicted_type"]
+                    )
+                    # The type is only a review outcome when the reviewer could
+                    # change it; otherwise it would always count as correct.
+                    if selectbox_enable:
+                        facade_loan_system.record_event(
+                            "confidence_review",
+                            {
+                                "doc_type": doc_info["predicted_type"],
+                                "field": DOCUMENT_TYPE_FIELD,
+                                "confidence": doc_info["type_confidence_original"],
+                                "correct": float(
+                                    new_type == doc_info["predicted_type"]
+                                ),
+                            },
+                        )
+                        facade_loan_system.record_route_outcome(
+                            doc_name,
+                            "classification",
+                            float(new_type == doc_info["predicted_type"]),
+                        )
                     if new_type != doc_info["predicted_type"]:
-                        st.session_state.document_classify_review[
-                            "classify_reviews"
-                        ].append(
+                        facade_loan_system.record_event(
+                            "classify_review",
                             {
                                 "predicted_type": doc_info["predicted_type"],
                                 "actual_type": new_type,
-                            }
+                            },
                         )
                         doc_info["predicted_type"] = new_type
                         doc_info["type_confidence"] = 1.0
@@ -150,6 +323,19 @@ def document_view_page():
                             edited_df.to_dict("records"), original_df.to_dict("records")
                         )
                     ):
+                        facade_loan_system.record_event(
+                            "confidence_review",
+                            {
+                                "doc_type": extracted_type,
+                                "field": original_row["name"],
+                                "confidence": original_row.get(
+                                    "confidence_raw", original_row["confidence"]
+                                ),
+                                "correct": float(
+                                    edited_row["value"] == original_row["value"]
+                                ),
+                            },
+                        )
                         if edited_row["value"] != original_row["value"]:
                             facade_loan_system.save_learning_example(
                                 doc_type=doc_info["predicted_type"],
@@ -162,14 +348,27 @@ def document_view_page():
                     corrected_data = {
                         f["name"]: f["value"] for f in edited_df.to_dict("records")
                     }
-                    st.session_state.document_extraction_review[
-                        "extraction_reviews"
-                    ].append(
+                    facade_loan_system.record_event(
+                        "extraction_review",
                         {
                             "doc_type": doc_info["predicted_type"],
                             "predicted_data": predicted_data,
                             "corrected_data": corrected_data,
-                        }
+                        },
+                    )
+                    if corrected_data:
+                        facade_loan_system.record_route_outcome(
+                            doc_name,
+                            "extraction",
+                            sum(
+                                predicted_data.get(name) == value
+                                for name, value in corrected_data.items()
+                            )
+                            / len(corrected_data),
+                        )
+
+                    facade_loan_system.save_reviewed_result(
+                        doc_name, doc_info["predicted_type"], corrected_data
                     )
 
                     doc_info["fields"] = edited_df.to_dict("records")
@@ -177,6 +376,11 @@ def document_view_page():
                         "auto_approved" if not selectbox_enable else "needs_review"
                     )
                     st.session_state.documents[doc_name] = doc_info
+                    index_document(doc_name)
+                    facade_loan_system.record_event(
+                        "document_reviewed",
+                        {"document_name": doc_name, "status": doc_info["status"]},
+                    )
 
                     st.success("Corrections saved successfully!")
 
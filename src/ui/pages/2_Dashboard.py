@@ -1,8 +1,11 @@
+import dataclasses
+import datetime
+
 import altair as alt
 import pandas as pd
 import streamlit as st
 from backend import FacadeLoan
-
+from services import init_facade  # type: ignore[import-not-found]
 
 st.set_page_config(layout="wide", page_title="Processing Dashboard")
 
@@ -12,36 +15,23 @@ def local_css(file_name):
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
 
-def get_metrics():
-    classify_reviews = st.session_state.document_classify_review["classify_reviews"]
-    extraction_reviews = st.session_state.document_extraction_review[
-        "extraction_reviews"
-    ]
-    ops_metrics = [
-        {
-            "latency_seconds": data["latency_seconds"],
-            "cost_usd": data["cost_usd"],
-            "status": data["status"],
-        }
-        for _, data in st.session_state.documents.items()
-    ]
-    confident_metrics = [
-        {
-            "doc_type": data["predicted_type"],
-            "confidence": data["type_confidence_original"],
-        }
-        for _, data in st.session_state.documents.items()
-    ]
-
-    classify_metrics, extraction_metrics, ops_metrics_result = (
-        FacadeLoan.calculate_metrics(
-            classify_reviews,
-            extraction_reviews,
-            ops_metrics,
+facade_loan_system = init_facade()
+
+
+def get_metrics(start_date, end_date):
+    with facade_loan_system.profile_request("dashboard", document_type="dashboard"):
+        classify_metrics, extraction_metrics, ops_metrics_result, stage_metrics = (
+            facade_loan_system.calculate_metrics(start_date, end_date)
         )
-    )
+        chart_data = facade_loan_system.get_chart_data(start_date, end_date)
 
-    return classify_metrics, extraction_metrics, ops_metrics_result, confident_metrics
+    return (
+        classify_metrics,
+        extraction_metrics,
+        ops_metrics_result,
+        chart_data,
+        stage_metrics,
+    )
 
 
 def dashboard_page():
@@ -50,10 +40,24 @@ def dashboard_page():
     alt.themes.enable("default")
     st.markdown("# Processing Dashboard")
 
+    today = datetime.date.today()
+    date_range = st.date_input(
+        "Date range",
+        value=(today - datetime.timedelta(days=30), today),
+        max_value=today,
+    )
+    start_date, end_date = (
+        date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+    )
+
     try:
-        classify_metrics, extraction_metrics, ops_metrics_result, confident_metrics = (
-            get_metrics()
-        )
+        (
+            classify_metrics,
+            extraction_metrics,
+            ops_metrics_result,
+            chart_data,
+            stage_metrics,
+        ) = get_metrics(start_date, end_date)
     except Exception as e:
         st.error(
             f"An error occurred while calculating metrics: {e}. Please ensure there is data to process."
@@ -61,39 +65,63 @@ def dashboard_page():
         return
 
     if classify_metrics:
-        tab1, tab2, tab3, tab4 = st.tabs(
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(
             [
                 "Tagging Quality",
                 "Extraction Quality",
                 "Operational Metrics",
                 "Confidence Distribution",
+                "Stage Breakdown",
             ]
         )
 
         with tab1:
             with st.container(border=True):
                 st.subheader("Classification Performance")
+                intervals = classify_metrics.get("confidence_intervals")
+                accuracy_help = (
+                    "95% bootstrap interval: "
+                    f"{intervals['accuracy'][0]:.2%} – {intervals['accuracy'][1]:.2%}"
+                    if intervals
+                    else None
+                )
                 col1, col2, col3 = st.columns(3)
                 col1.metric(
-                    "Overall Accuracy", f"{classify_metrics.get('accuracy', 0):.2%}"
+                    "Overall Accuracy",
+                    f"{classify_metrics.get('accuracy', 0):.2%}",
+                    help=accuracy_help,
                 )
                 col2.metric("Precision", f"{classify_metrics.get('precision', 0):.2%}")
                 col3.metric("Recall", f"{classify_metrics.get('recall', 0):.2%}")
+                if accuracy_help:
+                    st.caption(f"Accuracy {accuracy_help}")
+
+                if intervals:
+                    st.dataframe(
+                        pd.DataFrame(
+                            {
+                                "label": classify_metrics["labels"],
+                                "precision": classify_metrics["precision_per_label"],
+                                "precision_low": intervals["precision_per_label"][:, 0],
+                                "precision_high": intervals["precision_per_label"][
+                                    :, 1
+                                ],
+                                "recall": classify_metrics["recall_per_label"],
+                                "recall_low": intervals["recall_per_label"][:, 0],
+                                "recall_high": intervals["recall_per_label"][:, 1],
+                            }
+                        ),
+                        hide_index=True,
+                        use_container_width=True,
+                    )
 
             with st.container(border=True):
                 st.subheader("Confusion Matrix")
-                print(classify_metrics["confusion_matrix"])
                 if (
-                    classify_metrics["confusion_matrix"] is not None
-                    and classify_metrics["confusion_matrix"].any()
+                    chart_data["confusion"] is not None
+                    and chart_data["confusion"]["Count"].any()
                 ):
-                    cm_df = pd.DataFrame(
-                        classify_metrics["confusion_matrix"],
-                        columns=classify_metrics["labels"],
-                        index=classify_metrics["labels"],
-                    )
-                    cm_chart_data = cm_df.stack().reset_index()
-                    cm_chart_data.columns = ["True Label", "Predicted Label", "Count"]
+                    cm_chart_data = pd.DataFrame(chart_data["confusion"])
                     heatmap = (
                         alt.Chart(cm_chart_data)
                         .mark_rect(stroke="white", strokeWidth=2)
@@ -156,6 +184,76 @@ def dashboard_page():
                     f"${ops_metrics_result.get('cost_per_doc', 0):.5f}",
                 )
 
+                ops_col6, ops_col7 = st.columns(2)
+                ops_col6.metric(
+                    "P50 Time to First Field",
+                    f"{ops_metrics_result.get('p50_time_to_first_field', 0):.2f}s",
+                )
+                ops_col7.metric(
+                    "P95 Time to First Field",
+                    f"{ops_metrics_result.get('p95_time_to_first_field', 0):.2f}s",
+                )
+
+            with st.container(border=True):
+                st.subheader("Deadlines")
+                deadline_metrics = facade_loan_system.get_deadline_metrics(
+                    start_date, end_date
+                )
+                if deadline_metrics:
+                    deadline_col1, deadline_col2, deadline_col3 = st.columns(3)
+                    deadline_col1.metric(
+                        "Deadline Miss Rate", f"{deadline_metrics['miss_rate']:.2%}"
+                    )
+                    deadline_col2.metric(
+                        "P95 Time Used", f"{deadline_metrics['p95_elapsed']:.2f}s"
+                    )
+                    deadline_col3.metric(
+                        "Documents", f"{deadline_metrics['documents']}"
+                    )
+                    st.caption("Share of documents that took each degraded path.")
+                    st.dataframe(
+                        pd.DataFrame(
+                            [
+                                {"degradation": degradation, "rate": rate}
+                                for degradation, rate in deadline_metrics[
+                                    "degradation_rates"
+                                ].items()
+                            ]
+                        ),
+                        column_config={
+                            "rate": st.column_config.ProgressColumn(
+                                "Rate", format="%.2f", min_value=0, max_value=1
+                            ),
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                else:
+                    st.info("No deadlines recorded yet.")
+
+            with st.container(border=True):
+                st.subheader("Pipeline")
+                pipeline_stats = facade_loan_system.get_pipeline_stats()
+                if pipeline_stats:
+                    st.caption(
+                        "Busy share of each stage's workers, and the time upstream "
+                        "waited on its full queue."
+                    )
+                    st.dataframe(
+                        pd.DataFrame(
+                            [dataclasses.asdict(stage) for stage in pipeline_stats]
+                        ),
+                        column_config={
+                            "utilisation": st.column_config.ProgressColumn(
+                                "Utilisation", format="%.2f", min_value=0, max_value=1
+                            ),
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                else:
+                    st.info("The pipeline has not run yet.")
+
             with st.container(border=True):
                 st.subheader("Process Automation")
                 ops_col4, ops_col5 = st.columns(2)
@@ -168,29 +266,109 @@ def dashboard_page():
                     f"{ops_metrics_result.get('human_review_rate', 0):.2%}",
                 )
 
+                target_error_rate = st.number_input(
+                    "Target error rate",
+                    min_value=0.0,
+                    max_value=0.5,
+                    value=0.02,
+                    step=0.01,
+                    format="%.2f",
+                )
+                auto_approve_rates = facade_loan_system.get_auto_approve_rates(
+                    target_error_rate
+                )
+                if auto_approve_rates:
+                    st.caption(
+                        "Share of reviewed predictions that calibrated confidence would auto-approve at the target error rate."
+                    )
+                    st.dataframe(
+                        pd.DataFrame(auto_approve_rates),
+                        column_config={
+                            "auto_approve_rate": st.column_config.ProgressColumn(
+                                "Auto-Approve Rate",
+                                format="%.2f",
+                                min_value=0,
+                                max_value=1,
+                            ),
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                else:
+                    st.info("No review outcomes recorded yet.")
+
+            with st.container(border=True):
+                st.subheader("Model Routing")
+                route_stats = facade_loan_system.get_route_stats()
+                if route_stats:
+                    st.dataframe(
+                        pd.DataFrame(route_stats),
+                        column_config={
+                            "mean_latency_seconds": st.column_config.NumberColumn(
+                                "Mean Latency (s)", format="%.2f"
+                            ),
+                            "accuracy": st.column_config.ProgressColumn(
+                                "Reviewed Accuracy",
+                                format="%.2f",
+                                min_value=0,
+                                max_value=1,
+                            ),
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                else:
+                    st.info("No routed calls recorded yet.")
+
+            with st.container(border=True):
+                st.subheader("Token Usage")
+                usage_by = st.radio(
+                    "Group token usage by",
+                    options=["stage", "document_type", "model"],
+                    horizontal=True,
+                )
+                usage_rollup = FacadeLoan.get_usage_rollup((usage_by,))
+                if usage_rollup:
+                    st.dataframe(
+                        pd.DataFrame(usage_rollup),
+                        column_config={
+                            "cost_usd": st.column_config.NumberColumn(
+                                "Cost (USD)", format="$%.5f"
+                            ),
+                            "cache_hit_rate": st.column_config.ProgressColumn(
+                                "Cache Hit Rate",
+                                format="%.2f",
+                                min_value=0,
+                                max_value=1,
+                            ),
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                else:
+                    st.info("No token usage recorded yet.")
+
         with tab4:
             with st.container(border=True):
                 st.subheader("Model Confidence Distribution by Document Type")
                 st.caption(
                     "Displays the model's 'certainty' levels broken down by document type."
                 )
-                if confident_metrics:
-                    df_confident_metrics = pd.DataFrame(confident_metrics)
-                    df_confident_metrics["confidence"] = df_confident_metrics[
-                        "confidence"
-                    ].clip(0, 1)
+                if chart_data["confidence"]["count"].any():
+                    df_confidence_bins = pd.DataFrame(chart_data["confidence"])
                     chart = (
-                        alt.Chart(df_confident_metrics)
+                        alt.Chart(df_confidence_bins)
                         .mark_bar()
                         .encode(
                             x=alt.X(
-                                "confidence",
-                                bin=alt.Bin(step=0.05),
+                                "bin_start:Q",
                                 title="Confidence Score",
+                                scale=alt.Scale(domain=[0, 1]),
                             ),
-                            y=alt.Y("count()", title="Document Count"),
+                            x2="bin_end:Q",
+                            y=alt.Y("count:Q", title="Document Count"),
                             color=alt.Color("doc_type", legend=None),
-                            tooltip=["doc_type", "count()"],
+                            tooltip=["doc_type", "bin_start", "bin_end", "count"],
                         )
                         .properties(height=200)
                         .facet(column=alt.Column("doc_type", title=None))
@@ -198,6 +376,53 @@ def dashboard_page():
                     st.altair_chart(chart, use_container_width=True)
                 else:
                     st.info("No confidence metrics available.")
+
+        with tab5:
+            with st.container(border=True):
+                st.subheader("Latency by Pipeline Stage")
+                st.caption(
+                    "Per-stage latency percentiles across processed documents. "
+                    "Nested stages (e.g. llm.generate inside extraction) overlap."
+                )
+                if stage_metrics:
+                    df_stage_metrics = pd.DataFrame(stage_metrics)
+                    st.dataframe(
+                        df_stage_metrics,
+                        column_config={
+                            "stage": "Stage",
+                            "p50_latency": st.column_config.NumberColumn(
+                                "P50 (s)", format="%.2f"
+                            ),
+                            "p95_latency": st.column_config.NumberColumn(
+                                "P95 (s)", format="%.2f"
+                            ),
+                            "mean_latency": st.column_config.NumberColumn(
+                                "Mean (s)", format="%.2f"
+                            ),
+                            "samples": "Samples",
+                        },
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+                    stage_chart = (
+                        alt.Chart(df_stage_metrics)
+                        .transform_fold(
+                            ["p50_latency", "p95_latency"],
+                            as_=["Percentile", "Seconds"],
+                        )
+                        .mark_bar()
+                        .encode(
+                            x=alt.X("Seconds:Q", title="Latency (s)"),
+                            y=alt.Y("stage:N", sort="-x", title=None),
+                            color=alt.Color("Percentile:N"),
+                            yOffset="Percentile:N",
+                            tooltip=["stage", "Percentile:N", "Seconds:Q"],
+                        )
+                        .properties(height=400)
+                    )
+                    st.altair_chart(stage_chart, use_container_width=True)
+                else:
+                    st.info("No stage timings available.")
     else:
         st.info("No metrics available. Please ensure there is data to process.")
 
@@ -1,8 +1,11 @@
 # This file is part of a multi-page Streamlit app.
 import streamlit as st
+from services import init_facade  # type: ignore[import-not-found]
 
 st.set_page_config(layout="centered", page_title="Settings")
 
+facade_loan_system = init_facade()
+
 
 def local_css(file_name):
     with open(file_name) as f:
@@ -64,6 +67,27 @@ def settings_page():
     with st.expander("Show Current Threshold Values"):
         st.json(st.session_state.settings["confidence_thresholds"])
 
+    with st.container(border=True):
+        st.subheader("Profiling")
+        st.markdown(
+            "Sample where time goes while a document is processed. Its stacks "
+            "are written under resources/profiles in the collapsed format read "
+            "by flamegraph tools."
+        )
+        profiled_document = st.selectbox(
+            "Document", list(st.session_state.get("documents", {}))
+        )
+        if profiled_document is not None and facade_loan_system.is_document_profiled(
+            profiled_document
+        ):
+            st.info(f"The next stage of {profiled_document} will be profiled.")
+            if st.button("Stop Profiling"):
+                facade_loan_system.stop_profiling_document(profiled_document)
+                st.rerun()
+        elif st.button("Profile Document", disabled=profiled_document is None):
+            facade_loan_system.profile_document(profiled_document)
+            st.success(f"Profiling the next stage of {profiled_document}.")
+
 
 if __name__ == "__main__":
     settings_page()
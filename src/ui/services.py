@@ -0,0 +1,76 @@
+"""
+Services shared by every page of the app.
+
+The environment is loaded once, when this module is first imported, and the
+facade is built once per process through st.cache_resource. The document
+index lives in the session, next to the documents it lists.
+"""
+
+import os
+
+import streamlit as st
+from backend import DocumentIndex
+from backend import FacadeLoan
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("API_KEY")
+PROJECT_ID = os.getenv("PROJECT_ID")
+BUCKET_NAME = os.getenv("BUCKET_NAME")
+TRACE_FILE = os.getenv("TRACE_FILE")
+EVENT_STORE_DIR = os.getenv("EVENT_STORE_DIR", "resources/events")
+COMPACT_RESPONSES = os.getenv("COMPACT_RESPONSES", "").lower() in ("1", "true", "yes")
+REUSE_NEAR_DUPLICATES = os.getenv("REUSE_NEAR_DUPLICATES", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+LLM_RECORDING_PATH = os.getenv("LLM_RECORDING_PATH")
+REPLAY_RECORDING = os.getenv("REPLAY_RECORDING")
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1.0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+
+@st.cache_resource
+def init_facade() -> FacadeLoan:
+    FacadeLoan.configure_profiling(PROFILE_SAMPLE_RATE)
+    if REPLAY_RECORDING:
+        return FacadeLoan.get_replay_facade(
+            REPLAY_RECORDING,
+            latency_scale=REPLAY_LATENCY_SCALE,
+            trace_file=TRACE_FILE,
+            compact_responses=COMPACT_RESPONSES,
+        )
+    return FacadeLoan.get_facade(
+        api_key=API_KEY,
+        project_id=PROJECT_ID,
+        bucket_name=BUCKET_NAME,
+        trace_file=TRACE_FILE,
+        event_store_dir=EVENT_STORE_DIR,
+        compact_responses=COMPACT_RESPONSES,
+        reuse_near_duplicates=REUSE_NEAR_DUPLICATES,
+        llm_recording_path=LLM_RECORDING_PATH,
+    )
+
+
+def get_document_index() -> DocumentIndex:
+    if "document_index" not in st.session_state:
+        st.session_state.document_index = DocumentIndex()
+        for doc_name in st.session_state.get("documents", {}):
+            index_document(doc_name)
+    return st.session_state.document_index
+
+
+def index_document(doc_name: str):
+    """
+    Refreshes the listing fields of a document after its info changed.
+    """
+    doc_info = st.session_state.documents[doc_name]
+    get_document_index().upsert(
+        doc_name,
+        status=doc_info.get("status", "Unknown"),
+        predicted_type=doc_info.get("predicted_type", "Unknown"),
+        confidence=doc_info.get("type_confidence", 0.0),
+    )
@@ -0,0 +1,87 @@
+import dataclasses
+import json
+from pathlib import Path
+from typing import Any
+
+import fitz
+from backend.commons import DEFAULT_ROUTES
+from backend.commons import get_llm_factory
+from backend.commons import InMemoryFirestore
+from backend.commons import LLMFactory
+from backend.commons import LLMRouter
+from backend.commons import LocalStorage
+from backend.dashboard import EventStore
+from backend.documents import SimilarityIndex
+from backend.facade import FacadeLoan
+
+
+def licence_lines(
+    name: str, date_of_birth: str = "1980-01-01", number: str = "D1234567"
+) -> list[str]:
+    """
+    The text of a driver's licence from a shared template.
+    """
+    return [
+        "STATE OF EXAMPLE DRIVER LICENSE",
+        "Department of Motor Vehicles - Class C - Not valid for federal purposes",
+        f"NAME {name}",
+        f"DOB {date_of_birth}",
+        f"DL NO {number}",
+        "ADDRESS 1 Main Street Springfield",
+        "RESTRICTIONS NONE ENDORSEMENTS NONE SEX F HGT 5-06 EYES BRN",
+    ] + [f"Template footer line {index} of the issuing authority" for index in range(8)]
+
+
+def write_pdf(
+    path: Path,
+    pages: list[list[str]],
+    scanned: bool = False,
+    scanned_pages: frozenset[int] = frozenset(),
+) -> str:
+    """
+    Writes a PDF with one page per list of lines; scanned pages hold an
+    image of their text and no text layer.
+    """
+    doc = fitz.open()
+    for number, lines in enumerate(pages, start=1):
+        page = doc.new_page()
+        for index, line in enumerate(lines):
+            page.insert_text((72, 72 + 18 * index), line, fontsize=11)
+        if scanned or number in scanned_pages:
+            pixmap = page.get_pixmap(dpi=100)
+            doc.delete_page(number - 1)
+            page = doc.new_page(pno=number - 1)
+            page.insert_image(page.rect, pixmap=pixmap)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def fake_facade(
+    root: Path,
+    response: dict[str, Any],
+    llm_factory: LLMFactory | None = None,
+    **kwargs: Any,
+) -> FacadeLoan:
+    """
+    A facade on local storage, an in-memory Firestore and a fake LLM
+    returning the response on every route, created by llm_factory when given.
+    """
+    llm_factory = llm_factory or get_llm_factory()
+    return FacadeLoan(
+        llm_factory=llm_factory,
+        storage_client=LocalStorage(str(root / "storage")),
+        bucket_name="bucket",
+        api_key="",
+        db=InMemoryFirestore(),
+        event_store=EventStore(root_dir=str(root / "events")),
+        similarity_index=SimilarityIndex(str(root / "index.sqlite")),
+        router=LLMRouter(
+            llm_factory,
+            routes=tuple(
+                dataclasses.replace(route, llm_type="fake") for route in DEFAULT_ROUTES
+            ),
+            provider_configs={"fake": {"default_response": json.dumps(response)}},
+        ),
+        **kwargs,
+    )
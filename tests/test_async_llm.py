@@ -0,0 +1,55 @@
+import asyncio
+import json
+import time
+
+from backend.classifier import DocumentClassifier
+from backend.commons import FakeLLM
+from backend.commons import LLM
+from backend.prompts import ClassifierPrompt
+
+RESPONSE = {
+    "document_type": "w9_form",
+    "confidence": 0.93,
+    "reasoning": "Form W-9 header.",
+}
+
+
+class BlockingLLM(LLM):
+    def generate(self, prompt, model, document_cache_id, config={}):
+        time.sleep(0.05)
+        return json.dumps(RESPONSE), {}
+
+    def load_document(self, document_path):
+        return document_path
+
+
+async def classify_all(classifier, count):
+    return await asyncio.gather(
+        *(classifier.aclassify_document(f"doc-{index}") for index in range(count))
+    )
+
+
+def test_async_classifications_overlap_and_match_the_sync_call():
+    llm = FakeLLM(default_response=json.dumps(RESPONSE), latency_seconds=0.05)
+    classifier = DocumentClassifier(llm_client=llm, prompt=ClassifierPrompt())
+    expected, _ = classifier.classify_document("doc-0")
+
+    start = time.perf_counter()
+    results = asyncio.run(classify_all(classifier, 20))
+
+    assert time.perf_counter() - start < 0.5
+    assert [classification for classification, _ in results] == [expected] * 20
+
+
+def test_blocking_clients_run_in_worker_threads():
+    llm = BlockingLLM()
+    classifier = DocumentClassifier(llm_client=llm, prompt=ClassifierPrompt())
+
+    start = time.perf_counter()
+    results = asyncio.run(classify_all(classifier, 8))
+
+    assert time.perf_counter() - start < 0.3
+    assert {classification.document_type for classification, _ in results} == {
+        "w9_form"
+    }
+    assert asyncio.run(llm.aload_document("a.pdf")) == "a.pdf"
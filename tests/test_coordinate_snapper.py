@@ -0,0 +1,76 @@
+from backend.extraction import CoordinateSnapper
+from backend.extraction import DocumentFieldExtractionOutput
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+
+def field(name: str, value: str) -> DocumentFieldExtractionOutput:
+    return DocumentFieldExtractionOutput(
+        name=name, value=value, confidence=0.9, page=1, coordinates=[0, 0, 10, 10]
+    )
+
+
+def test_normalized_values_are_located_or_left_alone(tmp_path):
+    pdf_path = write_pdf(
+        tmp_path / "statement.pdf",
+        [
+            [
+                "Statement period: 01/15/2024 to February 14, 2024",
+                "Account holder: Ann Smith",
+                "EIN:12-3456789",
+                "Opened 2012",
+            ]
+        ],
+    )
+    fields = [
+        field("statement_start_date", "2024-01-15"),
+        field("statement_end_date", "2024-02-14"),
+        field("joint_account", "false"),
+        field("signers", "['Ann Smith']"),
+        field("account_holder_name", "Ann Smith"),
+        field("employer_ein", "12-3456789"),
+        field("branch_number", "12"),
+    ]
+
+    snapped, unlocated = CoordinateSnapper().snap_fields(pdf_path, fields)
+
+    assert unlocated == ["branch_number"]
+    moved = {
+        field.name
+        for field, original in zip(snapped, fields)
+        if field.coordinates != original.coordinates
+    }
+    assert moved == {
+        "statement_start_date",
+        "statement_end_date",
+        "account_holder_name",
+        "employer_ein",
+    }
+
+
+def test_unlocated_fields_are_dropped_when_the_document_is_reset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(
+        tmp_path,
+        {
+            "document_type": "government_id",
+            "confidence": 0.99,
+            "reasoning": "",
+            "extracted_fields": [
+                field("full_name", "Bob Jones").model_dump(),
+            ],
+        },
+        reuse_near_duplicates=False,
+    )
+
+    _, document_id, _ = facade.classify_document("a.pdf")
+    facade.document_extraction("a.pdf", document_id, "government_id")
+    assert facade.get_unlocated_fields("a.pdf") == ["full_name"]
+
+    facade.classify_document("a.pdf")
+    assert facade.get_unlocated_fields("a.pdf") == []
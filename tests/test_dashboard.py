@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from backend.dashboard import calculate_confidence_histogram
+from backend.dashboard import calculate_tagging_metrics
+from backend.dashboard import calculate_tagging_metrics_from_confusion
+from backend.dashboard.dashboard import latency_histogram
+from sklearn import metrics
+
+from .helpers import fake_facade
+
+
+def test_values_on_a_bin_edge_fall_in_the_bin_they_start():
+    confidences = np.array([0.15, 0.3, 0.35, 0.7, 0.95, 1.0])
+
+    histogram = calculate_confidence_histogram(
+        np.array(["w9"] * len(confidences)), confidences
+    )
+
+    assert histogram == {"w9": {"3": 1, "6": 1, "7": 1, "14": 1, "19": 2}}
+
+
+def test_latencies_on_a_bin_edge_fall_in_the_bin_they_start():
+    assert latency_histogram(np.array([0.15, 0.3, 0.35, 0.049])) == {
+        "0": 1,
+        "3": 1,
+        "6": 1,
+        "7": 1,
+    }
+
+
+def test_metrics_are_cached_until_an_event_is_recorded(tmp_path):
+    facade = fake_facade(tmp_path, {})
+    review = {"predicted_type": "w9_form", "actual_type": "w9_form"}
+    facade.record_event("classify_review", review)
+    facade._event_store.flush()
+
+    metrics = facade.calculate_metrics()
+    assert facade.calculate_metrics() is metrics
+
+    facade.record_event("classify_review", review)
+    facade._event_store.flush()
+    assert facade.calculate_metrics() is not metrics
+
+
+def test_tagging_metrics_match_sklearn_on_a_random_confusion_matrix():
+    rng = np.random.default_rng(7)
+    labels = ["bank_statement", "government_id", "unknown", "w9_form"]
+    # "unknown" is predicted but never actual, so its recall is undefined.
+    actual = rng.choice(labels[:2] + labels[3:], size=500)
+    predicted = np.where(rng.random(500) < 0.7, actual, rng.choice(labels, size=500))
+    docs = [{"predicted_type": p, "actual_type": a} for p, a in zip(predicted, actual)]
+
+    tagging = calculate_tagging_metrics(docs, bootstrap_samples=0)
+
+    assert tagging["labels"] == labels
+    np.testing.assert_array_equal(
+        tagging["confusion_matrix"],
+        metrics.confusion_matrix(actual, predicted, labels=labels),
+    )
+    assert tagging["accuracy"] == pytest.approx(
+        metrics.accuracy_score(actual, predicted)
+    )
+    for name, score in [
+        ("precision", metrics.precision_score),
+        ("recall", metrics.recall_score),
+    ]:
+        assert tagging[name] == pytest.approx(
+            score(actual, predicted, average="weighted", zero_division=0)
+        )
+        np.testing.assert_allclose(
+            tagging[f"{name}_per_label"],
+            score(actual, predicted, labels=labels, average=None, zero_division=0),
+        )
+
+
+def test_tagging_metrics_from_confusion_match_the_documents():
+    docs = [
+        {"predicted_type": "w9_form", "actual_type": "w9_form"},
+        {"predicted_type": "w9_form", "actual_type": "w9_form"},
+        {"predicted_type": "government_id", "actual_type": "w9_form"},
+        {"predicted_type": "government_id", "actual_type": "government_id"},
+    ]
+    confusion = {
+        "w9_form\tw9_form": 2,
+        "government_id\tw9_form": 1,
+        "government_id\tgovernment_id": 1,
+    }
+
+    from_docs = calculate_tagging_metrics(docs, bootstrap_samples=100)
+    from_confusion = calculate_tagging_metrics_from_confusion(
+        confusion, bootstrap_samples=100
+    )
+
+    np.testing.assert_array_equal(
+        from_docs["confusion_matrix"], from_confusion["confusion_matrix"]
+    )
+    assert from_docs["accuracy"] == from_confusion["accuracy"] == 0.75
+    low, high = from_confusion["confidence_intervals"]["accuracy"]
+    assert 0 <= low <= 0.75 <= high <= 1
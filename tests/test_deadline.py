@@ -0,0 +1,69 @@
+import fitz
+from backend.commons import current_deadline
+from backend.commons import Deadline
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+RESPONSE = {
+    "document_type": "government_id",
+    "confidence": 0.99,
+    "reasoning": "",
+    "extracted_fields": [
+        {
+            "name": "full_name",
+            "value": "Ann Smith",
+            "confidence": 0.9,
+            "page": 1,
+            "coordinates": [100, 100, 150, 400],
+        }
+    ],
+}
+
+
+def test_extraction_stream_does_not_leak_its_deadline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(tmp_path, RESPONSE)
+    deadline = Deadline()
+
+    _, document_id, _ = facade.classify_document("a.pdf")
+    stream = facade.document_extraction_stream(
+        "a.pdf", document_id, "government_id", deadline=deadline
+    )
+    deadlines_seen = []
+    try:
+        while True:
+            next(stream)
+            deadlines_seen.append(current_deadline())
+    except StopIteration as stop:
+        fields, usage, annotated_file = stop.value
+
+    assert deadlines_seen
+    assert all(seen is None for seen in deadlines_seen)
+    assert [field.name for field in fields] == ["full_name"]
+    assert isinstance(usage, list) and len(usage) == 1
+    assert fitz.open(annotated_file).page_count == 1
+
+
+def test_deferred_annotation_is_handed_out_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(tmp_path, RESPONSE)
+
+    _, document_id, _ = facade.classify_document("a.pdf")
+    _, _, pdf_path = facade.document_extraction(
+        "a.pdf", document_id, "government_id", deadline=Deadline(budget_seconds=1)
+    )
+    facade._annotation_executor.shutdown(wait=True)
+
+    annotated_file = facade.get_annotated_file(pdf_path)
+
+    assert annotated_file != pdf_path
+    assert fitz.open(annotated_file).page_count == 1
+    assert facade.get_annotated_file(pdf_path) == pdf_path
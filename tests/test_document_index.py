@@ -0,0 +1,71 @@
+import pytest
+from backend.documents import DocumentIndex
+
+
+def build_index():
+    index = DocumentIndex()
+    index.upsert("a.pdf", "processed", "w9_form", 0.9)
+    index.upsert("b.pdf", "review", "government_id", 0.4)
+    index.upsert("c.pdf", "processed", "government_id", 0.7)
+    index.upsert("d.pdf", "review", "w9_form", 0.95)
+    return index
+
+
+def names(page):
+    return [document.name for document in page.items]
+
+
+def test_filters_combine_status_type_and_thresholds():
+    index = build_index()
+
+    assert names(index.query(statuses=["review"])) == ["b.pdf", "d.pdf"]
+    assert names(index.query(statuses=["review"], predicted_types=["w9_form"])) == [
+        "d.pdf"
+    ]
+    assert names(
+        index.query(predicted_types=["government_id", "w9_form"], statuses=[])
+    ) == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+    assert names(index.query(below_thresholds={"w9_form": 0.92})) == [
+        "a.pdf",
+        "b.pdf",
+        "c.pdf",
+    ]
+
+
+def test_sorts_by_key_and_keeps_upload_order_on_ties():
+    index = build_index()
+
+    assert names(index.query(sort_by="confidence", descending=True)) == [
+        "d.pdf",
+        "a.pdf",
+        "c.pdf",
+        "b.pdf",
+    ]
+    assert names(index.query(sort_by="status")) == ["a.pdf", "c.pdf", "b.pdf", "d.pdf"]
+    with pytest.raises(ValueError):
+        index.query(sort_by="size")
+
+
+def test_pages_are_clamped_to_the_results():
+    index = build_index()
+
+    second = index.query(page=2, page_size=3)
+    assert names(second) == ["d.pdf"]
+    assert (second.total, second.page, second.page_count) == (4, 2, 2)
+    assert index.query(page=9, page_size=3).page == 2
+    assert index.query(page=0, page_size=3).page == 1
+    assert index.query(statuses=["failed"]).page_count == 1
+
+
+def test_upsert_and_remove_invalidate_cached_queries():
+    index = build_index()
+    assert names(index.query(statuses=["review"])) == ["b.pdf", "d.pdf"]
+
+    index.upsert("b.pdf", "processed", "government_id", 0.99)
+    assert names(index.query(statuses=["review"])) == ["d.pdf"]
+    assert names(index.query(statuses=["processed"])) == ["a.pdf", "b.pdf", "c.pdf"]
+
+    index.remove("d.pdf")
+    assert names(index.query(statuses=["review"])) == []
+    assert index.statuses() == ["processed"]
+    assert len(index) == 3 and "d.pdf" not in index
@@ -0,0 +1,92 @@
+import datetime
+import os
+
+from backend.dashboard import EventStore
+
+
+def classify_review(store: EventStore, predicted_type: str, actual_type: str):
+    store.append(
+        "classify_review",
+        {"predicted_type": predicted_type, "actual_type": actual_type},
+    )
+
+
+def part_files(root_dir) -> list[str]:
+    return [
+        name
+        for _, _, names in os.walk(root_dir)
+        for name in names
+        if name.endswith(".npz")
+    ]
+
+
+def test_reads_include_buffered_events_without_flushing(tmp_path):
+    store = EventStore(root_dir=str(tmp_path), flush_size=3)
+    classify_review(store, "w9", "w9")
+    classify_review(store, "w9", "w9")
+    classify_review(store, "w9", "w9")
+    classify_review(store, "w9", "bank_statement")
+
+    columns = store.read("classify_review")
+    rollup = store.read_rollup("classify_review")
+
+    assert list(columns["actual_type"]) == ["w9", "w9", "w9", "bank_statement"]
+    assert rollup == {"confusion": {"w9\tw9": 3, "w9\tbank_statement": 1}}
+    assert len(part_files(tmp_path)) == 1
+
+
+def test_compaction_merges_the_parts_of_past_days(tmp_path):
+    store = EventStore(root_dir=str(tmp_path), flush_size=1)
+    for _ in range(3):
+        classify_review(store, "w9", "w9")
+    rollup = store.read_rollup("classify_review")
+
+    store.compact_days_before(datetime.date.today() + datetime.timedelta(days=2))
+
+    assert len(part_files(tmp_path)) == 1
+    assert store.read("classify_review")["predicted_type"].size == 3
+    assert store.read_rollup("classify_review") == rollup
+
+
+def test_interrupted_compaction_keeps_each_event_once(tmp_path, monkeypatch):
+    store = EventStore(root_dir=str(tmp_path), flush_size=1)
+    for _ in range(3):
+        classify_review(store, "w9", "w9")
+    rollup = store.read_rollup("classify_review")
+
+    def crash(path):
+        raise OSError("crashed before removing the merged parts")
+
+    monkeypatch.setattr(os, "remove", crash)
+    try:
+        store.compact_days_before(datetime.date.today() + datetime.timedelta(days=2))
+    except OSError:
+        pass
+    monkeypatch.undo()
+
+    reopened = EventStore(root_dir=str(tmp_path))
+    assert len(part_files(tmp_path)) == 4
+    assert reopened.read("classify_review")["predicted_type"].size == 3
+    assert reopened.read_rollup("classify_review") == rollup
+
+    reopened.compact_days_before(datetime.date.today() + datetime.timedelta(days=2))
+    assert len(part_files(tmp_path)) == 1
+
+
+def test_interrupted_write_leaves_no_partial_part(tmp_path, monkeypatch):
+    store = EventStore(root_dir=str(tmp_path), flush_size=1)
+    classify_review(store, "w9", "w9")
+
+    def crash(partition_dir, part_names):
+        raise OSError("crashed before listing the part")
+
+    monkeypatch.setattr(EventStore, "_write_manifest", staticmethod(crash))
+    try:
+        classify_review(store, "w9", "bank_statement")
+    except OSError:
+        pass
+    monkeypatch.undo()
+
+    reopened = EventStore(root_dir=str(tmp_path))
+    assert list(reopened.read("classify_review")["actual_type"]) == ["w9"]
+    assert reopened.read_rollup("classify_review") == {"confusion": {"w9\tw9": 1}}
@@ -0,0 +1,68 @@
+import json
+
+from backend.extraction import get_document_schema
+from backend.extraction import IncrementalFieldParser
+
+FIELDS = [
+    {
+        "name": "legal_name",
+        "value": 'Acme {"Holdings"} [West], \\ Inc.',
+        "confidence": 0.9,
+        "page": 1,
+        "coordinates": [10, 20, 30, 40],
+    },
+    {
+        "name": "ein_or_ssn",
+        "value": "123456789",
+        "confidence": 0.8,
+        "page": 1,
+        "coordinates": [50, 60, 70, 80],
+    },
+]
+
+
+def feed_in_chunks(parser, response, size):
+    fields = []
+    for start in range(0, len(response), size):
+        fields.extend(parser.feed(response[start : start + size]))
+    return fields
+
+
+def test_fields_split_anywhere_parse_like_the_whole_response():
+    schema = get_document_schema("w9_form")
+    response = json.dumps({"extracted_fields": FIELDS})
+    expected = schema.validate_json(response).extracted_fields
+
+    for size in range(1, 12):
+        parser = IncrementalFieldParser(schema.field_model)
+        assert feed_in_chunks(parser, response, size) == expected
+        assert parser.text == response
+
+
+def test_compact_rows_split_anywhere_parse_like_the_whole_response():
+    schema = get_document_schema("w9_form")
+    rows = [
+        [schema.field_names.index(field["name"]), field["value"], field["confidence"]]
+        + [field["page"], *field["coordinates"]]
+        for field in FIELDS
+    ]
+    response = json.dumps({"fields": rows})
+    expected = schema.decode_compact(response).extracted_fields
+
+    for size in range(1, 12):
+        parser = IncrementalFieldParser(
+            schema.field_model, decode=schema.decode_compact_row
+        )
+        assert feed_in_chunks(parser, response, size) == expected
+
+
+def test_malformed_field_is_skipped():
+    schema = get_document_schema("w9_form")
+    response = json.dumps(
+        {"extracted_fields": [{"name": "legal_name", "value": "Acme"}, FIELDS[1]]}
+    )
+
+    parser = IncrementalFieldParser(schema.field_model)
+    assert [field.name for field in feed_in_chunks(parser, response, 7)] == [
+        "ein_or_ssn"
+    ]
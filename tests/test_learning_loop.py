@@ -0,0 +1,110 @@
+import threading
+
+from backend.commons import InMemoryFirestore
+from backend.learning_loop import LearningCompactor
+from backend.learning_loop import LearningExample
+from backend.learning_loop import LearningIndex
+from backend.learning_loop import LearningLoop
+
+from .helpers import fake_facade
+
+
+def save_corrections(loop: LearningLoop, count: int):
+    for index in range(count):
+        loop.save_learning_example(
+            "bank_statement", "account_number", f"12345{index}", f"12-345{index}"
+        )
+
+
+def test_concurrent_loads_count_each_correction_once():
+    db = InMemoryFirestore()
+    index = LearningIndex()
+    save_corrections(LearningLoop(db=db, index=index), 3)
+    LearningLoop(db=db).compact()
+
+    threads = [
+        threading.Thread(
+            target=LearningLoop(db=db, index=index).get_learning_context,
+            args=("bank_statement",),
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    (rule,) = LearningCompactor(db).get_rules("bank_statement")
+    assert rule.count == 3
+    assert [example.count for example in index.rules("bank_statement")] == [3]
+
+
+def test_compaction_skips_while_another_process_holds_the_lease():
+    db = InMemoryFirestore()
+    save_corrections(LearningLoop(db=db), 2)
+    holder = LearningCompactor(db)
+    assert holder._claim_lease()[0]
+
+    assert LearningCompactor(db).compact() == 0
+    assert holder.compact() == 2
+    assert LearningCompactor(db).compact() == 0
+    (rule,) = holder.get_rules("bank_statement")
+    assert rule.count == 2
+
+
+def test_load_replaces_the_counts_of_a_document_type():
+    index = LearningIndex()
+    example = LearningExample("bank_statement", "account_number", "123", "1-23")
+    index.load("bank_statement", [example])
+    index.load("bank_statement", [example])
+
+    assert [rule.count for rule in index.rules("bank_statement")] == [1]
+
+
+def test_learning_context_reads_rules_without_compacting():
+    db = InMemoryFirestore()
+    index = LearningIndex()
+    loop = LearningLoop(db=db, index=index)
+    save_corrections(loop, 2)
+
+    loop.get_learning_context("bank_statement")
+    assert LearningCompactor(db).get_watermark() is None
+    assert index.rules("bank_statement") == []
+
+    assert loop.compact() == 2
+    assert [example.count for example in index.rules("bank_statement")] == [2]
+
+
+def test_facade_compacts_learning_examples_in_the_background(tmp_path):
+    facade = fake_facade(tmp_path, {})
+    facade.save_learning_example("bank_statement", "account_number", "123", "1-23")
+
+    facade.start_learning_compaction(interval_seconds=3600)
+    facade.stop_learning_compaction()
+
+    (rule,) = LearningCompactor(facade.db).get_rules("bank_statement")
+    assert rule.count == 1
+
+
+def test_rules_collapse_by_format_and_fill_fields_round_robin():
+    index = LearningIndex()
+    for timestamp, (field, bad, good) in enumerate(
+        [
+            ("ein_or_ssn", "123456789", "12-3456789"),
+            ("ein_or_ssn", "987654321", "98-7654321"),
+            ("ein_or_ssn", "12 3456789", "12-3456789"),
+            ("legal_name", "ACME CORP", "Acme Corp"),
+        ]
+    ):
+        index.add(LearningExample("w9_form", field, bad, good, float(timestamp)))
+
+    selected = index.select("w9_form", ["ein_or_ssn", "legal_name"])
+    assert [(rule.field, rule.bad_example, rule.count) for rule in selected] == [
+        ("ein_or_ssn", "987654321", 2),
+        ("legal_name", "ACME CORP", 1),
+        ("ein_or_ssn", "12 3456789", 1),
+    ]
+
+    one_rule = len(selected[0].rule_text) // 4
+    assert index.select("w9_form", token_budget=one_rule) == selected[:1]
+    assert index.select("bank_statement") == []
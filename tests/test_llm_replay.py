@@ -0,0 +1,61 @@
+import json
+
+from backend.commons import get_llm_factory
+from backend.commons import RecordingLLMFactory
+from backend.facade import FacadeLoan
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+RESPONSE = {
+    "document_type": "government_id",
+    "confidence": 0.97,
+    "reasoning": "Driver licence layout.",
+    "extracted_fields": [
+        {
+            "name": "full_name",
+            "value": "Ann Smith",
+            "confidence": 0.9,
+            "page": 1,
+            "coordinates": [100, 100, 150, 400],
+        }
+    ],
+}
+
+
+def classify_and_extract(facade):
+    classification, document_id, _ = facade.classify_document("a.pdf")
+    fields, _, _ = facade.document_extraction(
+        "a.pdf", document_id, classification.document_type
+    )
+    return classification, [field.model_dump() for field in fields]
+
+
+def test_replayed_extraction_matches_the_recording(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    recording_path = str(tmp_path / "recording.jsonl")
+
+    recorded = classify_and_extract(
+        fake_facade(
+            tmp_path,
+            RESPONSE,
+            llm_factory=RecordingLLMFactory(get_llm_factory(), recording_path),
+        )
+    )
+    with open(recording_path) as file:
+        kinds = [json.loads(line)["kind"] for line in file]
+    assert kinds == ["load_document", "generate", "generate"]
+
+    replayed = classify_and_extract(
+        FacadeLoan.get_replay_facade(
+            recording_path, latency_scale=0, root_dir=str(tmp_path / "replay")
+        )
+    )
+
+    assert replayed == recorded
+    assert recorded[0].document_type == "government_id"
+    assert [field["value"] for field in recorded[1]] == ["Ann Smith"]
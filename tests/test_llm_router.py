@@ -0,0 +1,70 @@
+import pytest
+from backend.commons import DEFAULT_ROUTES
+from backend.commons import get_llm_factory
+from backend.commons import LLMRouter
+from backend.commons import RoutingRule
+
+
+def make_router(**kwargs):
+    return LLMRouter(
+        get_llm_factory(),
+        routes=DEFAULT_ROUTES,
+        rules=(RoutingRule(route="lite"),),
+        min_samples=5,
+        **kwargs,
+    )
+
+
+def review(router, route, count, correct, latency_seconds=None):
+    for _ in range(count):
+        router.record_outcome(
+            route,
+            "extraction",
+            "w9_form",
+            latency_seconds=latency_seconds,
+            correct=correct,
+        )
+
+
+def test_inaccurate_tier_is_promoted_after_enough_reviews():
+    router = make_router()
+
+    review(router, "lite", 4, 0.0)
+    assert router.select("extraction", "w9_form").route == "lite"
+
+    review(router, "lite", 1, 0.0)
+    decision = router.select("extraction", "w9_form")
+    assert decision.route == "flash"
+    assert decision.reason == "accuracy 0.00 below 0.90"
+    assert router.select("extraction", "bank_statement").route == "lite"
+
+    review(router, "flash", 5, 0.5)
+    assert router.select("extraction", "w9_form").route == "pro"
+
+
+def test_promotion_stops_at_a_tier_over_the_latency_limit():
+    router = make_router(max_latency_seconds=10.0)
+    review(router, "lite", 5, 0.0, latency_seconds=1.0)
+    review(router, "flash", 5, 1.0, latency_seconds=30.0)
+
+    decision = router.select("extraction", "w9_form")
+
+    assert decision.route == "lite"
+    assert decision.reason == "rule, next tier over latency budget"
+
+
+def test_escalation_moves_one_tier_up_until_the_strongest():
+    router = make_router()
+    decision = router.select("classification")
+
+    escalated = router.escalate(decision, confidence=0.3)
+    assert escalated.route == "flash" and escalated.escalated_from == "lite"
+    assert router.escalate(decision, confidence=0.8) is None
+    assert router.escalate(router.escalate(escalated, 0.3), 0.3) is None
+
+
+def test_unknown_routes_are_rejected():
+    with pytest.raises(ValueError):
+        LLMRouter(get_llm_factory(), rules=(RoutingRule(route="turbo"),))
+    with pytest.raises(ValueError):
+        make_router().get_route("turbo")
@@ -0,0 +1,62 @@
+from backend.learning_loop import FieldNormalization
+from backend.learning_loop import FormatNormalizer
+from backend.learning_loop import LearningExample
+from backend.learning_loop import LearningIndex
+
+
+def correction(bad_example: str, good_example: str, count: int = 1):
+    return LearningExample(
+        doc_type="w9_form",
+        field="ein_or_ssn",
+        bad_example=bad_example,
+        good_example=good_example,
+        count=count,
+    )
+
+
+def test_single_correction_does_not_rewrite_values():
+    index = LearningIndex()
+    index.add(correction("123456789", "12-3456789"))
+
+    assert FormatNormalizer(index).normalize("w9_form", "ein_or_ssn", "987654321") == (
+        "987654321",
+        None,
+    )
+
+
+def test_agreeing_corrections_rewrite_values_of_the_same_format():
+    index = LearningIndex()
+    index.add(correction("123456789", "12-3456789", count=3))
+    normalizer = FormatNormalizer(index)
+
+    value, rule = normalizer.normalize("w9_form", "ein_or_ssn", "987654321")
+
+    assert value == "98-7654321"
+    assert rule is not None and rule.count == 3
+    assert normalizer.normalize("w9_form", "ein_or_ssn", "987-65-4321")[1] is None
+
+
+def test_conflicting_corrections_of_a_format_rewrite_nothing():
+    index = LearningIndex()
+    index.add(correction("123456789", "12-3456789", count=5))
+    index.add(correction("123456789", "123-45-6789", count=3))
+
+    assert FormatNormalizer(index).normalize("w9_form", "ein_or_ssn", "987654321") == (
+        "987654321",
+        None,
+    )
+
+
+def test_normalizations_are_kept_per_document_until_forgotten():
+    normalizer = FormatNormalizer(LearningIndex())
+    normalizer.record(
+        [
+            FieldNormalization("a.pdf", "ein_or_ssn", "1", "1", "9 -> 9", 3),
+            FieldNormalization("b.pdf", "ein_or_ssn", "2", "2", "9 -> 9", 3),
+        ]
+    )
+
+    normalizer.forget("a.pdf")
+
+    assert normalizer.get_normalizations("a.pdf") == []
+    assert [n.original_value for n in normalizer.get_normalizations("b.pdf")] == ["2"]
@@ -0,0 +1,52 @@
+import os
+
+from backend.splitter import DocumentSegment
+from backend.splitter import PacketSplitter
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+RESPONSE = {
+    "document_type": "government_id",
+    "confidence": 0.95,
+    "reasoning": "Photo, date of birth and licence number.",
+    "extracted_fields": [],
+}
+
+W9_LINES = [
+    "Form W-9 Request for Taxpayer Identification Number and Certification",
+    "Part I Taxpayer Identification Number",
+    "Social security number or Employer identification number",
+    "Part II Certification - not subject to backup withholding",
+]
+
+
+def test_scanned_page_is_classified_on_its_own(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(
+        documents / "packet.pdf",
+        [licence_lines("Ann Smith"), W9_LINES, W9_LINES],
+        scanned_pages=frozenset({1}),
+    )
+    facade = fake_facade(tmp_path, RESPONSE)
+
+    segments = facade.split_packet("packet.pdf")
+
+    assert segments == [
+        DocumentSegment("government_id", 1, 1),
+        DocumentSegment("w9_form", 2, 3),
+    ]
+    assert sorted(os.listdir(documents)) == ["packet.pdf"]
+
+
+def test_scanned_page_without_classifier_joins_its_neighbour(tmp_path):
+    path = write_pdf(
+        tmp_path / "packet.pdf",
+        [licence_lines("Ann Smith"), W9_LINES],
+        scanned_pages=frozenset({1}),
+    )
+
+    assert PacketSplitter().split(path) == [DocumentSegment("w9_form", 1, 2)]
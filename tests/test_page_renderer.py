@@ -0,0 +1,49 @@
+from backend.documents import PageRenderer
+
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+
+def test_least_recently_used_pages_are_evicted_by_size(tmp_path):
+    path = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")] * 3)
+    image_size = len(PageRenderer().render_page(path, 1))
+    renderer = PageRenderer(max_bytes=2 * image_size)
+
+    for page in (1, 2, 3):
+        renderer.render_page(path, page)
+    assert renderer.stats() == {
+        "entries": 2,
+        "size_bytes": 2 * image_size,
+        "hits": 0,
+        "misses": 3,
+    }
+
+    renderer.render_page(path, 2)
+    renderer.render_page(path, 1)
+    renderer.render_page(path, 2)
+    renderer.render_page(path, 3)
+    stats = renderer.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 5)
+
+
+def test_images_larger_than_the_cache_are_not_kept(tmp_path):
+    path = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")])
+    renderer = PageRenderer(max_bytes=10)
+
+    assert renderer.render_page(path, 1)
+    assert renderer.stats()["entries"] == 0
+
+
+def test_rewritten_file_gets_a_new_entry(tmp_path):
+    path = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")])
+    renderer = PageRenderer()
+    first = renderer.render_page(path, 1)
+    first_hash = renderer.document_hash(path)
+
+    write_pdf(tmp_path / "a.pdf", [licence_lines("Bob Jones", number="X7654321")])
+    second = renderer.render_page(path, 1)
+
+    assert renderer.document_hash(path) != first_hash
+    assert second != first
+    assert renderer.stats()["entries"] == 2
+    assert renderer.stats()["misses"] == 2
@@ -0,0 +1,24 @@
+from backend.commons import SamplingProfiler
+
+
+def test_forced_document_is_profiled_for_one_request_only():
+    profiler = SamplingProfiler(output_dir=None)
+    profiler.force("a.pdf")
+
+    with profiler.request("a.pdf") as first:
+        pass
+    with profiler.request("a.pdf") as second:
+        pass
+
+    assert first is not None
+    assert second is None
+    assert not profiler.is_forced("a.pdf")
+
+
+def test_released_document_is_not_profiled():
+    profiler = SamplingProfiler(output_dir=None)
+    profiler.force("a.pdf", requests=2)
+    profiler.release("a.pdf")
+
+    with profiler.request("a.pdf") as request:
+        assert request is None
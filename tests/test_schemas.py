@@ -0,0 +1,95 @@
+import json
+
+from backend.extraction import get_document_schema
+from backend.extraction import merge_duplicate_fields
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+
+def extracted_field(name: str, value: str = "Ann Smith", confidence: float = 0.9):
+    return {
+        "name": name,
+        "value": value,
+        "confidence": confidence,
+        "page": 1,
+        "coordinates": [100, 100, 150, 400],
+    }
+
+
+def response(*names: str) -> str:
+    return json.dumps({"extracted_fields": [extracted_field(name) for name in names]})
+
+
+def test_typed_schema_accepts_a_field_extracted_twice():
+    schema = get_document_schema("bank_statement")
+
+    extraction = schema.validate_json(
+        response("account_holder_name", "account_holder_name")
+    )
+
+    assert len(extraction.extracted_fields) == 2
+
+
+def test_duplicate_fields_keep_the_most_confident_value():
+    schema = get_document_schema("government_id")
+    fields = [
+        schema.field_model.model_validate(extracted_field("full_name", "A Smith", 0.6)),
+        schema.field_model.model_validate(extracted_field("id_number", "D1234567")),
+        schema.field_model.model_validate(extracted_field("full_name", "Ann Smith")),
+    ]
+
+    merged = merge_duplicate_fields(fields, "government_id")
+
+    assert [(field.name, field.value) for field in merged] == [
+        ("full_name", "Ann Smith"),
+        ("id_number", "D1234567"),
+    ]
+
+
+def test_typed_schema_accepts_distinct_fields():
+    schema = get_document_schema("bank_statement")
+
+    extraction = schema.validate_json(response("account_holder_name"))
+
+    assert [field.name for field in extraction.extracted_fields] == [
+        "account_holder_name"
+    ]
+
+
+def test_streamed_extraction_merges_a_field_extracted_twice(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(
+        tmp_path,
+        {
+            "document_type": "government_id",
+            "confidence": 0.99,
+            "reasoning": "",
+            "extracted_fields": [
+                extracted_field("full_name", "A Smith", 0.6),
+                extracted_field("full_name", "Ann Smith", 0.9),
+            ],
+        },
+        reuse_near_duplicates=False,
+    )
+    classification, document_id, _ = facade.classify_document("a.pdf")
+
+    stream = facade.document_extraction_stream(
+        "a.pdf", document_id, classification.document_type
+    )
+    streamed = []
+    while True:
+        try:
+            streamed.append(next(stream))
+        except StopIteration as stop:
+            extracted_fields, _, _ = stop.value
+            break
+
+    assert [field.value for field in streamed] == ["A Smith", "Ann Smith"]
+    assert [(field.name, field.value) for field in extracted_fields] == [
+        ("full_name", "Ann Smith")
+    ]
@@ -0,0 +1,67 @@
+from backend.extraction import DocumentFieldExtractionOutput
+from backend.extraction import merge_extracted_fields
+from backend.extraction import page_windows
+
+
+def field(name, value, confidence, page):
+    return DocumentFieldExtractionOutput(
+        name=name, value=value, confidence=confidence, page=page, coordinates=[]
+    )
+
+
+def merged_values(shard_fields, document_type):
+    return {
+        merged.name: (merged.value, merged.page)
+        for merged in merge_extracted_fields(shard_fields, document_type)
+    }
+
+
+def test_page_windows_cover_every_page_once():
+    assert page_windows(25, 10) == [(1, 10), (11, 20), (21, 25)]
+    assert page_windows(10, 10) == [(1, 10)]
+
+
+def test_statement_dates_and_balances_follow_their_page_rules():
+    shards = [
+        [
+            field("statement_start_date", "2024-01-01", 0.7, 1),
+            field("starting_balance", "100.00", 0.6, 1),
+            field("ending_balance", "150.00", 0.99, 3),
+            field("account_number", "111", 0.7, 1),
+        ],
+        [
+            field("statement_start_date", "2024-01-15", 0.95, 12),
+            field("starting_balance", "120.00", 0.9, 11),
+            field("ending_balance", "90.00", 0.5, 14),
+            field("account_number", "222", 0.9, 12),
+        ],
+    ]
+
+    assert merged_values(shards, "bank_statement") == {
+        "statement_start_date": ("2024-01-01", 1),
+        "starting_balance": ("100.00", 1),
+        "ending_balance": ("90.00", 14),
+        "account_number": ("222", 12),
+    }
+
+
+def test_empty_values_lose_to_found_values():
+    shards = [
+        [field("ending_balance", "null", 0.9, 20)],
+        [field("ending_balance", "80.00", 0.4, 9)],
+        [field("legal_name", "", 0.0, 1)],
+    ]
+
+    assert merged_values(shards, "bank_statement") == {
+        "ending_balance": ("80.00", 9),
+        "legal_name": ("", 1),
+    }
+
+
+def test_equal_confidence_keeps_the_earliest_page():
+    shards = [
+        [field("legal_name", "Acme", 0.9, 5)],
+        [field("legal_name", "Acm", 0.9, 2)],
+    ]
+
+    assert merged_values(shards, "w9_form") == {"legal_name": ("Acm", 2)}
@@ -0,0 +1,184 @@
+import time
+
+import fitz
+import pytest
+from backend.commons import FakeLLM
+from backend.commons import get_tracer
+from backend.commons import InMemorySpanExporter
+from backend.documents import SimilarityIndex
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SimilarityIndex(str(tmp_path / "index.sqlite"))
+
+
+def test_identical_text_document_is_reusable(tmp_path, index):
+    first = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")])
+    copy = write_pdf(tmp_path / "b.pdf", [licence_lines("Ann Smith")])
+    index.add("a.pdf", index.fingerprint(first), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(copy))
+
+    assert match is not None
+    assert match.reusable
+    assert match.changed_pages == []
+
+
+def test_same_template_text_document_changes_the_personal_page(tmp_path, index):
+    pages = [licence_lines("Ann Smith"), ["Terms and conditions"] * 40]
+    other_pages = [licence_lines("Bob Jones", "1975-02-02", "D7654321"), pages[1]]
+    first = write_pdf(tmp_path / "a.pdf", pages)
+    other = write_pdf(tmp_path / "b.pdf", other_pages)
+    index.add("a.pdf", index.fingerprint(first), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(other))
+
+    # Only the page whose text is identical may keep the previous results.
+    assert match is None or 1 in match.changed_pages
+
+
+def test_same_template_scans_are_never_reusable(tmp_path, index):
+    first = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")], scanned=True)
+    other = write_pdf(
+        tmp_path / "b.pdf",
+        [licence_lines("Bob Jones", "1975-02-02", "D7654321")],
+        scanned=True,
+    )
+    index.add("a.pdf", index.fingerprint(first), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(other))
+
+    assert match is None or not match.reusable
+
+
+def test_page_without_text_in_text_document_is_changed(tmp_path, index):
+    lines = licence_lines("Ann Smith")
+    first = write_pdf(tmp_path / "a.pdf", [lines, lines])
+    mixed = write_pdf(tmp_path / "b.pdf", [lines, lines], scanned_pages=frozenset({2}))
+    index.add("a.pdf", index.fingerprint(first), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(mixed))
+
+    assert match is not None
+    assert match.changed_pages == [2]
+
+
+def test_facade_extracts_same_template_scans_in_full(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")], scanned=True)
+    write_pdf(
+        documents / "b.pdf",
+        [licence_lines("Bob Jones", "1975-02-02", "D7654321")],
+        scanned=True,
+    )
+    facade = fake_facade(
+        tmp_path,
+        {
+            "document_type": "government_id",
+            "confidence": 0.99,
+            "reasoning": "",
+            "extracted_fields": [
+                {
+                    "name": "full_name",
+                    "value": "Ann Smith",
+                    "confidence": 0.9,
+                    "page": 1,
+                    "coordinates": [100, 100, 150, 400],
+                }
+            ],
+        },
+    )
+    exporter = InMemorySpanExporter()
+    get_tracer().add_exporter(exporter)
+
+    for name in ("a.pdf", "b.pdf"):
+        classification, document_id, _ = facade.classify_document(name)
+        with facade.trace_document(name) as span:
+            facade.document_extraction(name, document_id, classification.document_type)
+
+    extraction_calls = [
+        finished
+        for finished in exporter.get_finished_spans(span.trace_id)
+        if finished.name == "llm.generate"
+    ]
+    assert facade.get_reused_result("b.pdf") is None
+    assert extraction_calls
+
+
+def test_scanned_pages_render_without_text(tmp_path):
+    path = write_pdf(tmp_path / "a.pdf", [licence_lines("Ann Smith")], scanned=True)
+    with fitz.open(path) as doc:
+        assert not doc[0].get_text().strip()
+
+
+def test_page_with_an_added_signature_is_changed(tmp_path, index):
+    lines = licence_lines("Ann Smith")
+    first = write_pdf(tmp_path / "a.pdf", [lines, lines])
+    signed = write_pdf(tmp_path / "b.pdf", [lines, lines])
+    with fitz.open(signed) as doc:
+        doc[1].draw_line((400, 600), (520, 630), width=2)
+        doc[1].draw_line((400, 630), (520, 600), width=2)
+        doc.saveIncr()
+    index.add("a.pdf", index.fingerprint(first), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(signed))
+
+    assert match is not None
+    assert match.changed_pages == [2]
+
+
+def test_newest_candidates_are_considered_first(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "index.sqlite"), max_candidates=1)
+    lines = licence_lines("Ann Smith")
+    for name in ("old.pdf", "new.pdf"):
+        path = write_pdf(tmp_path / name, [lines])
+        index.add(name, index.fingerprint(path), {"document_type": "x"})
+
+    match = index.find(index.fingerprint(write_pdf(tmp_path / "copy.pdf", [lines])))
+
+    assert match is not None
+    assert match.document_name == "new.pdf"
+
+
+def test_extraction_does_not_wait_for_the_fingerprint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(
+        tmp_path,
+        {
+            "document_type": "government_id",
+            "confidence": 0.99,
+            "reasoning": "",
+            "extracted_fields": [],
+        },
+    )
+    calls = []
+    fingerprint = SimilarityIndex.fingerprint
+    generate = FakeLLM.generate
+
+    def slow_fingerprint(self, pdf_path):
+        time.sleep(0.5)
+        calls.append("fingerprint")
+        return fingerprint(self, pdf_path)
+
+    def record_generate(self, *args, **kwargs):
+        calls.append("generate")
+        return generate(self, *args, **kwargs)
+
+    monkeypatch.setattr(SimilarityIndex, "fingerprint", slow_fingerprint)
+    monkeypatch.setattr(FakeLLM, "generate", record_generate)
+
+    _, document_id, _ = facade.classify_document("a.pdf")
+    facade.document_extraction("a.pdf", document_id, "government_id")
+
+    assert calls == ["generate", "generate", "fingerprint"]
+    assert facade.find_near_duplicate("a.pdf") is None
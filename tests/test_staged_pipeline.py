@@ -0,0 +1,43 @@
+import os
+
+import fitz
+
+from .helpers import fake_facade
+from .helpers import licence_lines
+from .helpers import write_pdf
+
+RESPONSE = {
+    "document_type": "government_id",
+    "confidence": 0.99,
+    "reasoning": "",
+    "extracted_fields": [
+        {
+            "name": "full_name",
+            "value": "Ann Smith",
+            "confidence": 0.9,
+            "page": 1,
+            "coordinates": [100, 100, 150, 400],
+        }
+    ],
+}
+
+
+def test_pipeline_annotates_typed_fields_in_a_worker_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = tmp_path / "resources" / "documents"
+    documents.mkdir(parents=True)
+    write_pdf(documents / "a.pdf", [licence_lines("Ann Smith")])
+    facade = fake_facade(tmp_path, RESPONSE)
+
+    try:
+        (document,) = facade.process_documents(["a.pdf"])
+    finally:
+        facade.pipeline.close()
+
+    assert document.classification.document_type == "government_id"
+    assert [field.name for field in document.extracted_fields] == ["full_name"]
+    assert type(document.extracted_fields[0]).__name__ == "GovernmentIdField"
+    assert os.path.exists(document.annotated_file)
+    assert fitz.open(document.annotated_file).page_count == 1
+    assert "annotate" in document.stage_latencies
+    assert isinstance(document.usage, list) and len(document.usage) == 1
@@ -0,0 +1,37 @@
+import time
+
+from backend.commons import get_tracer
+from backend.commons import InMemorySpanExporter
+
+
+def chunks():
+    yield "a"
+    yield "b"
+    return "done"
+
+
+def test_stream_span_times_only_the_chunks_and_is_not_current_outside():
+    exporter = InMemorySpanExporter()
+    get_tracer().add_exporter(exporter)
+
+    with get_tracer().span("document") as document_span:
+        stream = get_tracer().stream("extraction", chunks())
+        received = []
+        while True:
+            try:
+                received.append(next(stream))
+            except StopIteration as stop:
+                result = stop.value
+                break
+            assert get_tracer().current_span() is document_span
+            time.sleep(0.05)
+
+    (span,) = [
+        span
+        for span in exporter.get_finished_spans(document_span.trace_id)
+        if span.name == "extraction"
+    ]
+    assert received == ["a", "b"]
+    assert result == "done"
+    assert span.parent_id == document_span.span_id
+    assert span.duration_seconds < 0.05
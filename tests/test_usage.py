@@ -0,0 +1,25 @@
+import pytest
+from backend.commons import UsageLedger
+
+USAGE = {"prompt_token_count": 1_000_000, "candidates_token_count": 0}
+
+
+def test_document_cost_is_kept_per_document():
+    ledger = UsageLedger(max_records=2)
+    for stage in ("classification", "extraction", "extraction"):
+        ledger.record(stage, "gemini-2.5-flash", USAGE, document_name="a.pdf")
+    ledger.record("extraction", "gemini-2.5-flash", USAGE, document_name="b.pdf")
+
+    assert ledger.document_cost("a.pdf") == pytest.approx(0.90)
+    assert ledger.document_cost("b.pdf") == pytest.approx(0.30)
+    assert len(ledger.get_records()) == 2
+    assert sum(row["calls"] for row in ledger.rollup()) == 2
+
+
+def test_document_costs_keep_the_latest_documents():
+    ledger = UsageLedger(max_documents=2)
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        ledger.record("extraction", "gemini-2.5-flash", USAGE, document_name=name)
+
+    assert ledger.document_cost("a.pdf") == 0.0
+    assert ledger.document_cost("c.pdf") == pytest.approx(0.30)